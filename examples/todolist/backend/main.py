@@ -26,11 +26,11 @@ async def define_behavior():
     We define 2 input/output pairs for the LLM to learn from.
     """
 
-    assert create_todolist_item("I would like to go to the store and buy some milk") \
+    assert await create_todolist_item("I would like to go to the store and buy some milk") \
            == TodoItem(goal="Go to the store and buy some milk",
                        people=["Me"])
 
-    assert create_todolist_item("I need to go and visit Jeff at 3pm tomorrow") \
+    assert await create_todolist_item("I need to go and visit Jeff at 3pm tomorrow") \
            == TodoItem(goal="Go and visit Jeff",
                        people=["Me"],
                        deadline=datetime.datetime(2021, 1, 1, 15, 0))
@@ -52,7 +52,7 @@ app = FastAPI(lifespan=lifespan)
 
 
 @tanuki.patch
-def create_todolist_items(input: str) -> List[TodoItem]:
+async def create_todolist_items(input: str) -> List[TodoItem]:
     """
     Converts the input string into a list of TodoItem objects
     :param input: The user-supplied text of things they have to do
@@ -61,7 +61,7 @@ def create_todolist_items(input: str) -> List[TodoItem]:
 
 
 @tanuki.patch
-def create_todolist_item(input: str) -> TodoItem:
+async def create_todolist_item(input: str) -> TodoItem:
     """
     Converts the input string into a TodoItem object
     :param input: The user-supplied text of things they have to do
@@ -71,12 +71,12 @@ def create_todolist_item(input: str) -> TodoItem:
 
 @app.post("/create_todolist_items/")
 async def create_todolist_items_route(input: Query):
-    return create_todolist_items(input.input)
+    return await create_todolist_items(input.input)
 
 
 @app.post("/create_todolist_item/")
 async def create_todolist_item_route(input: Query):
-    return create_todolist_item(input.input)
+    return await create_todolist_item(input.input)
 
 
 if __name__ == "__main__":
@@ -22,7 +22,8 @@ setup(
         "python-dotenv==1.0.0",
         "bitarray==2.8.2",
         "pydantic>1.0.0",
-        "requests~=2.31.0"
+        "requests~=2.31.0",
+        "httpx>=0.23.0"
     ],
     extras_require={
         'aws_bedrock': [
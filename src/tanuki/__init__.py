@@ -14,6 +14,8 @@ import astor as astor
 import requests
 
 import tanuki
+from tanuki.constants import DEFAULT_MAP_CONCURRENCY
+from tanuki.function_mapper import map_calls, amap_calls
 from tanuki.models.api_manager import APIManager
 from tanuki.runtime_assertion_visitor import RuntimeAssertionVisitor
 from tanuki.static_assertion_visitor import StaticAssertionVisitor
@@ -25,6 +27,7 @@ from tanuki.models.function_description import FunctionDescription
 from tanuki.models.function_example import FunctionExample
 from tanuki.models.function_type import FunctionType
 from tanuki.register import Register
+from tanuki.trackers.dataset_writer import install_shutdown_flush
 from tanuki.trackers.filesystem_buffered_logger import FilesystemBufferedLogger
 from tanuki.utils import get_key
 from tanuki.validator import Validator
@@ -414,7 +417,14 @@ def patch(patchable_func=None,
           ignore_data_storage: bool = False,
           teacher_models : list = [],
           student_model : str = "",
-          generation_params : dict = {}
+          generation_params : dict = {},
+          cache: bool = False,
+          parallel_repairs: int = 1,
+          speculative_budget: Optional[float] = None,
+          stream: bool = False,
+          structured_output: bool = False,
+          routing: Optional[str] = None,
+          failover: bool = False
           ):
     """
     The main decorator for patching a function.
@@ -428,31 +438,86 @@ def patch(patchable_func=None,
         ignore_data_storage (bool): Whether to ignore storing the data.
             If set to True, the data will not be stored in the finetune dataset and the align statements will not be saved
             This improves latency as communications with data storage is minimised
+        cache (bool): Whether to cache the validated outputs of the function.
+            If set to True, repeated calls with the same inputs are served from the cache instead of the model.
+            The cached outputs are invalidated when the function is finetuned
+        parallel_repairs (int): How many repairs to generate concurrently when an output fails type validation.
+            The candidates are spread over the teacher models and temperatures, and the first valid one is used.
+            This reduces the latency of repairs, at the cost of more requests to the teacher models
+        speculative_budget (float): The latency budget in seconds for speculative execution of the distilled model.
+            If set, while a newly distilled model is on probation it runs alongside a teacher model, and its output is
+            used if it passes validation within the budget. Otherwise the teacher output is used, without a serial repair
+        stream (bool): Whether to stream the generations of the function.
+            If set to True, a generation is stopped as soon as the end token of the model appears, or as soon as the
+            output so far can no longer be valid for the output type, instead of waiting for the full completion
+        structured_output (bool): Whether to constrain the generations to the JSON Schema of the output type.
+            If set to True, teacher models which support structured output (supports_structured_output in their config,
+            e.g. gpt-4o, on OpenAI and Anyscale) only generate outputs matching the schema. Other models, and output
+            types which can not be expressed as a JSON Schema, are generated as usual
+        routing (str): How to choose between the teacher models the input fits in, "latency" or "cost".
+            If set to "latency", the outputs are generated with the teacher model which currently has the lowest
+            latency, and with "cost" with the cheapest one. By default the first teacher model that fits is used
+        failover (bool): Whether the teacher models form a failover chain.
+            If set to True, when the provider of a model is unavailable the call moves on to the next teacher model
+            the input fits in, in the order of teacher_models, instead of spending all of its retries on the provider
     """
 
     def wrap(test_func):
+        _anonymous_usage(logger=logger.name)
+        # Compile the call plan once, so that the function is not inspected and hashed on every call
+        function_plan = Register.load_function_plan(test_func)
+        function_description = function_plan.description
+        func_hash = function_plan.func_hash
+        validator = Validator()
+
         @wraps(test_func)
         def wrapper(*args, **kwargs) -> Union[Embedding, Any]:
-            validator = Validator()
-            function_description: FunctionDescription = Register.load_function_description(test_func)
-
             # If the function is expected to return an embedding, we choose the embedding API, rather than an LLM.
-            if inspect.isclass(function_description.output_type_hint) and \
-                    issubclass(function_description.output_type_hint, Embedding):
-                instantiated: Embedding = embedding_modeler(args, function_description, kwargs)
+            if function_plan.is_embeddable:
+                instantiated: Embedding = embedding_modeler(args, function_plan, kwargs)
             else:
                 # If the function is expected to return a choice, we choose the LLM API.
-                instantiated: Any = language_modeler(args, 
-                                                     function_description, 
-                                                     kwargs, 
-                                                     validator, 
+                instantiated: Any = language_modeler(args,
+                                                     function_plan,
+                                                     kwargs,
+                                                     validator,
                                                      generation_params)
 
             return instantiated  # test_func(*args, **kwargs)
 
-        _anonymous_usage(logger=logger.name)
-        function_description = Register.load_function_description(test_func)
-        func_hash = function_description.__hash__()
+        if inspect.iscoroutinefunction(test_func):
+            # Coroutine functions get a coroutine wrapper, so that model requests are awaited on the running event loop
+            @wraps(test_func)
+            async def wrapper(*args, **kwargs) -> Union[Embedding, Any]:
+                if function_plan.is_embeddable:
+                    instantiated: Embedding = await embedding_modeler.acall(args, function_plan, kwargs)
+                else:
+                    instantiated: Any = await language_modeler.acall(args,
+                                                                     function_plan,
+                                                                     kwargs,
+                                                                     validator,
+                                                                     generation_params)
+
+                return instantiated
+
+            async def map_inputs(*iterables, max_concurrency: int = DEFAULT_MAP_CONCURRENCY) -> list:
+                return await amap_calls(wrapper, [(args, {}) for args in zip(*iterables)], max_concurrency)
+
+            async def map_kwargs(kwargs_list, max_concurrency: int = DEFAULT_MAP_CONCURRENCY) -> list:
+                return await amap_calls(wrapper, [((), kwargs) for kwargs in kwargs_list], max_concurrency)
+        else:
+            def map_inputs(*iterables, max_concurrency: int = DEFAULT_MAP_CONCURRENCY) -> list:
+                return map_calls(wrapper, [(args, {}) for args in zip(*iterables)], max_concurrency)
+
+            def map_kwargs(kwargs_list, max_concurrency: int = DEFAULT_MAP_CONCURRENCY) -> list:
+                return map_calls(wrapper, [((), kwargs) for kwargs in kwargs_list], max_concurrency)
+
+        # Bulk calls over the inputs, like the builtin map (e.g. classify.map(texts, max_concurrency=16)) or over
+        # dictionaries of keyword arguments. The outputs are returned in input order, and calls that failed have
+        # the raised exception in place of the output
+        wrapper.map = map_inputs
+        wrapper.map_kwargs = map_kwargs
+
         # Configure the function modeler using incoming parameters
         function_modeler.environment_id = environment_id
         if ignore_finetuning:
@@ -464,6 +529,20 @@ def patch(patchable_func=None,
         if ignore_data_storage:
             logging.info(f"The flag for ignoring data storage has been set True for {test_func.__name__}. No data will be read or saved and model distillation will not be performed.")
             function_modeler.store_data_blacklist.append(func_hash)
+        if cache:
+            language_modeler.enable_cache(func_hash)
+        if parallel_repairs > 1:
+            language_modeler.set_parallel_repairs(func_hash, parallel_repairs)
+        if speculative_budget is not None:
+            language_modeler.set_speculative_budget(func_hash, speculative_budget)
+        if stream:
+            language_modeler.enable_streaming(func_hash)
+        if structured_output:
+            language_modeler.enable_structured_output(func_hash)
+        if routing is not None:
+            language_modeler.set_routing_policy(func_hash, routing)
+        if failover:
+            language_modeler.enable_failover(func_hash)
         task_type = function_description.type
         function_modeler._configure_function_models(teacher_models, 
                                                     student_model,
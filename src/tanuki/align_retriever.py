@@ -0,0 +1,94 @@
+import re
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from tanuki.constants import BM25_K1, BM25_B
+
+_TERM = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a rendered input into lowercase word terms
+    """
+    return _TERM.findall(text.lower())
+
+
+class AlignRetriever(object):
+    """
+    A BM25 index over the rendered inputs of the align statements of a function, which ranks the align statements by
+    how relevant they are to the input of a call.
+    The postings of every term (the documents it appears in and its frequency in them) are kept in growable arrays,
+    so new align statements are indexed as they are added without rebuilding the index. The term weights depend on
+    the whole collection, so they are computed when a query is scored, as a vectorised sum over the postings of its
+    terms
+    """
+
+    def __init__(self, aligns: Sequence[dict], documents: Iterable[str] = (), k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            aligns: The align statements, in the order they were saved in, e.g. an AlignStore
+            documents: The rendered inputs of the align statements indexed so far
+            k1: The BM25 term frequency saturation
+            b: The BM25 document length normalisation
+        """
+        self.aligns = aligns
+        self.k1 = k1
+        self.b = b
+        # the document ids and the term frequencies of the postings of every term
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.document_lengths = array("d")
+        self.total_length = 0.0
+        for document in documents:
+            self.add(document)
+
+    def __len__(self) -> int:
+        return len(self.document_lengths)
+
+    def add(self, document: str) -> None:
+        """
+        Index the rendered input of the next align statement
+        """
+        doc_id = len(self.document_lengths)
+        terms = tokenize(document)
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            doc_ids, term_frequencies = self.postings.setdefault(term, (array("q"), array("d")))
+            doc_ids.append(doc_id)
+            term_frequencies.append(count)
+        self.document_lengths.append(len(terms))
+        self.total_length += len(terms)
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        Get the BM25 score of every indexed align statement for the query
+        """
+        nr_of_documents = len(self)
+        scores = np.zeros(nr_of_documents, dtype=np.float64)
+        if not nr_of_documents:
+            return scores
+        document_lengths = np.frombuffer(self.document_lengths, dtype=np.float64)
+        average_length = self.total_length / nr_of_documents if self.total_length > 0 else 1.0
+        for term in tokenize(query):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            doc_ids = np.frombuffer(postings[0], dtype=np.int64)
+            term_frequencies = np.frombuffer(postings[1], dtype=np.float64)
+            idf = np.log(1 + (nr_of_documents - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            length_norm = self.k1 * (1 - self.b + self.b * document_lengths[doc_ids] / average_length)
+            # every document appears at most once in the postings of a term
+            scores[doc_ids] += idf * term_frequencies * (self.k1 + 1) / (term_frequencies + length_norm)
+        return scores
+
+    def rank(self, query: str, k: int) -> List[int]:
+        """
+        Get the indices of the k align statements most relevant to the query, most relevant first.
+        Align statements with equal scores keep the order they were saved in
+        """
+        scores = self.score(query)
+        return np.argsort(-scores, kind="stable")[:k].tolist()
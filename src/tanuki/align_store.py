@@ -0,0 +1,251 @@
+import itertools
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+from tanuki.constants import DEFAULT_ALIGN_CACHE_SIZE, ALIGN_SCAN_CHUNK_SIZE
+from tanuki.output_parser import parse_output, OutputParseError
+from tanuki.utils import approximate_token_count
+
+_store_ids = itertools.count()
+
+
+class AlignCache(object):
+    """
+    The parsed align statements which are currently materialised, shared by all of the align stores in the process.
+    The least recently used statements are dropped once the total size of their serialised form exceeds the cap,
+    so that only the hot statements are kept in memory
+    """
+
+    def __init__(self, max_size: int = DEFAULT_ALIGN_CACHE_SIZE):
+        """
+        Args:
+            max_size: The maximum total size in bytes of the serialised statements kept materialised
+        """
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, example: Any, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (example, size)
+            self.size += size
+            self._evict()
+
+    def set_max_size(self, max_size: int) -> None:
+        """
+        Change the cap, dropping the least recently used statements if the cache is over it
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.max_size and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+
+
+_align_cache = AlignCache()
+
+
+def get_align_cache() -> AlignCache:
+    """
+    Get the cache of materialised align statements shared by the align stores
+    """
+    return _align_cache
+
+
+def set_align_cache(align_cache: AlignCache) -> None:
+    """
+    Replace the shared cache of materialised align statements, e.g. to change the memory cap of the process
+    """
+    global _align_cache
+    _align_cache = align_cache
+
+
+class AlignStore(object):
+    """
+    The align statements of a function, deduplicated and in the order they were saved in, with the token count of
+    every statement.
+    The statements of an align dataset file are served from a read-only memory map of the file, through an index of
+    their offsets, and statements added afterwards are kept in memory. Statements are parsed when they are read and
+    kept in the shared AlignCache, so the memory used does not grow with the size of the align datasets
+    """
+
+    def __init__(self, lines: Iterable[bytes] = (), align_cache: Optional[AlignCache] = None):
+        """
+        Args:
+            lines: The serialised align statements to add
+            align_cache: The cache of materialised statements, the shared one if not given
+        """
+        self.store_id = next(_store_ids)
+        self._align_cache = align_cache
+        self._mapping: Optional[mmap.mmap] = None
+        # the offsets of the statements in the memory map, followed by the statements added in memory
+        self._starts = array("q")
+        self._ends = array("q")
+        self._added_lines: List[bytes] = []
+        self._line_hashes = set()
+        self.token_counts = array("l")
+        # the number of lines of the mapped align dataset, including duplicates and lines which are not statements
+        self.mapped_line_count = 0
+        self.extend(lines)
+
+    @classmethod
+    def from_file(cls,
+                  path: str,
+                  on_add: Optional[Callable[[int, dict], None]] = None,
+                  align_cache: Optional[AlignCache] = None) -> "AlignStore":
+        """
+        Map an align dataset file. The file is read once to index the offsets of the statements, which are validated
+        and passed to on_add as they are indexed, but not kept in memory
+        Args:
+            path: The path of the align dataset
+            on_add: Called with the position and the parsed statement of every statement added to the store
+            align_cache: The cache of materialised statements, the shared one if not given
+        """
+        store = cls(align_cache=align_cache)
+        with open(path, "rb") as f:
+            try:
+                store._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can not be mapped
+                return store
+        mapping = store._mapping
+        newlines = store._find_newlines()
+        store.mapped_line_count = len(newlines)
+        line_starts = np.concatenate(([0], newlines + 1))
+        line_ends = np.concatenate((newlines, [len(mapping)]))
+        for start, end in zip(line_starts.tolist(), line_ends.tolist()):
+            line = mapping[start:end]
+            example = store._parse_new_line(line)
+            if example is None:
+                continue
+            # the offsets are of the stripped line, which is what the statement is parsed from
+            start += len(line) - len(line.lstrip())
+            end -= len(line) - len(line.rstrip())
+            store._starts.append(start)
+            store._ends.append(end)
+            store.token_counts.append(approximate_token_count(line.strip()))
+            if on_add is not None:
+                on_add(len(store) - 1, example)
+        return store
+
+    def _find_newlines(self) -> np.ndarray:
+        """
+        Get the offsets of the newlines in the memory map, scanning it in chunks to bound the memory used
+        """
+        newlines = []
+        view = np.frombuffer(self._mapping, dtype=np.uint8)
+        for chunk_start in range(0, len(view), ALIGN_SCAN_CHUNK_SIZE):
+            chunk = view[chunk_start:chunk_start + ALIGN_SCAN_CHUNK_SIZE]
+            newlines.append(np.flatnonzero(chunk == ord("\n")) + chunk_start)
+        return np.concatenate(newlines) if newlines else np.empty(0, dtype=np.int64)
+
+    @property
+    def align_cache(self) -> AlignCache:
+        return self._align_cache if self._align_cache is not None else get_align_cache()
+
+    def __len__(self) -> int:
+        return len(self._starts) + len(self._added_lines)
+
+    def __getitem__(self, position: int) -> dict:
+        """
+        Get the parsed statement at the position, from the cache if it is materialised
+        """
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("align statement index out of range")
+        key = (self.store_id, position)
+        example = self.align_cache.get(key)
+        if example is None:
+            line = self._get_line(position)
+            example = parse_output(line.decode('utf-8'))
+            self.align_cache.put(key, example, len(line))
+        return example
+
+    def __iter__(self) -> Iterator[dict]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def _get_line(self, position: int) -> bytes:
+        if position < len(self._starts):
+            return self._mapping[self._starts[position]:self._ends[position]]
+        return self._added_lines[position - len(self._starts)]
+
+    def _parse_new_line(self, line: bytes) -> Optional[dict]:
+        """
+        Parse a line which is not in the store yet, None if it is empty, a duplicate or not an align statement
+        """
+        line = line.strip()
+        if not line:
+            return None
+        line_hash = hash(line)
+        if line_hash in self._line_hashes:
+            return None
+        self._line_hashes.add(line_hash)
+        try:
+            example = parse_output(line.decode('utf-8'))
+        except (OutputParseError, UnicodeDecodeError):
+            return None
+        if not isinstance(example, dict) or "output" not in example:
+            return None
+        return example
+
+    def add(self, line: Union[bytes, bytearray]) -> Optional[dict]:
+        """
+        Add a serialised align statement in memory
+        Returns:
+            The parsed statement, None if it is empty, a duplicate or not an align statement
+        """
+        line = bytes(line).strip()
+        example = self._parse_new_line(line)
+        if example is None:
+            return None
+        self._added_lines.append(line)
+        self.token_counts.append(approximate_token_count(line))
+        self.align_cache.put((self.store_id, len(self) - 1), example, len(line))
+        return example
+
+    def extend(self, lines: Iterable[bytes]) -> List[dict]:
+        """
+        Add serialised align statements in memory, e.g. the lines of an align dataset
+        Returns:
+            The statements that were added
+        """
+        added = []
+        for line in lines:
+            example = self.add(line)
+            if example is not None:
+                added.append(example)
+        return added
+
+    def get(self, max: Optional[int] = None, token_limit: Optional[int] = None) -> List[dict]:
+        """
+        Get the first align statements, up to max statements and the token limit in total (None for no limits)
+        """
+        examples = []
+        for position in range(len(self) if max is None else min(max, len(self))):
+            if token_limit is not None:
+                token_limit -= self.token_counts[position]
+                if token_limit < 0:
+                    break
+            examples.append(self[position])
+        return examples
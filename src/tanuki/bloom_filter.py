@@ -1,21 +1,66 @@
 import hashlib
 import logging
 import math
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 from bitarray import bitarray
 
+from tanuki.constants import BLOOM_FILTER_INITIAL_CAPACITY, FALSE_POSITIVE_RATE, BLOOM_FILTER_GROWTH_FACTOR, \
+    BLOOM_FILTER_TIGHTENING_RATIO
 from tanuki.persistence.filter.bloom_interface import IBloomFilterPersistence
 
+# the two little endian 64 bit lanes of a 128 bit digest
+_LANES = struct.Struct("<QQ")
+
+
+def hash_string(string: str) -> Tuple[int, int]:
+    """
+    Hash a string into the two 64 bit lanes of a 128 bit digest
+    """
+    return _LANES.unpack(hashlib.blake2b(string.encode('utf-8'), digest_size=16).digest())
+
+
+def hash_strings(strings: Iterable[str]) -> np.ndarray:
+    """
+    Hash many strings, as an array of shape (number of strings, 2) of the two 64 bit lanes of their digests
+    """
+    digests = b"".join(hashlib.blake2b(string.encode('utf-8'), digest_size=16).digest() for string in strings)
+    return np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+
+
+def first_occurrences(strings: List[str]) -> np.ndarray:
+    """
+    Get whether each of the strings is the first occurrence of the string in the list
+    """
+    first = np.ones(len(strings), dtype=bool)
+    seen = set()
+    for position, string in enumerate(strings):
+        if string in seen:
+            first[position] = False
+        seen.add(string)
+    return first
+
 
 class BloomFilter:
+    """
+    A bloom filter of the datapoints which have been logged.
+    When the persistence supports it, the bit array is a shared memory map of the persisted state once it is loaded,
+    so that the bits set by every process are visible to all of them without saving and reloading the state.
+    The indices of a string are derived from the two 64 bit lanes of a single 128 bit digest (double hashing), and
+    are computed for many strings at once with add_many and lookup_many
+    """
 
     def __init__(self,
                  persistence: IBloomFilterPersistence,
                  size=None,
                  hash_count=None,
                  expected_number_of_elements=None,
-                 false_positive_probability=None):
+                 false_positive_probability=None,
+                 sync_interval: Optional[float] = None):
 
         if not persistence:
             raise ValueError("Persistence cannot be None, it must be an instance of IBloomFilterPersistence")
@@ -31,54 +76,167 @@ class BloomFilter:
 
         self.size = size
         self.hash_count = hash_count
-        self.bit_array, self.indices = self.init_bit_array(size)
+        self.bit_array = self.init_bit_array(size)
         self.persistence = persistence
+        # the interval in seconds at which a memory mapped state is flushed to the disk when saved, None to leave it
+        # to the OS
+        self.sync_interval = sync_interval
+        self._mapping = None
+        self._last_sync = time.monotonic()
 
     def init_bit_array(self, size):
         _bit_array = bitarray(size)
         _bit_array.setall(0)
-        _indices = np.zeros(size, dtype=np.int32)
-        return _bit_array, _indices
+        return _bit_array
 
     def hash_functions(self, string):
-        # h1(x)
-        hash1 = int(hashlib.sha256(string.encode('utf-8')).hexdigest(), 16)
-        # h2(x)
-        hash2 = int(hashlib.md5(string.encode('utf-8')).hexdigest(), 16)
-        return hash1, hash2
+        """
+        Hash the string into the two 64 bit lanes of a 128 bit digest
+        """
+        return hash_string(string)
 
-    def lookup(self, string):
+    def get_indices(self, string) -> List[int]:
+        """
+        Get the bit indices of a string, (h1 + seed * h2) mod size for every seed
+        """
         hash1, hash2 = self.hash_functions(string)
-        for seed in range(self.hash_count):
-            index = (hash1 + seed * hash2) % self.size
+        size = self.size
+        return [(hash1 + seed * hash2) % size for seed in range(self.hash_count)]
 
-            #print(f"Lookup: Seed={seed}, Digest={index}, BitValue={self.bit_array[index]}")
-            if self.bit_array[index] == 0:
+    def get_indices_many(self, strings: Iterable[str]) -> np.ndarray:
+        """
+        Get the bit indices of many strings at once, as an array of shape (number of strings, hash count)
+        """
+        return self._get_lane_indices(hash_strings(strings))
+
+    def _get_lane_indices(self, lanes: np.ndarray) -> np.ndarray:
+        size = np.uint64(self.size)
+        seeds = np.arange(self.hash_count, dtype=np.uint64)
+        # the lanes are reduced first, so that the sums can not overflow, which gives the same indices as reducing
+        # the sums of the full lanes
+        lanes = lanes % size
+        return (lanes[:, :1] + seeds * lanes[:, 1:]) % size
+
+    def lookup(self, string):
+        return self.lookup_hashes(*self.hash_functions(string))
+
+    def lookup_hashes(self, hash1, hash2):
+        """
+        Check whether the string with the hash lanes may have been added
+        """
+        size, bit_array = self.size, self.bit_array
+        for seed in range(self.hash_count):
+            if not bit_array[(hash1 + seed * hash2) % size]:
                 return False
         return True
 
     def add(self, string):
-        hash1, hash2 = self.hash_functions(string)
+        self.add_hashes(*self.hash_functions(string))
+
+    def add_hashes(self, hash1, hash2):
+        """
+        Add the string with the hash lanes
+        """
+        size, bit_array = self.size, self.bit_array
         for seed in range(self.hash_count):
-            index = (hash1 + seed * hash2) % self.size
-            self.bit_array[index] = 1
-            #print(f"Add: Seed={seed}, Digest={index}, BitValue={self.bit_array[index]}")
+            bit_array[(hash1 + seed * hash2) % size] = 1
+
+    def lookup_many(self, strings: Iterable[str]) -> List[bool]:
+        """
+        Check whether each of the strings may have been added
+        """
+        return self.lookup_lanes(hash_strings(strings)).tolist()
+
+    def lookup_lanes(self, lanes: np.ndarray) -> np.ndarray:
+        """
+        Check whether each of the strings with the hash lanes (from hash_strings) may have been added
+        """
+        indices = self._get_lane_indices(lanes)
+        bits = np.frombuffer(self.bit_array, dtype=np.uint8)
+        return self._get_bits(bits, indices).all(axis=1)
+
+    def add_many(self, strings: Iterable[str]) -> List[bool]:
+        """
+        Add the strings
+        Returns:
+            Whether each string was new, i.e. not in the filter before and not earlier in the strings
+        """
+        strings = list(strings)
+        lanes = hash_strings(strings)
+        new = ~self.lookup_lanes(lanes) & first_occurrences(strings)
+        self.add_lanes(lanes)
+        return new.tolist()
+
+    def add_lanes(self, lanes: np.ndarray) -> None:
+        """
+        Add the strings with the hash lanes (from hash_strings)
+        """
+        indices = self._get_lane_indices(lanes).ravel()
+        bits = np.frombuffer(self.bit_array, dtype=np.uint8)
+        # the bit order of the bit array is big endian, the first bit is the highest bit of the first byte
+        np.bitwise_or.at(bits, indices >> np.uint64(3), np.uint8(0x80) >> (indices & np.uint64(7)).astype(np.uint8))
+
+    @staticmethod
+    def _get_bits(bits: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        return (bits[indices >> np.uint64(3)] >> (np.uint64(7) - (indices & np.uint64(7))).astype(np.uint8)) & 1 == 1
+
+    def estimate_count(self) -> float:
+        """
+        Estimate the number of strings which have been added from the number of set bits, which counts the strings
+        added by all of the processes sharing a memory mapped state
+        """
+        set_bits = self.bit_array.count(1, 0, self.size)
+        if set_bits >= self.size:
+            return float("inf")
+        return -self.size / self.hash_count * math.log(1 - set_bits / self.size)
+
+    def reset(self):
+        """
+        Clear all of the bits, including those of a memory mapped state
+        """
+        self.bit_array.setall(0)
 
     def save(self):
+        if self._mapping is not None:
+            # the bits are already in the shared memory map, which the OS writes back to the file
+            if self.sync_interval is not None and time.monotonic() - self._last_sync >= self.sync_interval:
+                self.sync()
+            return
         self.persistence.save(self.bit_array)
 
+    def sync(self):
+        """
+        Flush a memory mapped state to the disk
+        """
+        if self._mapping is not None:
+            self._mapping.flush()
+            self._last_sync = time.monotonic()
+
     def load(self):
+        mapping = self._map_state()
+        if mapping is not None:
+            self._mapping = mapping
+            self.bit_array = bitarray(buffer=mapping, endian="big")
+            return
+
         self.bit_array = self.persistence.load()
 
-        length_in_bytes = int(len(self.bit_array)/8)
+        length_in_bytes = math.ceil(len(self.bit_array) / 8)
         expected_length = math.ceil(self.size / 8)
         if length_in_bytes != expected_length:
             logging.warning("Bit array length does not match expected size, and so might be corrupted. Reinitializing.")
-            self.bit_array, self.indices = self.init_bit_array(self.size)
+            self.bit_array = self.init_bit_array(self.size)
             self.save()
 
 
 
+    def _map_state(self):
+        try:
+            return self.persistence.map(math.ceil(self.size / 8))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not memory map the bloom filter, loading it into memory instead: {e}")
+            return None
+
     @staticmethod
     def optimal_bloom_filter_params(n, p):
         """
@@ -92,4 +250,287 @@ class BloomFilter:
         """
         m = - (n * math.log(p)) / (math.log(2) ** 2)
         k = (m / n) * math.log(2)
-        return int(math.ceil(m)), int(math.ceil(k))
\ No newline at end of file
+        return int(math.ceil(m)), int(math.ceil(k))
+
+
+class ScalableBloomFilter:
+    """
+    A bloom filter which grows with the number of strings added to it, as a series of bloom filter slices.
+    Once the last slice holds its capacity, a slice growth_factor times larger is added, with a false positive rate
+    tightened by tightening_ratio, so that the false positive rate of the whole filter stays below the target however
+    many strings are added. The parameters of the slices are persisted as metadata. The parameters of a slice only
+    depend on its position, so processes which add the same slice at the same time share it
+    """
+
+    def __init__(self,
+                 persistence: IBloomFilterPersistence,
+                 initial_capacity: int = BLOOM_FILTER_INITIAL_CAPACITY,
+                 false_positive_probability: float = FALSE_POSITIVE_RATE,
+                 growth_factor: float = BLOOM_FILTER_GROWTH_FACTOR,
+                 tightening_ratio: float = BLOOM_FILTER_TIGHTENING_RATIO,
+                 sync_interval: Optional[float] = None):
+        """
+        Args:
+            persistence: The persistence of the filter, every slice is kept in a partition of it
+            initial_capacity: The number of strings the first slice holds
+            false_positive_probability: The target false positive rate of the whole filter
+            growth_factor: How many times larger every slice is than the previous one
+            tightening_ratio: How many times lower the false positive rate of every slice is than the previous one
+            sync_interval: The sync interval of the memory mapped slices, None to leave it to the OS
+        """
+        self.persistence = persistence
+        self.initial_capacity = initial_capacity
+        self.false_positive_probability = false_positive_probability
+        self.growth_factor = growth_factor
+        self.tightening_ratio = tightening_ratio
+        self.sync_interval = sync_interval
+        self.slices: List[BloomFilter] = []
+        self.capacities: List[int] = []
+        # the number of strings in every slice, estimated from the set bits for the slices of a loaded filter
+        self.counts: List[float] = []
+        self.loaded = False
+        self._metadata_changed = False
+        self._lock = threading.RLock()
+
+    def get_slice_params(self, position: int) -> Tuple[int, float]:
+        """
+        Get the capacity and the false positive rate of the slice at the position
+        """
+        capacity = int(math.ceil(self.initial_capacity * self.growth_factor ** position))
+        # the false positive rates of the slices are a geometric series, which sums up to the target rate
+        probability = self.false_positive_probability * (1 - self.tightening_ratio) * self.tightening_ratio ** position
+        return capacity, probability
+
+    def lookup(self, string) -> bool:
+        hash1, hash2 = hash_string(string)
+        # the newest slices hold the most strings
+        return any(bloom_filter.lookup_hashes(hash1, hash2) for bloom_filter in reversed(self.slices))
+
+    def add(self, string) -> None:
+        hash1, hash2 = hash_string(string)
+        with self._lock:
+            position = self._get_current_slice()
+            self.slices[position].add_hashes(hash1, hash2)
+            self.counts[position] += 1
+
+    def lookup_many(self, strings: Iterable[str]) -> List[bool]:
+        """
+        Check whether each of the strings may have been added
+        """
+        return self.lookup_lanes(hash_strings(strings)).tolist()
+
+    def lookup_lanes(self, lanes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(lanes), dtype=bool)
+        for bloom_filter in self.slices:
+            found |= bloom_filter.lookup_lanes(lanes)
+        return found
+
+    def add_many(self, strings: Iterable[str]) -> List[bool]:
+        """
+        Add the strings which are new, filling the slices in order
+        Returns:
+            Whether each string was new, i.e. not in the filter before and not earlier in the strings
+        """
+        strings = list(strings)
+        lanes = hash_strings(strings)
+        with self._lock:
+            new = ~self.lookup_lanes(lanes) & first_occurrences(strings)
+            pending = lanes[new]
+            while len(pending):
+                position = self._get_current_slice()
+                room = max(1, int(self.capacities[position] - self.counts[position]))
+                self.slices[position].add_lanes(pending[:room])
+                self.counts[position] += len(pending[:room])
+                pending = pending[room:]
+        return new.tolist()
+
+    @property
+    def bit_array(self) -> bitarray:
+        """
+        The bits of all of the slices
+        """
+        bit_array = bitarray(endian="big")
+        for bloom_filter in self.slices:
+            bit_array.extend(bloom_filter.bit_array)
+        return bit_array
+
+    def _get_current_slice(self) -> int:
+        """
+        Get the position of the slice to add to, adding a slice if the last one is full
+        """
+        if self.slices and not self._is_full(len(self.slices) - 1):
+            return len(self.slices) - 1
+        if self.loaded:
+            # another process may have added the next slice already
+            self._load_slices()
+        if not self.slices or self._is_full(len(self.slices) - 1):
+            capacity, probability = self.get_slice_params(len(self.slices))
+            size, hash_count = BloomFilter.optimal_bloom_filter_params(capacity, probability)
+            self._append_slice(capacity, size, hash_count)
+            self._metadata_changed = True
+            if self.loaded:
+                self._save_metadata()
+        return len(self.slices) - 1
+
+    def _is_full(self, position: int) -> bool:
+        if self.counts[position] < self.capacities[position]:
+            return False
+        if self.loaded:
+            # the count only includes the strings added by this process since the slice was loaded
+            self.counts[position] = self.slices[position].estimate_count()
+        return self.counts[position] >= self.capacities[position]
+
+    def _append_slice(self, capacity: int, size: int, hash_count: int) -> None:
+        bloom_filter = BloomFilter(self.persistence.get_partition(str(len(self.slices))),
+                                   size=size,
+                                   hash_count=hash_count,
+                                   sync_interval=self.sync_interval)
+        count = 0
+        if self.loaded:
+            bloom_filter.load()
+            count = bloom_filter.estimate_count()
+        self.slices.append(bloom_filter)
+        self.capacities.append(capacity)
+        self.counts.append(count)
+
+    def _load_slices(self) -> None:
+        """
+        Load the slices in the metadata which have not been loaded yet
+        """
+        metadata = self.persistence.load_metadata()
+        if not metadata:
+            return
+        for slice_metadata in metadata["slices"][len(self.slices):]:
+            self._append_slice(slice_metadata["capacity"], slice_metadata["size"], slice_metadata["hash_count"])
+
+    def _save_metadata(self) -> None:
+        self.persistence.save_metadata({"slices": [
+            {"capacity": capacity, "size": bloom_filter.size, "hash_count": bloom_filter.hash_count}
+            for capacity, bloom_filter in zip(self.capacities, self.slices)]})
+        self._metadata_changed = False
+
+    def save(self) -> None:
+        with self._lock:
+            for bloom_filter in self.slices:
+                bloom_filter.save()
+            if self._metadata_changed:
+                self._save_metadata()
+
+    def load(self) -> None:
+        """
+        Load the persisted slices, after which the slices are shared with the other processes which load them
+        """
+        with self._lock:
+            self.loaded = True
+            self.slices, self.capacities, self.counts = [], [], []
+            self._load_slices()
+
+
+class PartitionedBloomFilter:
+    """
+    A scalable bloom filter per partition, so that the false positive rate and the memory of the filter of every
+    function follow its own number of datapoints.
+    The partition of a string is its prefix up to the first underscore, which is the function hash in the
+    "<function hash>_<datapoint>" strings the dataset loggers use. The filters of the partitions are created, or loaded
+    once the filter is loaded, when they are first used
+    """
+
+    def __init__(self,
+                 persistence: IBloomFilterPersistence,
+                 initial_capacity: int = BLOOM_FILTER_INITIAL_CAPACITY,
+                 false_positive_probability: float = FALSE_POSITIVE_RATE,
+                 growth_factor: float = BLOOM_FILTER_GROWTH_FACTOR,
+                 tightening_ratio: float = BLOOM_FILTER_TIGHTENING_RATIO,
+                 sync_interval: Optional[float] = None):
+        """
+        Args:
+            persistence: The persistence of the filter, the filter of every partition is kept in a partition of it
+            The other arguments configure the scalable bloom filters of the partitions
+        """
+        self.persistence = persistence
+        self.initial_capacity = initial_capacity
+        self.false_positive_probability = false_positive_probability
+        self.growth_factor = growth_factor
+        self.tightening_ratio = tightening_ratio
+        self.sync_interval = sync_interval
+        self.partitions: Dict[str, ScalableBloomFilter] = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_partition_name(string: str) -> str:
+        return string.partition("_")[0]
+
+    def get_partition(self, name: str) -> ScalableBloomFilter:
+        """
+        Get the filter of a partition, creating it if it is not used yet
+        """
+        bloom_filter = self.partitions.get(name)
+        if bloom_filter is not None:
+            return bloom_filter
+        with self._lock:
+            if name not in self.partitions:
+                bloom_filter = ScalableBloomFilter(self.persistence.get_partition(name),
+                                                   initial_capacity=self.initial_capacity,
+                                                   false_positive_probability=self.false_positive_probability,
+                                                   growth_factor=self.growth_factor,
+                                                   tightening_ratio=self.tightening_ratio,
+                                                   sync_interval=self.sync_interval)
+                if self.loaded:
+                    bloom_filter.load()
+                self.partitions[name] = bloom_filter
+            return self.partitions[name]
+
+    def lookup(self, string: str) -> bool:
+        return self.get_partition(self.get_partition_name(string)).lookup(string)
+
+    def add(self, string: str) -> None:
+        self.get_partition(self.get_partition_name(string)).add(string)
+
+    def lookup_many(self, strings: Iterable[str]) -> List[bool]:
+        """
+        Check whether each of the strings may have been added
+        """
+        return self._map_partitions(strings, lambda bloom_filter, batch: bloom_filter.lookup_many(batch))
+
+    def add_many(self, strings: Iterable[str]) -> List[bool]:
+        """
+        Add the strings
+        Returns:
+            Whether each string was new, i.e. not in the filter before and not earlier in the strings
+        """
+        return self._map_partitions(strings, lambda bloom_filter, batch: bloom_filter.add_many(batch))
+
+    def _map_partitions(self, strings, function) -> List[bool]:
+        strings = list(strings)
+        positions_by_partition: Dict[str, List[int]] = {}
+        for position, string in enumerate(strings):
+            positions_by_partition.setdefault(self.get_partition_name(string), []).append(position)
+        results = [False] * len(strings)
+        for name, positions in positions_by_partition.items():
+            batch_results = function(self.get_partition(name), [strings[position] for position in positions])
+            for position, result in zip(positions, batch_results):
+                results[position] = result
+        return results
+
+    @property
+    def bit_array(self) -> bitarray:
+        """
+        The bits of the filters of all of the partitions in use
+        """
+        bit_array = bitarray(endian="big")
+        for name in sorted(self.partitions):
+            bit_array.extend(self.partitions[name].bit_array)
+        return bit_array
+
+    def save(self) -> None:
+        for bloom_filter in list(self.partitions.values()):
+            bloom_filter.save()
+
+    def load(self) -> None:
+        """
+        Load the filters of the partitions from the persistence from now on, the filters in use are reloaded
+        """
+        with self._lock:
+            self.loaded = True
+            self.partitions = {}
@@ -20,9 +20,25 @@ NEGATIVE_EMBEDDABLE_ALIGNMENTS = "negative"
 NEGATIVE_FILE_EXTENSION_TYPE = Literal[".negative"]
 NEGATIVE_FILE_EXTENSION: NEGATIVE_FILE_EXTENSION_TYPE = ".negative"
 
+# the extension of the sidecar index of a dataset file, appended to the extension of the dataset
+DATASET_INDEX_EXTENSION = ".index"
+# the number of bytes at the end of the indexed data which are checksummed, to tell appends from rewrites
+DATASET_INDEX_CHECKSUM_SIZE = 4096
+
 # Bloom filter default config
 EXPECTED_ITEMS = 10000
 FALSE_POSITIVE_RATE = 0.01
+# the interval in seconds at which the memory mapped bloom filter is flushed to the disk, besides the OS write back
+BLOOM_FILTER_SYNC_INTERVAL = 30
+# every function has its own scalable bloom filter, which starts with a slice for the initial capacity and adds a
+# slice growth factor times larger, with a false positive rate tightened by the ratio, whenever the last one is full
+BLOOM_FILTER_INITIAL_CAPACITY = 1000
+BLOOM_FILTER_GROWTH_FACTOR = 2
+BLOOM_FILTER_TIGHTENING_RATIO = 0.5
+BLOOM_FILTER_PARTITIONS = "bloom_filters"
+# the version of the hashing of the bloom filter strings, saved with the state of the filter. A state saved with
+# another version (or without one) is rebuilt from the datasets, as its bits were set for other indices
+BLOOM_FILTER_HASH_VERSION = 2
 
 # The name of the library
 LIB_NAME = "tanuki"
@@ -42,4 +58,77 @@ ANYSCALE_PROVIDER = "anyscale"
 
 # model type strings
 TEACHER_MODEL = "teacher"
-DISTILLED_MODEL = "distillation"
\ No newline at end of file
+DISTILLED_MODEL = "distillation"
+
+# the default number of concurrent calls made by the map functions of patched functions
+DEFAULT_MAP_CONCURRENCY = 8
+
+# response cache default config, the TTL is in seconds
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_CACHE_TTL = 60 * 60 * 24 * 7
+# the maximum number of entries of the on-disk tier, which is pruned to this share of it when it is full
+DEFAULT_CACHE_DISK_SIZE = 65536
+CACHE_DISK_PRUNE_RATIO = 0.9
+CACHE_DIRECTORY_NAME = "cache"
+
+# HTTP transport default config, the timeouts are in seconds
+DEFAULT_HTTP_POOL_CONNECTIONS = 10
+DEFAULT_HTTP_POOL_MAXSIZE = 32
+DEFAULT_HTTP_CONNECT_TIMEOUT = 10
+DEFAULT_HTTP_READ_TIMEOUT = 50
+
+# retry policy default config, the delays and timeouts are in seconds
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BASE_DELAY = 0.5
+DEFAULT_RETRY_MAX_DELAY = 20
+DEFAULT_MAX_RETRY_AFTER = 60
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 10
+DEFAULT_CIRCUIT_RESET_TIMEOUT = 30
+
+# token estimator calibration config, the factor bounds how far the provider usage data can scale the estimates
+MIN_TOKEN_CALIBRATION_SAMPLES = 5
+MAX_TOKEN_CALIBRATION_FACTOR = 4
+
+# parallel repair config, the candidates beyond one per teacher model are generated at increasing temperatures,
+# starting from the default generation temperature of the providers
+DEFAULT_TEMPERATURE = 0.1
+DEFAULT_REPAIR_TEMPERATURE_STEP = 0.3
+
+# the number of outputs a newly distilled model is judged on, it is reverted if over half of them are faulty
+DISTILLED_MODEL_PROBATION_WINDOW = 10
+
+# the limits of the output parser, longer or deeper nested outputs are not parsed
+MAX_PARSED_OUTPUT_LENGTH = 1000000
+MAX_PARSED_OUTPUT_DEPTH = 100
+
+# model routing config, the decay is the weight of the latest request in the rolling statistics of a model
+LATENCY_ROUTING = "latency"
+COST_ROUTING = "cost"
+ROUTING_POLICIES = (LATENCY_ROUTING, COST_ROUTING)
+DEFAULT_ROUTING_STATS_DECAY = 0.2
+DEFAULT_ROUTING_EXPLORATION_RATE = 0.05
+
+# the retries of a request before failing over to the next model of the failover chain of a function
+DEFAULT_FAILOVER_MAX_RETRIES = 1
+
+# align retrieval config, functions with more align statements than fit in the prompt get the most relevant ones
+DEFAULT_ALIGN_RETRIEVAL_K = 16
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# align storage config, the align datasets are memory mapped and only the recently used align statements are kept
+# parsed in memory, up to the cache size (in bytes of the serialised statements) per process
+DEFAULT_ALIGN_CACHE_SIZE = 64 * 1024 * 1024
+ALIGN_SCAN_CHUNK_SIZE = 16 * 1024 * 1024
+
+# dataset writer config, the datapoints are appended by a background thread once the pending data of a file reaches
+# the batch size (in bytes) or the oldest pending datapoint has waited for the interval (in seconds)
+DATASET_WRITE_QUEUE_SIZE = 10000
+DATASET_WRITE_BATCH_SIZE = 64 * 1024
+DATASET_WRITE_INTERVAL = 0.5
+DATASET_WRITE_CLOSE_TIMEOUT = 5
+# the fsync policies of the dataset writer, never (left to the OS), after every batch or when the writer is closed
+FSYNC_NEVER = "never"
+FSYNC_ON_WRITE = "write"
+FSYNC_ON_CLOSE = "close"
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_ON_WRITE, FSYNC_ON_CLOSE)
@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Tuple
+
+from tanuki.constants import DEFAULT_MAP_CONCURRENCY
+
+
+def _capture_call(func: Callable, args: tuple, kwargs: dict) -> Any:
+    """
+    Call the function, returning the raised exception instead of propagating it
+    """
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        return e
+
+
+def map_calls(func: Callable,
+              calls: Iterable[Tuple[tuple, dict]],
+              max_concurrency: int = DEFAULT_MAP_CONCURRENCY) -> List[Any]:
+    """
+    Call the function for every (args, kwargs) pair on a bounded thread pool
+    Args:
+        func: The function to call
+        calls: The positional and keyword arguments of each call
+        max_concurrency: The maximum number of calls in flight at the same time
+    Returns:
+        The outputs in the order of the calls. If a call raised an exception, the exception is returned in its place
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+    calls = list(calls)
+    if not calls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(calls))) as executor:
+        futures = [executor.submit(_capture_call, func, args, kwargs) for args, kwargs in calls]
+        return [future.result() for future in futures]
+
+
+async def amap_calls(func: Callable,
+                     calls: Iterable[Tuple[tuple, dict]],
+                     max_concurrency: int = DEFAULT_MAP_CONCURRENCY) -> List[Any]:
+    """
+    Await the coroutine function for every (args, kwargs) pair, with a bounded number of calls in flight
+    Args:
+        func: The coroutine function to call
+        calls: The positional and keyword arguments of each call
+        max_concurrency: The maximum number of calls in flight at the same time
+    Returns:
+        The outputs in the order of the calls. If a call raised an exception, the exception is returned in its place
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded_call(args, kwargs):
+        async with semaphore:
+            return await func(*args, **kwargs)
+
+    return await asyncio.gather(*[bounded_call(args, kwargs) for args, kwargs in calls], return_exceptions=True)
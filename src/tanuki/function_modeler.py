@@ -1,22 +1,26 @@
-import ast
 import datetime
 import io
 import json
-from typing import List, Tuple, Dict, Union
+from typing import Any, List, Optional, Tuple, Dict, Union
 
 import logging
+import threading
 
 from tanuki.constants import EXAMPLE_ELEMENT_LIMIT, PATCHES, SYMBOLIC_ALIGNMENTS, POSITIVE_EMBEDDABLE_ALIGNMENTS, \
-    NEGATIVE_EMBEDDABLE_ALIGNMENTS, OPENAI_PROVIDER
+    NEGATIVE_EMBEDDABLE_ALIGNMENTS, OPENAI_PROVIDER, DISTILLED_MODEL_PROBATION_WINDOW
+from tanuki.align_retriever import AlignRetriever
+from tanuki.align_store import AlignStore
 from tanuki.models.function_type import FunctionType
 from tanuki.language_models.llm_configs import DEFAULT_TEACHER_MODELS, DEFAULT_EMBEDDING_MODELS, DEFAULT_STUDENT_MODELS
 from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
 from tanuki.language_models.llm_finetune_api_abc import LLM_Finetune_API
 from tanuki.models.finetune_job import FinetuneJob
 from tanuki.models.function_description import FunctionDescription
+from tanuki.models.function_plan import as_function_plan
 from tanuki.models.function_example import FunctionExample
+from tanuki.output_parser import parse_output
 from tanuki.trackers.dataset_worker import DatasetWorker
-from tanuki.utils import approximate_token_count, prepare_object_for_saving, encode_int, decode_int
+from tanuki.utils import prepare_object_for_saving, encode_int, decode_int, get_key
 import copy
 from tanuki.models.function_config import FunctionConfig
 from tanuki.models.api_manager import APIManager
@@ -33,8 +37,15 @@ class FunctionModeler(object):
         self.function_configs = {}
         self.data_worker = data_worker
         self.distillation_token_limit = 3000  # the token limit for finetuning
-        self.symbolic_align_buffer = {}
-        self.embeddable_align_buffer = {}
+        # the deduplicated symbolic aligns of every function, memory mapped from the align datasets
+        self.symbolic_align_stores = {}
+        # exact-match index of the symbolic aligns, {func_hash: {hash(get_key(args, kwargs)): position in the store}}
+        self.symbolic_align_index = {}
+        # the version of the symbolic align set of every function, bumped whenever the align store changes
+        self.symbolic_align_versions = {}
+        # the retrieval index over all of the symbolic aligns of every function, kept in step with the align store
+        self.symbolic_align_retrievers = {}
+        self.embeddable_align_stores = {}
         self._get_datasets()
         self.environment_id = environment_id
         self.check_finetune_blacklist = []
@@ -44,6 +55,13 @@ class FunctionModeler(object):
         self.teacher_models_override = {}
         self.student_model_override = {}
         self.startup_logging_checker = {}
+        # patched functions can be called from many threads (e.g. with map), so the datapoint bookkeeping of every
+        # function is locked, and only one thread at a time checks whether a function should be finetuned
+        self._datapoint_locks = {}
+        self._finetune_checks = set()
+        # the functions whose config is saved with the next group commit of the dataset writer
+        self._pending_config_updates = set()
+        self._locks_lock = threading.Lock()
 
     def _get_dataset_info(self, dataset_type, func_hash, type="length"):
         """
@@ -188,17 +206,17 @@ class FunctionModeler(object):
                     self.dataset_sizes[NEGATIVE_EMBEDDABLE_ALIGNMENTS][function_hash] = 1
 
         if new_datapoint:
-            # update align buffer
-            if function_hash not in self.embeddable_align_buffer:
-                self.embeddable_align_buffer[function_hash] = bytearray()
-            self.embeddable_align_buffer[function_hash].extend(str(example.__dict__).encode('utf-8') + b'\r\n')
+            # update align store
+            if function_hash not in self.embeddable_align_stores:
+                self.embeddable_align_stores[function_hash] = AlignStore()
+            self.embeddable_align_stores[function_hash].add(str(example.__dict__).encode('utf-8'))
 
 
     def save_symbolic_align_statements(self, function_hash, args, kwargs, output):
         """
-        Save the align statements and add to the align buffer
+        Save the align statements and add to the align store
         Do not save if the function hash is in the store data blacklist
-        Then just add the datapoints to the align buffer
+        Then just add the datapoints to the align store
         """
         # prepare output for saving and later parsing
         # make a deepcopy of the output to avoid changing the original object
@@ -223,11 +241,16 @@ class FunctionModeler(object):
             else:
                 self.dataset_sizes[SYMBOLIC_ALIGNMENTS][function_hash] = 1
 
-        if new_datapoint:
-            # update align buffer
-            if function_hash not in self.symbolic_align_buffer:
-                self.symbolic_align_buffer[function_hash] = bytearray()
-            self.symbolic_align_buffer[function_hash].extend(str(example.__dict__).encode('utf-8') + b'\r\n')
+        # the store skips statements it already has, so the statement is added even if it is not a new datapoint
+        # for the data worker, to keep it available for exact matching
+        if function_hash not in self.symbolic_align_stores:
+            self._set_symbolic_align_store(function_hash, AlignStore())
+        store = self.symbolic_align_stores[function_hash]
+        added = store.add(str(example.__dict__).encode('utf-8'))
+        if added is not None:
+            self._add_to_symbolic_align_index(function_hash, len(store) - 1, parsed_args, parsed_kwargs)
+            self.symbolic_align_retrievers[function_hash].add(self._render_symbolic_align_input(added))
+            self._bump_symbolic_align_version(function_hash)
 
     def save_symbolic_datapoint(self, func_hash, example):
         """
@@ -236,10 +259,9 @@ class FunctionModeler(object):
         written_datapoints = self.data_worker.log_symbolic_patch(func_hash, example)
         for func_hash, datapoints in written_datapoints.items():
             if func_hash in self.dataset_sizes[PATCHES]:
-                # if the dataset size is -1, it means we havent read in the dataset size yet
-                if self.dataset_sizes[PATCHES][func_hash] == -1:
-                    self.dataset_sizes[PATCHES][func_hash] = self._get_dataset_info(PATCHES, func_hash, type="length")
-                else:
+                # if the dataset size is -1, it means we havent read in the dataset size yet, it is read when the
+                # finetuning condition is checked, once the queued datapoints are written, so it includes them
+                if self.dataset_sizes[PATCHES][func_hash] != -1:
                     self.dataset_sizes[PATCHES][func_hash] += datapoints
             else:
                 self.dataset_sizes[PATCHES][func_hash] = datapoints
@@ -250,75 +272,143 @@ class FunctionModeler(object):
         Get all symbolic aligns for a function hash
         """
 
-        if func_hash not in self.symbolic_align_buffer:
+        if func_hash not in self.symbolic_align_stores:
             return []
 
-        buffer = self.symbolic_align_buffer[func_hash]
-        return self._get_examples_from_alignment_buffer(buffer, max)
+        # the aligns are parsed and token counted when they are added to the store
+        return self.symbolic_align_stores[func_hash].get(max, EXAMPLE_ELEMENT_LIMIT)
 
-    def get_embeddable_alignments(self, func_hash, max=20):
+    def get_symbolic_align_retriever(self, func_hash) -> Optional[AlignRetriever]:
         """
-        Get all embeddable aligns for a function hash
+        Get the retrieval index over all of the symbolic aligns of a function, None if there are no aligns.
+        The index is built when the align store is loaded, and the aligns added afterwards are indexed as they are added
         """
+        retriever = self.symbolic_align_retrievers.get(func_hash)
+        if retriever is None or not len(retriever):
+            return None
+        return retriever
 
-        if func_hash not in self.embeddable_align_buffer:
-            return []
-
-        buffer = self.embeddable_align_buffer[func_hash]
-        return self._get_examples_from_alignment_buffer(buffer, max)
-
-    def _get_examples_from_alignment_buffer(self, buffer, max=20):
+    @staticmethod
+    def _render_symbolic_align_input(align) -> str:
         """
-        Get examples from a buffer
+        Render the inputs of an align statement, which is what the retrieval index matches the inputs of calls against
         """
+        return f"Args: {align.get('args', ())}\nKwargs: {align.get('kwargs', {})}"
 
-        split_buffer = bytes(buffer).split(b"\n")
-
-        # byte array of stringed python dicts into dict objects
-        example_set = set()
-        for example in split_buffer:
-            if example == b"":
-                continue
-            example_set.add(example)
+    def _set_symbolic_align_store(self, func_hash, store, documents=()):
+        """
+        Set the align store of a function, with a retrieval index over the rendered inputs of its aligns
+        """
+        # the aligns are read from the store when they are ranked, only the rendered inputs are indexed
+        self.symbolic_align_retrievers[func_hash] = AlignRetriever(store, documents)
+        self.symbolic_align_stores[func_hash] = store
 
-        # easy and straightforward way to get nr of words (not perfect but doesnt need to be)
-        # Can do the proper way of tokenizing later, it might be slower and we dont need 100% accuracy
-        example_element_limit = EXAMPLE_ELEMENT_LIMIT
+    def get_embeddable_alignments(self, func_hash, max=20):
+        """
+        Get all embeddable aligns for a function hash
+        """
 
-        examples = []
-        for example_bytes in split_buffer:
-            if example_bytes in example_set:
-                nr_of_elements = approximate_token_count(example_bytes)
-                example_element_limit -= nr_of_elements
-                if example_element_limit < 0:
-                    break
-                example = example_bytes.decode('utf-8')
-                # json load the example
-                try:
-                    example = json.loads(example)
-                except:
-                    example = ast.literal_eval(example)
-                examples.append(example)
-                example_set.remove(example_bytes)
+        if func_hash not in self.embeddable_align_stores:
+            return []
 
-        return list(examples)[:max]
+        return self.embeddable_align_stores[func_hash].get(max, EXAMPLE_ELEMENT_LIMIT)
 
     def load_symbolic_align_statements(self, function_hash):
         """
         Load all align statements
         First check the data storage blacklist,
-        if the func hash is in the blacklist, then set the dataset size to 0 and the align buffer to empty bytearray
+        if the func hash is in the blacklist, then set the dataset size to 0 and the align store to an empty store
+        Align datasets stored as local files are memory mapped, so only the align statements in use are kept in memory
         """
         if function_hash in self.store_data_blacklist:
             self.dataset_sizes[SYMBOLIC_ALIGNMENTS][function_hash] = 0
-            self.symbolic_align_buffer[function_hash] = bytearray()
-
-        elif function_hash not in self.symbolic_align_buffer:
-            dataset_size, align_dataset = self._get_dataset_info(SYMBOLIC_ALIGNMENTS, function_hash, type="both")
-            if align_dataset:
-                self.symbolic_align_buffer[function_hash] = bytearray(align_dataset)
+            self._set_symbolic_align_store(function_hash, AlignStore())
+            self.symbolic_align_index[function_hash] = {}
+            self._bump_symbolic_align_version(function_hash)
+
+        elif function_hash not in self.symbolic_align_stores:
+            dataset_path = self.data_worker.get_dataset_path(SYMBOLIC_ALIGNMENTS, function_hash)
+            if dataset_path is not None:
+                self._load_symbolic_align_store(function_hash, dataset_path=dataset_path)
+                dataset_size = self.symbolic_align_stores[function_hash].mapped_line_count
+            else:
+                dataset_size, align_dataset = self._get_dataset_info(SYMBOLIC_ALIGNMENTS, function_hash, type="both")
+                if align_dataset:
+                    self._load_symbolic_align_store(function_hash, align_dataset=align_dataset)
+            if function_hash in self.symbolic_align_stores:
+                self._bump_symbolic_align_version(function_hash)
             self.dataset_sizes[SYMBOLIC_ALIGNMENTS][function_hash] = dataset_size
 
+    def get_symbolic_align_version(self, func_hash) -> int:
+        """
+        Get the version of the symbolic align set of a function, which changes whenever an align is added or loaded
+        """
+        return self.symbolic_align_versions.get(func_hash, 0)
+
+    def _bump_symbolic_align_version(self, func_hash):
+        self.symbolic_align_versions[func_hash] = self.symbolic_align_versions.get(func_hash, 0) + 1
+
+    def get_symbolic_align_output(self, func_hash, args, kwargs) -> Tuple[bool, Any]:
+        """
+        Get the output of the align statement that exactly matches the args and kwargs
+        Returns:
+            found (bool): Whether a matching align statement was found
+            output: The (saved representation of the) asserted output, None if not found
+        """
+        index = self.symbolic_align_index.get(func_hash)
+        if not index:
+            return False, None
+        # the inputs are prepared the same way as when the align statements are saved
+        parsed_args = prepare_object_for_saving(copy.deepcopy(args))
+        parsed_kwargs = prepare_object_for_saving(copy.deepcopy(kwargs))
+        try:
+            key = get_key(parsed_args, parsed_kwargs)
+            position = index.get(hash(key))
+        except TypeError:
+            # unhashable inputs can not be matched
+            return False, None
+        if position is None:
+            return False, None
+        example = self.symbolic_align_stores[func_hash][position]
+        # the index only keeps the hashes of the inputs, so the inputs of the statement are compared as well
+        if get_key(example.get("args", ()), example.get("kwargs", {})) != key:
+            return False, None
+        return True, example["output"]
+
+    def _add_to_symbolic_align_index(self, func_hash, position, args, kwargs):
+        """
+        Add the align statement at the position of the align store to the exact-match index, later statements for
+        the same inputs take precedence
+        """
+        try:
+            key = get_key(args, kwargs)
+            self.symbolic_align_index.setdefault(func_hash, {})[hash(key)] = position
+        except TypeError:
+            pass
+
+    def _load_symbolic_align_store(self, func_hash, dataset_path=None, align_dataset=None):
+        """
+        Build the align store, the exact-match index and the retrieval index of a function from its align dataset, either memory mapped
+        from the dataset file at the path or from the loaded align dataset
+        """
+        self.symbolic_align_index[func_hash] = {}
+        # the inputs are rendered as the aligns are parsed, so the aligns are not read again to build the retrieval index
+        documents = []
+
+        def index_example(position, example):
+            self._add_to_symbolic_align_index(func_hash, position, example.get("args", ()), example.get("kwargs", {}))
+            documents.append(self._render_symbolic_align_input(example))
+
+        if dataset_path is not None:
+            store = AlignStore.from_file(dataset_path, on_add=index_example)
+        else:
+            store = AlignStore()
+            for line in align_dataset.split(b"\n"):
+                example = store.add(line)
+                if example is not None:
+                    index_example(len(store) - 1, example)
+        self._set_symbolic_align_store(func_hash, store, documents)
+
     def postprocess_symbolic_datapoint(self, func_hash, function_description, example, repaired=True):
         """
         Postprocess the datapoint
@@ -326,16 +416,36 @@ class FunctionModeler(object):
         Add the datapoint if it should be added
         Then check if the function should be finetuned and execute finetuning if it should
         """
-        try:
-            if func_hash not in self.store_data_blacklist:
-                added = self.save_symbolic_datapoint(func_hash, example)
-                if added:
-                    self._update_datapoint_config(repaired, func_hash)
-        except Exception as e:
-            print(e)
-            print("Could not add datapoint to training data")
+        with self._get_datapoint_lock(func_hash):
+            try:
+                if func_hash not in self.store_data_blacklist:
+                    added = self.save_symbolic_datapoint(func_hash, example)
+                    if added:
+                        self._update_datapoint_config(repaired, func_hash)
+            except Exception as e:
+                print(e)
+                print("Could not add datapoint to training data")
+        # checking for finetuning can call the finetuning API, so it is not done under the lock
         if func_hash not in self.execute_finetune_blacklist:
-            self.check_for_finetuning(function_description, func_hash)
+            with self._locks_lock:
+                if func_hash in self._finetune_checks:
+                    # another thread is checking already, the next datapoint checks again
+                    return
+                self._finetune_checks.add(func_hash)
+            try:
+                self.check_for_finetuning(function_description, func_hash)
+            finally:
+                with self._locks_lock:
+                    self._finetune_checks.discard(func_hash)
+
+    def _get_datapoint_lock(self, func_hash):
+        """
+        Get the lock of the datapoint bookkeeping (dataset sizes and config) of a function
+        """
+        with self._locks_lock:
+            if func_hash not in self._datapoint_locks:
+                self._datapoint_locks[func_hash] = threading.RLock()
+            return self._datapoint_locks[func_hash]
 
     def load_function_config(self, func_hash, function_description):
         """
@@ -356,8 +466,9 @@ class FunctionModeler(object):
 
     def _check_for_finetunes(self, function_description: FunctionDescription, model_config : BaseModelConfig) -> Tuple[bool, Dict]:
         # hash the function_hash into 16 characters (to embed it into the name of OpenAI finetunes, for later retrieval)
-        logging.info(f"Checking for finetunes for {function_description.name} using {model_config.provider}")
-        finetune_hash = function_description.__hash__(purpose="finetune") + encode_int(self.environment_id)
+        function_plan = as_function_plan(function_description)
+        logging.info(f"Checking for finetunes for {function_plan.name} using {model_config.provider}")
+        finetune_hash = function_plan.finetune_hash + encode_int(self.environment_id)
         # List 10 fine-tuning jobs
         finetunes: List[FinetuneJob] = self.api_provider[model_config.provider].list_finetuned(model_config, limit=1000)
 
@@ -370,7 +481,7 @@ class FunctionModeler(object):
                 try:
                     config = self._construct_config_from_finetune(finetune_hash, finetune)
                     # save the config
-                    self.data_worker.update_function_config(function_description.__hash__(), config)
+                    self.data_worker.update_function_config(function_plan.func_hash, config)
                     logging.info(f"Found finetuned model for {function_description.name} [{config.distilled_model.model_name}]")
                     return True, config
                 except:
@@ -414,7 +525,7 @@ class FunctionModeler(object):
         """
         Return the current model from the config file
         """
-        func_hash = function_description.__hash__()
+        func_hash = as_function_plan(function_description).func_hash
         if func_hash in self.function_configs:
             func_config = self.function_configs[func_hash]
         else:
@@ -428,31 +539,72 @@ class FunctionModeler(object):
         First adds 1 to the current datapoints
         Then updates running faults depending if priority is True or not and takes last 100
         Then checks the revert condition, i.e if last 10 datapoints are 50% faulty
-        Finally updates the config file 
+        Finally saves the config file once the datapoint is written
         Args:
            priority (bool): whether the datapoint was fixed by the teacher model/should be added to the training data
         """
         try:
-            if repaired:
-                self.function_configs[func_hash].current_model_stats["running_faults"].append(1)
-            else:
-                self.function_configs[func_hash].current_model_stats["running_faults"].append(0)
-            # take the last 100 datapoints
-            self.function_configs[func_hash].current_model_stats["running_faults"] = \
-                self.function_configs[func_hash].current_model_stats["running_faults"][-100:]
-
-            # check if the last 10 datapoints are 50% faulty, this is the switch condition
-            if sum(self.function_configs[func_hash].current_model_stats["running_faults"][-10:]) / 10 > 0.5:
-                self.function_configs[func_hash].distilled_model.model_name = ""
-                self.function_configs[func_hash].current_model_stats["trained_on_datapoints"] = 0
-                self.function_configs[func_hash].current_model_stats["running_faults"] = []
-            self._update_config_file(func_hash)
+            self._add_running_fault(func_hash, repaired)
+            # the config is saved from the dataset writer with the group commit of the datapoint, so that saving it does
+            # not add disk latency to the call
+            with self._locks_lock:
+                self._pending_config_updates.add(func_hash)
+            self.data_worker.call_after_write(self._save_pending_configs)
 
         except Exception as e:
             print(e)
             print("Could not update config file")
             pass
 
+    def _save_pending_configs(self):
+        """
+        Save the configs of the functions with datapoints added since they were last saved
+        """
+        with self._locks_lock:
+            func_hashes = list(self._pending_config_updates)
+            self._pending_config_updates.clear()
+        for func_hash in func_hashes:
+            self._update_config_file(func_hash)
+
+    def _add_running_fault(self, func_hash, fault):
+        """
+        Add an outcome to the running faults and revert to the teacher models if the distilled model is too faulty
+        """
+        current_model_stats = self.function_configs[func_hash].current_model_stats
+        current_model_stats["running_faults"].append(1 if fault else 0)
+        # take the last 100 datapoints
+        current_model_stats["running_faults"] = current_model_stats["running_faults"][-100:]
+
+        # check if the last 10 datapoints are 50% faulty, this is the switch condition
+        if sum(current_model_stats["running_faults"][-DISTILLED_MODEL_PROBATION_WINDOW:]) / DISTILLED_MODEL_PROBATION_WINDOW > 0.5:
+            self.function_configs[func_hash].distilled_model.model_name = ""
+            current_model_stats["trained_on_datapoints"] = 0
+            current_model_stats["running_faults"] = []
+
+    def is_distilled_model_on_probation(self, func_hash):
+        """
+        Whether the function has a distilled model which is still being judged, i.e its running faults window is
+        not full yet
+        """
+        if func_hash not in self.function_configs:
+            return False
+        config = self.function_configs[func_hash]
+        return config.distilled_model.model_name != "" and \
+            len(config.current_model_stats["running_faults"]) < DISTILLED_MODEL_PROBATION_WINDOW
+
+    def record_distilled_model_outcome(self, func_hash, valid):
+        """
+        Record whether an output of the distilled model passed validation, without saving a datapoint
+        """
+        with self._get_datapoint_lock(func_hash):
+            try:
+                self._add_running_fault(func_hash, not valid)
+                if func_hash not in self.store_data_blacklist:
+                    self._update_config_file(func_hash)
+            except Exception as e:
+                print(e)
+                print("Could not update config file")
+
     def _update_config_file(self, func_hash):
         self.data_worker.update_function_config(func_hash, self.function_configs[func_hash])
 
@@ -487,12 +639,13 @@ class FunctionModeler(object):
 
         align_dataset_size = self.dataset_sizes[SYMBOLIC_ALIGNMENTS][func_hash] if func_hash in self.dataset_sizes[
             SYMBOLIC_ALIGNMENTS] else 0
-        patch_dataset_size = self.dataset_sizes[PATCHES][func_hash] if func_hash in self.dataset_sizes[PATCHES] else 0
+        with self._get_datapoint_lock(func_hash):
+            patch_dataset_size = self.dataset_sizes[PATCHES][func_hash] if func_hash in self.dataset_sizes[PATCHES] else 0
 
-        if patch_dataset_size == -1:
-            # if havent read in the patch dataset size, read it in
-            patch_dataset_size = self._get_dataset_info(PATCHES, func_hash, type="length")
-            self.dataset_sizes[PATCHES][func_hash] = patch_dataset_size
+            if patch_dataset_size == -1:
+                # if havent read in the patch dataset size, read it in
+                patch_dataset_size = self._get_dataset_info(PATCHES, func_hash, type="length")
+                self.dataset_sizes[PATCHES][func_hash] = patch_dataset_size
         if func_hash not in self.startup_logging_checker:
             logging.info(f"Function {function_description.name} [{align_dataset_size} aligns | {patch_dataset_size} runs] will be finetuned from"\
                          f" {self.function_configs[func_hash].teacher_models[0].model_name} using {self.function_configs[func_hash].distilled_model.provider} in "\
@@ -508,8 +661,9 @@ class FunctionModeler(object):
         Then submit the OpenAI finetuning job
         Finally update the config file to reflect the new finetuning job as current
         """
+        function_plan = as_function_plan(function_description)
         # get function description
-        function_string = str(function_description.__dict__.__repr__() + "\n")
+        function_string = function_plan.description_string + "\n"
 
         # get the align dataset
         align_dataset = self._get_dataset_info(SYMBOLIC_ALIGNMENTS, func_hash, type="dataset")
@@ -534,7 +688,7 @@ class FunctionModeler(object):
         dataset = dataset.split("\n")
         dataset = [x.replace("[SEP_TOKEN]", "\\n") for x in dataset if x != ""]
         # read in the dataset file
-        dataset = [ast.literal_eval(x) for x in dataset]
+        dataset = [parse_output(x) for x in dataset]
         #
         # create the openai dataset
         instruction = "You are given below a function description and input data. The function description of what the function must carry out can be found in the Function section, with input and output type hints. The input data can be found in Input section. Using the function description, apply the function to the Input and return a valid output type, that is acceptable by the output_class_definition and output_class_hint. Return None if you can't apply the function to the input or if the output is optional and the correct output is None.\nINCREDIBLY IMPORTANT: Only output a JSON-compatible string in the correct response format."
@@ -560,7 +714,7 @@ class FunctionModeler(object):
         temp_file.seek(0)
 
         # create the finetune hash
-        finetune_hash = function_description.__hash__(purpose="finetune")
+        finetune_hash = function_plan.finetune_hash
         nr_of_training_runs = self.function_configs[func_hash].nr_of_training_runs
         finetune_hash += encode_int(self.environment_id)
         finetune_hash += encode_int(nr_of_training_runs)
@@ -0,0 +1,134 @@
+import collections.abc
+import dataclasses
+import inspect
+import json
+import typing
+from typing import Any, Literal, Optional, Union, get_args, get_origin
+
+from tanuki.models.embedding import Embedding
+
+# structured output APIs require an object at the root, so the output is wrapped under this key
+STRUCTURED_OUTPUT_KEY = "output"
+
+
+class UnsupportedTypeError(TypeError):
+    """
+    Raised when a type hint can not be expressed as a JSON Schema that the validator would accept
+    """
+
+
+def compile_json_schema(type_hint: Any) -> Optional[dict]:
+    """
+    Compile an output type hint into a JSON Schema describing the JSON the validator accepts for it.
+    Supports base types, None, Any, Literal, Union and Optional, lists, dicts with string keys, pydantic models and
+    dataclasses. Types whose valid outputs are not plain JSON (e.g tuples, sets and datetimes) are not supported
+    Args:
+        type_hint: The output type hint
+    Returns:
+        The JSON Schema, or None if the type can not be expressed as one or its annotations can not be resolved
+        (e.g. a forward reference to a class which is not defined)
+    """
+    try:
+        return _compile(type_hint, set())
+    except (UnsupportedTypeError, NameError, TypeError):
+        return None
+
+
+def _compile(type_hint: Any, seen: set) -> dict:
+    if type_hint is Any:
+        return {}
+    if type_hint is None or type_hint is type(None):
+        return {"type": "null"}
+    if type_hint is bool:
+        return {"type": "boolean"}
+    if type_hint is int:
+        return {"type": "integer"}
+    if type_hint is float:
+        return {"type": "number"}
+    if type_hint is str:
+        return {"type": "string"}
+
+    origin = get_origin(type_hint)
+    args = get_args(type_hint)
+
+    if origin is Literal:
+        if not all(isinstance(arg, (str, int, float, bool, type(None))) for arg in args):
+            raise UnsupportedTypeError(f"Literal values of {type_hint} are not JSON values")
+        return {"enum": list(args)}
+    if origin is Union:
+        return {"anyOf": [_compile(arg, seen) for arg in args]}
+    if origin in (list, collections.abc.Sequence, collections.abc.MutableSequence) or type_hint in (list, typing.List):
+        return {"type": "array", "items": _compile(args[0], seen) if args else {}}
+    if origin in (dict, collections.abc.Mapping, collections.abc.MutableMapping) or type_hint in (dict, typing.Dict):
+        if args and args[0] is not str:
+            raise UnsupportedTypeError(f"JSON objects only have string keys, {type_hint} has {args[0]} keys")
+        return {"type": "object", "additionalProperties": _compile(args[1], seen) if args else {}}
+    if origin is not None:
+        raise UnsupportedTypeError(f"{type_hint} can not be expressed as a JSON Schema")
+
+    if not inspect.isclass(type_hint) or issubclass(type_hint, Embedding):
+        raise UnsupportedTypeError(f"{type_hint} can not be expressed as a JSON Schema")
+    if type_hint in seen:
+        raise UnsupportedTypeError(f"{type_hint} is recursive")
+    if hasattr(type_hint, "model_fields"):
+        # pydantic models accept their optional fields to be left out
+        fields = {name: (field.annotation, field.is_required()) for name, field in type_hint.model_fields.items()}
+    elif hasattr(type_hint, "__fields__") and hasattr(type_hint, "parse_obj"):
+        # backwards compatibility with pydantic < 2, whose fields do not keep the annotation
+        hints = typing.get_type_hints(type_hint)
+        fields = {name: (hints[name], bool(field.required)) for name, field in type_hint.__fields__.items()}
+    elif dataclasses.is_dataclass(type_hint):
+        # the validator compares the dataclass with all of its fields, so all of them are required
+        hints = typing.get_type_hints(type_hint)
+        fields = {field.name: (hints[field.name], True) for field in dataclasses.fields(type_hint)}
+    else:
+        raise UnsupportedTypeError(f"{type_hint} can not be expressed as a JSON Schema")
+
+    seen = seen | {type_hint}
+    return {"type": "object",
+            "title": type_hint.__name__,
+            "properties": {name: _compile(annotation, seen) for name, (annotation, _) in fields.items()},
+            "required": [name for name, (_, required) in fields.items() if required],
+            "additionalProperties": False}
+
+
+def is_strict_schema(schema: dict) -> bool:
+    """
+    Whether the schema is in the subset that strict structured output modes support, i.e every object has all of its
+    properties required and no additional properties, and there are no unconstrained values
+    """
+    if not schema:
+        return False
+    if "anyOf" in schema:
+        return all(is_strict_schema(sub_schema) for sub_schema in schema["anyOf"])
+    if schema.get("type") == "array":
+        return is_strict_schema(schema["items"])
+    if schema.get("type") == "object":
+        properties = schema.get("properties", {})
+        return schema.get("additionalProperties") is False \
+            and set(schema.get("required", [])) == set(properties) \
+            and all(is_strict_schema(property_schema) for property_schema in properties.values())
+    return True
+
+
+def wrap_output_schema(schema: dict) -> dict:
+    """
+    Wrap the output schema into an object, as structured output APIs require an object at the root
+    """
+    return {"type": "object",
+            "properties": {STRUCTURED_OUTPUT_KEY: schema},
+            "required": [STRUCTURED_OUTPUT_KEY],
+            "additionalProperties": False}
+
+
+def unwrap_structured_output(choice: str) -> str:
+    """
+    Get the output JSON from a structured output response, leaving responses that are not wrapped as they are
+    """
+    try:
+        response = json.loads(choice)
+    except (TypeError, ValueError):
+        return choice
+    if isinstance(response, dict) and set(response) == {STRUCTURED_OUTPUT_KEY}:
+        return json.dumps(response[STRUCTURED_OUTPUT_KEY])
+    return choice
@@ -1,45 +1,51 @@
-from typing import List
+from typing import List, Optional
 
 import logging
-import time
 # import abstract base class
 from openai import OpenAI
 from openai.types import CreateEmbeddingResponse
 from openai.types.fine_tuning import FineTuningJob
 
+from tanuki.json_schema import wrap_output_schema, is_strict_schema
 from tanuki.language_models.llm_finetune_api_abc import LLM_Finetune_API
 from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.http_transport import HTTPTransport
+from tanuki.language_models.openai_compatible_api import OpenAICompatibleAPI
+from tanuki.language_models.retry_policy import RetryPolicy, CircuitBreaker
 import os
 from tanuki.constants import DEFAULT_DISTILLED_MODEL_NAME
 from tanuki.language_models.llm_configs.anyscale_config import Anyscaleconfig
 from tanuki.models.finetune_job import FinetuneJob
 import copy
 ANYSCALE_URL = "https://api.endpoints.anyscale.com/v1"
-import requests
-LLM_GENERATION_PARAMETERS = ["temperature", "top_p", "max_new_tokens", "frequency_penalty", "presence_penalty"]
+LLM_GENERATION_PARAMETERS = ["temperature", "top_p", "max_new_tokens", "frequency_penalty", "presence_penalty",
+                             "response_schema"]
 
-class Anyscale_API(LLM_API, LLM_Finetune_API):
-    def __init__(self) -> None:
+class Anyscale_API(OpenAICompatibleAPI, LLM_API, LLM_Finetune_API):
+    provider_name = "Anyscale"
+    supports_structured_output = True
+
+    def __init__(self,
+                 transport: Optional[HTTPTransport] = None,
+                 retry_policy: Optional[RetryPolicy] = None) -> None:
         # initialise the abstract base class
         super().__init__()
 
         self.api_key = os.environ.get("ANYSCALE_API_KEY")
 
         self.client = None
+        # the pooled HTTP transport, shared between the providers created by the APIManager
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
 
-    
-    def generate(self, model, system_message, prompt, **kwargs):
+    def _chat_completions_url(self):
+        return f"{ANYSCALE_URL}/chat/completions"
+
+    def _create_generation_params(self, model, system_message, prompt, **kwargs):
         """
-        The main generation function, given the args, kwargs, function_modeler, function description and model type, generate a response
-        Args
-            model (Anyscaleconfig): The model to use for generation.
-            system_message (str): The system message to use for generation.
-            prompt (str): The prompt to use for generation.
-            kwargs (dict): Additional generation parameters.
+        Create the request body for a chat completion
         """
-
-        self.check_api_key()
-
         temperature = kwargs.get("temperature", 0.1)
         top_p = kwargs.get("top_p", 1)
         frequency_penalty = kwargs.get("frequency_penalty", 0)
@@ -72,39 +78,13 @@ class Anyscale_API(LLM_API, LLM_Finetune_API):
             }
         ]
         params["messages"] = messages
+        response_schema = kwargs.get("response_schema")
+        if response_schema is not None:
+            # constrain the generation to the output schema with the JSON mode of the endpoint
+            params["response_format"] = {"type": "json_object", "schema": wrap_output_schema(response_schema)}
+        return params
 
-        counter = 0
-        choice = None
-        # initiate response so exception logic doesnt error out when checking for error in response
-        response = {}
-        while counter <= 5:
-            try:
-                anyscale_headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                }
-                response = requests.post(
-                    f"{ANYSCALE_URL}/chat/completions", 
-                    headers=anyscale_headers, 
-                    json=params, timeout=50
-                )
-                response = response.json()
-                choice = response["choices"][0]["message"]["content"].strip("'")
-                break
-            except Exception as e:
-                if ("error" in response and
-                        "code" in response["error"] and
-                        response["error"]["code"] == 'invalid_api_key'):
-                    raise Exception(f"The supplied Anyscale API key {self.api_key} is invalid")
-                if counter == 5:
-                    raise Exception(f"Anyscale API failed to generate a response: {e}")
-                counter += 1
-                time.sleep(2 ** counter)
-                continue
-
-        if not choice:
-            raise Exception("Anyscale API failed to generate a response")
-        
+    def _remove_parsing_helper_tokens(self, model, choice):
         if model.parsing_helper_tokens["end_token"]:
             # remove the end token from the choice
             choice = choice.split(model.parsing_helper_tokens["end_token"])[0]
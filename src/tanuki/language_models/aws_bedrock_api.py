@@ -1,19 +1,33 @@
 from typing import List
 import abc
 import botocore
-import time
 # import abstract base class
 import boto3 as boto3
 from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.retry_policy import RetryPolicy, CircuitBreaker, RetryableError, FatalRequestError
 import os
 import json
 from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
 
+# error codes of transient Bedrock failures, e.g. throttling
+BEDROCK_RETRYABLE_ERROR_CODES = {"ThrottlingException",
+                                 "TooManyRequestsException",
+                                 "ServiceUnavailableException",
+                                 "InternalServerException",
+                                 "ModelTimeoutException",
+                                 "ModelNotReadyException"}
+# client errors which are transient, the others (e.g. missing credentials or invalid parameters) are not
+BEDROCK_RETRYABLE_EXCEPTIONS = (botocore.exceptions.EndpointConnectionError,
+                                botocore.exceptions.ConnectTimeoutError,
+                                botocore.exceptions.ReadTimeoutError)
+
 class Bedrock_API(LLM_API):
     def __init__(self) -> None:
         # initialise the abstract base class
         super().__init__()
         self.bedrock_runtime = None
+        self.retry_policy = RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
 
     def send_api_request(self, model: BaseModelConfig, body: str):
         """
@@ -29,31 +43,28 @@ class Bedrock_API(LLM_API):
 
         # check the runtime access
         self.check_runtime()
-        counter = 0
-        response_body = None
-        # initiate response so exception logic doesnt error out when checking for error in response
-        response = {}
-        while counter <= 5:
+
+        def send():
             try:
                 response = self.bedrock_runtime.invoke_model(body=body,
                                                              modelId=model.model_name,
                                                              contentType="application/json",
                                                              accept="application/json")
-                response_body = json.loads(response.get('body').read())
-                break
             except botocore.exceptions.ClientError as error:
-                raise Exception("boto3 had an error: " + error.response['Error']['Message'])
-            except Exception as e:
-                if counter == 5:
-                    raise Exception(f"AWS Bedrock API failed to generate a response: {e}")
-                counter += 1
-                time.sleep(2 ** counter)
-                continue
-
-        if not response_body:
-            raise Exception("AWS Bedrock API failed to generate a response")
+                message = "boto3 had an error: " + error.response['Error']['Message']
+                if error.response['Error'].get('Code') in BEDROCK_RETRYABLE_ERROR_CODES:
+                    raise RetryableError(message)
+                raise FatalRequestError(message)
+            except BEDROCK_RETRYABLE_EXCEPTIONS as error:
+                raise RetryableError(str(error))
+            except botocore.exceptions.BotoCoreError as error:
+                raise FatalRequestError(str(error))
+            response_body = json.loads(response.get('body').read())
+            if not response_body:
+                raise FatalRequestError("AWS Bedrock API failed to generate a response")
+            return response_body
 
-        return response_body
+        return self.retry_policy.call(send, self.circuit_breaker, "AWS Bedrock")
 
     def check_runtime(self):
         # check if the runtime is configured
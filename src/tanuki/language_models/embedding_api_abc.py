@@ -1,4 +1,6 @@
 # import abstract base class
+import asyncio
+import functools
 from abc import ABC, abstractmethod
 from typing import List
 
@@ -14,4 +16,12 @@ class Embedding_API(ABC):
         """
         The main embedding function, given the model and prompt, return a vector representation
         """
-        pass
\ No newline at end of file
+        pass
+
+    async def aembed(self, texts: List[str], model: BaseModelConfig = None, **kwargs) -> List[Embedding]:
+        """
+        The asynchronous embedding function. Providers with a non-blocking client should override this,
+        by default the blocking embed function is run in the default executor so the event loop is not stalled
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.embed, texts, model, **kwargs))
@@ -1,8 +1,9 @@
-from typing import Dict
+from typing import Dict, Union
 
 from tanuki.language_models.embedding_api_abc import Embedding_API
 from tanuki.models.embedding import Embedding
 from tanuki.models.function_description import FunctionDescription
+from tanuki.models.function_plan import FunctionPlan, as_function_plan
 from tanuki.language_models.llm_configs import DEFAULT_EMBEDDING_MODELS
 from tanuki.constants import DEFAULT_EMBEDDING_MODEL_NAME
 from tanuki.models.api_manager import APIManager
@@ -14,10 +15,11 @@ class EmbeddingModelManager(object):
         self.api_provider = api_provider
         self.initialized_functions = {}
 
-    def get_embedding_case(self, args, function_description: FunctionDescription, kwargs, examples=None):
+    def get_embedding_case(self, args, function_description: Union[FunctionDescription, FunctionPlan], kwargs, examples=None):
+        function_plan = as_function_plan(function_description)
         # example_input = f"Examples:{examples}\n" if examples else ""
-        content = f"Name: {function_description.name}\nArgs: {args}\nKwargs: {kwargs}"
-        function_hash = function_description.__hash__()
+        content = f"Name: {function_plan.name}\nArgs: {args}\nKwargs: {kwargs}"
+        function_hash = function_plan.func_hash
         if function_hash in self.function_modeler.teacher_models_override: # check for overrides
             model = self.function_modeler.teacher_models_override[function_hash][0] # take currently the first model
         else:
@@ -26,10 +28,10 @@ class EmbeddingModelManager(object):
 
         # loggings
         if function_hash not in self.initialized_functions:
-            logging.info(f"Generating  function embeddings for {function_description.name} with {model.model_name}")
+            logging.info(f"Generating  function embeddings for {function_plan.name} with {model.model_name}")
             self.initialized_functions[function_hash] = model.model_name
         elif self.initialized_functions[function_hash] != model.model_name:
-            logging.info(f"Switching embeddings generation for {function_description.name} from {self.initialized_functions[function_hash]} to {model.model_name}")
+            logging.info(f"Switching embeddings generation for {function_plan.name} from {self.initialized_functions[function_hash]} to {model.model_name}")
             self.initialized_functions[function_hash] = model.model_name
         
         return content, model
@@ -38,11 +40,12 @@ class EmbeddingModelManager(object):
                  args,
                  function_description,
                  kwargs) -> Embedding:
-        prompt, model = self.get_embedding_case(args, function_description, kwargs)
+        function_plan = as_function_plan(function_description)
+        prompt, model = self.get_embedding_case(args, function_plan, kwargs)
         embedding_response: Embedding = self.api_provider[model.provider].embed([prompt], model)[0]
 
         # Coerce the embedding into the correct type
-        embedding: Embedding = function_description.output_type_hint(embedding_response)
+        embedding: Embedding = function_plan.output_type_hint(embedding_response)
 
 
         # We don't need to postprocess the embedding for now, because saving them offers no information that we can use
@@ -56,3 +59,18 @@ class EmbeddingModelManager(object):
         #                                                           embedding)
 
         return embedding
+
+    async def acall(self,
+                    args,
+                    function_description,
+                    kwargs) -> Embedding:
+        """
+        The asynchronous counterpart of __call__, the embedding request is awaited on the running event loop
+        """
+        function_plan = as_function_plan(function_description)
+        prompt, model = self.get_embedding_case(args, function_plan, kwargs)
+        embedding_responses = await self.api_provider[model.provider].aembed([prompt], model)
+
+        # Coerce the embedding into the correct type
+        embedding: Embedding = function_plan.output_type_hint(embedding_responses[0])
+        return embedding
@@ -0,0 +1,213 @@
+import asyncio
+import json as jsonlib
+import logging
+import threading
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from tanuki.constants import DEFAULT_HTTP_POOL_CONNECTIONS, DEFAULT_HTTP_POOL_MAXSIZE, DEFAULT_HTTP_CONNECT_TIMEOUT, \
+    DEFAULT_HTTP_READ_TIMEOUT
+
+
+class StreamingResponse(object):
+    """
+    A response whose body is read incrementally, e.g. server-sent events. It must be closed once read (or abandoned),
+    which releases the connection and tells the server to stop generating
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._body: Optional[bytes] = None
+
+    def iter_lines(self) -> Iterator[str]:
+        """
+        Iterate over the lines of the body as they arrive
+        """
+        if isinstance(self.response, requests.Response):
+            # chunk_size=None yields the chunks as they arrive instead of waiting for a buffer to fill up
+            for line in self.response.iter_lines(chunk_size=None):
+                yield line.decode("utf-8")
+        else:
+            for line in self.response.iter_lines():
+                yield line
+
+    async def aiter_lines(self) -> AsyncIterator[str]:
+        """
+        Iterate over the lines of the body as they arrive, without blocking the event loop
+        """
+        async for line in self.response.aiter_lines():
+            yield line
+
+    def read(self) -> bytes:
+        """
+        Read the whole body, for error responses which are not streamed
+        """
+        if self._body is None:
+            if isinstance(self.response, requests.Response):
+                self._body = self.response.content
+            else:
+                self._body = self.response.read()
+        return self._body
+
+    async def aread(self) -> bytes:
+        """
+        Read the whole body without blocking the event loop
+        """
+        if self._body is None:
+            self._body = await self.response.aread()
+        return self._body
+
+    def json(self) -> Any:
+        """
+        Parse the body, which must have been read
+        """
+        return jsonlib.loads(self._body)
+
+    def close(self) -> None:
+        self.response.close()
+
+    async def aclose(self) -> None:
+        await self.response.aclose()
+
+
+class HTTPTransport(object):
+    """
+    The HTTP transport shared by the API providers.
+    Connections are pooled per host and kept alive between requests, so that a generation does not pay for a new
+    TCP and TLS handshake. HTTP/2 can optionally be enabled if the h2 package is installed.
+    """
+
+    def __init__(self,
+                 pool_connections: int = DEFAULT_HTTP_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_HTTP_POOL_MAXSIZE,
+                 connect_timeout: float = DEFAULT_HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_HTTP_READ_TIMEOUT,
+                 http2: bool = False) -> None:
+        """
+        Args:
+            pool_connections: The number of hosts to keep connection pools for
+            pool_maxsize: The maximum number of connections kept alive per host
+            connect_timeout: The timeout for establishing a connection
+            read_timeout: The timeout for waiting on the response
+            http2: Whether to use HTTP/2 where the server supports it
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.http2 = http2 and self._is_http2_available()
+
+        self._session: Optional[Any] = None
+        self._session_lock = threading.Lock()
+        # non-blocking clients, one per running event loop as async connection pools can not be shared between loops
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _is_http2_available() -> bool:
+        try:
+            import h2
+            return True
+        except ImportError:
+            logging.warning("HTTP/2 was requested but the h2 package is not installed, falling back to HTTP/1.1. "
+                            "Please install it as pip install httpx[http2]")
+            return False
+
+    def _get_limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.pool_maxsize * self.pool_connections,
+                            max_keepalive_connections=self.pool_maxsize)
+
+    def _get_session(self):
+        """
+        Get the blocking HTTP session, creating it on first use
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    if self.http2:
+                        self._session = httpx.Client(http2=True, limits=self._get_limits())
+                    else:
+                        session = requests.Session()
+                        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                        session.mount("https://", adapter)
+                        session.mount("http://", adapter)
+                        self._session = session
+        return self._session
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """
+        Get the non-blocking HTTP client for the running event loop, creating it if needed
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=self.http2, limits=self._get_limits())
+            self._async_clients[loop] = client
+        return client
+
+    def post(self, url: str, headers: Dict[str, str], json: Any, timeout: Optional[float] = None):
+        """
+        Send a POST request over the pooled connections
+        Args:
+            url: The url to send the request to
+            headers: The request headers
+            json: The json body of the request
+            timeout: The read timeout, defaults to the read timeout of the transport
+        Returns:
+            The response
+        """
+        read_timeout = timeout if timeout is not None else self.read_timeout
+        session = self._get_session()
+        if self.http2:
+            return session.post(url, headers=headers, json=json,
+                                timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout))
+        return session.post(url, headers=headers, json=json, timeout=(self.connect_timeout, read_timeout))
+
+    async def apost(self, url: str, headers: Dict[str, str], json: Any, timeout: Optional[float] = None):
+        """
+        Send a POST request over the pooled connections without blocking the event loop, see post
+        """
+        read_timeout = timeout if timeout is not None else self.read_timeout
+        client = self._get_async_client()
+        return await client.post(url, headers=headers, json=json,
+                                 timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout))
+
+    def open_stream(self, url: str, headers: Dict[str, str], json: Any,
+                    timeout: Optional[float] = None) -> StreamingResponse:
+        """
+        Send a POST request over the pooled connections, returning as soon as the response headers have arrived so
+        that the body can be read as it is streamed. The read timeout applies between the streamed chunks
+        """
+        read_timeout = timeout if timeout is not None else self.read_timeout
+        session = self._get_session()
+        if self.http2:
+            request = session.build_request("POST", url, headers=headers, json=json,
+                                            timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout))
+            return StreamingResponse(session.send(request, stream=True))
+        return StreamingResponse(session.post(url, headers=headers, json=json, stream=True,
+                                              timeout=(self.connect_timeout, read_timeout)))
+
+    async def aopen_stream(self, url: str, headers: Dict[str, str], json: Any,
+                           timeout: Optional[float] = None) -> StreamingResponse:
+        """
+        Send a streamed POST request without blocking the event loop, see open_stream
+        """
+        read_timeout = timeout if timeout is not None else self.read_timeout
+        client = self._get_async_client()
+        request = client.build_request("POST", url, headers=headers, json=json,
+                                       timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout))
+        return StreamingResponse(await client.send(request, stream=True))
+
+    def close(self) -> None:
+        """
+        Close the blocking connection pool. The non-blocking clients are dropped together with their event loops
+        """
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -1,12 +1,28 @@
-import json
-from typing import Any, Dict
+import asyncio
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Union
 
+from tanuki.constants import ROUTING_POLICIES, DEFAULT_FAILOVER_MAX_RETRIES, DEFAULT_ALIGN_RETRIEVAL_K, \
+    EXAMPLE_ELEMENT_LIMIT, CACHE_DIRECTORY_NAME, DEFAULT_REPAIR_TEMPERATURE_STEP, DEFAULT_TEMPERATURE
 from tanuki.function_modeler import FunctionModeler
+from tanuki.json_schema import unwrap_structured_output
+from tanuki.language_models.rate_limiter import RateLimiter
+from tanuki.language_models.response_cache import ResponseCache
+from tanuki.language_models.retry_policy import is_provider_unavailable, limit_retries
+from tanuki.language_models.streaming import StreamCollector
+from tanuki.language_models.token_estimator import TokenEstimator, get_token_estimator
 from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.model_router import ModelRouter
 from tanuki.models.function_description import FunctionDescription
 from tanuki.models.function_example import FunctionExample
+from tanuki.models.function_plan import FunctionPlan, as_function_plan
+from tanuki.models.generation_case import GenerationCase
 from tanuki.models.language_model_output import LanguageModelOutput
-from tanuki.utils import approximate_token_count
+from tanuki.models.repair_state import RepairState
+from tanuki.output_parser import parse_output_or_text
 from tanuki.validator import Validator
 from tanuki.models.api_manager import APIManager
 from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
@@ -24,88 +40,506 @@ class LanguageModelManager(object):
     def __init__(self,
                  function_modeler: FunctionModeler,
                  api_provider: APIManager,
-                 generation_token_limit=512,) -> None:
+                 generation_token_limit=512,
+                 token_estimator: TokenEstimator = None,
+                 model_router: ModelRouter = None) -> None:
         self.api_provider = api_provider
         self.function_modeler = function_modeler
         self.default_generation_length = generation_token_limit
         self.initialized_functions = {}
         self.token_counts = {}
+        self.response_cache = None
+        self.cached_functions = set()
+        self.rate_limiter = RateLimiter()
+        # the number of repair candidates generated concurrently per function, 1 repairs serially
+        self.parallel_repairs = {}
+        # the latency budgets (in seconds) of the functions whose distilled models are run speculatively on probation
+        self.speculative_budgets = {}
+        # the functions whose generations are streamed, so they can be stopped early
+        self.streamed_functions = set()
+        # the functions whose generations are constrained to the JSON Schema of their output type
+        self.structured_output_functions = set()
+        self._token_estimator = token_estimator
+        # the router keeps the rolling statistics of the models, and chooses the teacher models of the functions
+        # with a routing policy
+        self.model_router = model_router if model_router is not None else ModelRouter()
+        self.routing_policies = {}
+        # the functions whose teacher models form a failover chain for when a provider is unavailable
+        self.failover_functions = set()
+        self.failover_max_retries = DEFAULT_FAILOVER_MAX_RETRIES
+        # functions with more align statements than this get the most relevant ones for the input of the call
+        self.align_retrieval_k = DEFAULT_ALIGN_RETRIEVAL_K
+        # the rendered align examples and static prompt prefixes of every function, for the current align set version
+        self.prompt_prefixes = {}
+
+    @property
+    def token_estimator(self) -> TokenEstimator:
+        """
+        The token estimator used to size prompts, the shared one (fed by the provider usage data) unless given
+        """
+        return self._token_estimator if self._token_estimator is not None else get_token_estimator()
+
+    def enable_cache(self, func_hash: str) -> None:
+        """
+        Enable the response cache for a function. The on-disk tier of the cache is placed next to the datasets, if the
+        datasets are stored on the filesystem
+        """
+        if self.response_cache is None:
+            log_directory = getattr(self.function_modeler.data_worker, "log_directory", None)
+            directory = os.path.join(log_directory, CACHE_DIRECTORY_NAME) if log_directory else None
+            self.response_cache = ResponseCache(directory=directory)
+        self.cached_functions.add(func_hash)
+
+    def set_parallel_repairs(self, func_hash: str, parallel_repairs: int) -> None:
+        """
+        Set how many repair candidates are generated concurrently when an output of the function fails validation
+        """
+        if parallel_repairs < 1:
+            raise ValueError("The number of parallel repairs must be at least 1")
+        self.parallel_repairs[func_hash] = parallel_repairs
+
+    def enable_streaming(self, func_hash: str) -> None:
+        """
+        Stream the generations of a function, stopping them as soon as the end token appears or the output can no
+        longer pass validation
+        """
+        self.streamed_functions.add(func_hash)
+
+    def enable_structured_output(self, func_hash: str) -> None:
+        """
+        Constrain the generations of a function to the JSON Schema of its output type, with the structured output
+        mode of the providers which support it
+        """
+        self.structured_output_functions.add(func_hash)
+
+    def set_routing_policy(self, func_hash: str, policy: str) -> None:
+        """
+        Route the generations of a function to the teacher model with the lowest latency ("latency") or the lowest
+        price ("cost") out of the teacher models the input fits in
+        """
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy {policy}, the supported policies are {ROUTING_POLICIES}")
+        self.routing_policies[func_hash] = policy
+
+    def enable_failover(self, func_hash: str) -> None:
+        """
+        Fail over to the next teacher model the input fits in when the provider of a model is unavailable, in the
+        order the teacher models are configured in
+        """
+        self.failover_functions.add(func_hash)
+
+    def set_speculative_budget(self, func_hash: str, budget: float) -> None:
+        """
+        Run the distilled model of the function alongside a teacher model while the distilled model is on probation,
+        using the distilled output if it passes validation within the budget (in seconds)
+        """
+        if budget <= 0:
+            raise ValueError("The speculative budget must be positive")
+        self.speculative_budgets[func_hash] = budget
 
     def __call__(self,
                  args,
-                 function_description: FunctionDescription,
+                 function_description: Union[FunctionDescription, FunctionPlan],
                  kwargs,
                  validator: Validator,
                  generation_parameters: dict) -> Any:
-        
-        # add the generation length if not there
-        if "max_new_tokens" not in generation_parameters:
-            generation_parameters["max_new_tokens"] = self.default_generation_length
+        function_plan = as_function_plan(function_description)
+
+        found, instantiated = self._prepare_call(args, kwargs, function_plan, validator, generation_parameters)
+        if found:
+            return instantiated
 
-        output = self.generate(args, kwargs, function_description, generation_parameters)
+        output = self.generate(args, kwargs, function_plan, generation_parameters, validator)
         # start parsing the object, very hacky way for the time being
-        choice_parsed = self._parse_choice(output)
-        valid = validator.check_type(choice_parsed, function_description.output_type_hint)
+        choice_parsed, valid = self._validate_response(output.generated_response, function_plan, validator)
         if not valid:
             choice, choice_parsed, successful_repair = self.repair_output(args,
                                                                           kwargs,
-                                                                          function_description,
+                                                                          function_plan,
                                                                           output.generated_response,
                                                                           validator,
                                                                           generation_parameters)
+            self._apply_repair(output, function_plan, choice, successful_repair)
+        self._save_output(args, kwargs, function_plan, output, valid)
+        instantiated = validator.instantiate(choice_parsed, function_plan.output_type_hint)
+        return instantiated
 
-            if not successful_repair:
-                raise TypeError(
-                    f"Output type was not valid. Expected an object of type {function_description.output_type_hint}, got '{output.generated_response}'")
-            output.generated_response = choice
-            output.distilled_model = False
-        datapoint = FunctionExample(args, kwargs, output.generated_response)
-        if output.suitable_for_finetuning and not output.distilled_model:
-            self.function_modeler.postprocess_symbolic_datapoint(function_description.__hash__(), function_description,
-                                                                 datapoint, repaired=not valid)
-        instantiated = validator.instantiate(choice_parsed, function_description.output_type_hint)
+    async def acall(self,
+                    args,
+                    function_description: Union[FunctionDescription, FunctionPlan],
+                    kwargs,
+                    validator: Validator,
+                    generation_parameters: dict) -> Any:
+        """
+        The asynchronous counterpart of __call__. The generation and repair requests are awaited on the running event
+        loop, while the blocking align lookups, dataset logging and finetuning checks are moved to the default executor
+        """
+        function_plan = as_function_plan(function_description)
+        loop = asyncio.get_running_loop()
+
+        found, instantiated = await loop.run_in_executor(None, self._prepare_call, args, kwargs, function_plan,
+                                                         validator, generation_parameters)
+        if found:
+            return instantiated
+
+        output = await self.agenerate(args, kwargs, function_plan, generation_parameters, validator)
+        choice_parsed, valid = self._validate_response(output.generated_response, function_plan, validator)
+        if not valid:
+            choice, choice_parsed, successful_repair = await self.arepair_output(args,
+                                                                                 kwargs,
+                                                                                 function_plan,
+                                                                                 output.generated_response,
+                                                                                 validator,
+                                                                                 generation_parameters)
+            self._apply_repair(output, function_plan, choice, successful_repair)
+        await loop.run_in_executor(None, self._save_output, args, kwargs, function_plan, output, valid)
+        instantiated = validator.instantiate(choice_parsed, function_plan.output_type_hint)
         return instantiated
 
+    def _prepare_call(self, args, kwargs, function_plan, validator, generation_parameters):
+        """
+        Answer the call from the align statements if one matches it exactly, otherwise add the default generation
+        length to the generation parameters
+        Returns:
+            found (bool): Whether a matching and valid align statement was found
+            instantiated: The instantiated output, None if not found
+        """
+        # align statements are the ground truth, so exactly matching calls are answered without calling the model
+        found, instantiated = self._get_align_output(args, kwargs, function_plan, validator)
+        # add the generation length if not there
+        if not found and "max_new_tokens" not in generation_parameters:
+            generation_parameters["max_new_tokens"] = self.default_generation_length
+        return found, instantiated
+
+    @staticmethod
+    def _apply_repair(output, function_plan, choice, successful_repair):
+        """
+        Replace the output which failed type validation with the repaired one, raising if the repair failed
+        """
+        if not successful_repair:
+            raise TypeError(
+                f"Output type was not valid. Expected an object of type {function_plan.output_type_hint}, got '{output.generated_response}'")
+        output.generated_response = choice
+        output.distilled_model = False
+
+    def _save_output(self, args, kwargs, function_plan, output, valid):
+        """
+        Cache the validated output, and save it to the finetuning dataset if it is suitable for finetuning
+        """
+        if output.cache_key:
+            self.response_cache.set(function_plan.func_hash, output.cache_key, output.generated_response)
+        if output.suitable_for_finetuning and not output.distilled_model:
+            datapoint = FunctionExample(args, kwargs, output.generated_response)
+            self.function_modeler.postprocess_symbolic_datapoint(function_plan.func_hash, function_plan,
+                                                                 datapoint, repaired=not valid or output.repaired)
+
+    def _get_align_output(self, args, kwargs, function_plan, validator):
+        """
+        Get the asserted output of the align statement that exactly matches the call
+        Returns:
+            found (bool): Whether a matching and valid align statement was found
+            instantiated: The instantiated output, None if not found
+        """
+        found, output = self.function_modeler.get_symbolic_align_output(function_plan.func_hash, args, kwargs)
+        if not found or not validator.check_type(output, function_plan.output_type_hint):
+            return False, None
+        return True, validator.instantiate(output, function_plan.output_type_hint)
+
     def _parse_choice(self, output):
-        try:
-            # json load
-            choice_parsed = json.loads(output.generated_response)
-        except:
-            # if it fails, it's not a json object, try eval
-            try:
-                choice_parsed = eval(output.generated_response)
-            except:
-                choice_parsed = output.generated_response
-        return choice_parsed
-
-    def generate(self, args, kwargs, function_description, llm_parameters={}):
+        return self._parse_response(output.generated_response)
+
+    def _parse_response(self, response):
+        # JSON and Python literals are parsed without evaluating any code, anything else is kept as the raw text
+        return parse_output_or_text(response)
+
+    def generate(self, args, kwargs, function_description, llm_parameters={}, validator: Validator = None):
         """
         The main generation function, given the args, kwargs, function description and model type, generate a response and check if the datapoint can be saved to the finetune dataset
+        If a validator is given and the distilled model is on probation, the generation may be speculative
         """
 
-        func_hash = function_description.__hash__()
+        function_plan = as_function_plan(function_description)
+        cached_output, case = self._prepare_generation(args, kwargs, function_plan, llm_parameters, validator)
+        if cached_output is not None:
+            return cached_output
+        if case.teacher_model:
+            return self._speculative_generate(case, function_plan, validator, llm_parameters)
+        choice, generation_model = self._failover_generate(case.failover_chain, function_plan, llm_parameters,
+                                                           validator)
+        return self._get_generation_output(case, choice, generation_model)
+
+    async def agenerate(self, args, kwargs, function_description, llm_parameters={}, validator: Validator = None):
+        """
+        The asynchronous counterpart of generate, the request to the model is awaited on the running event loop
+        """
+
+        function_plan = as_function_plan(function_description)
+        # getting the generation case can read configs and datasets from storage, so it is done off the event loop
+        loop = asyncio.get_running_loop()
+        cached_output, case = await loop.run_in_executor(None, self._prepare_generation, args, kwargs, function_plan,
+                                                         llm_parameters, validator)
+        if cached_output is not None:
+            return cached_output
+        if case.teacher_model:
+            return await self._aspeculative_generate(case, function_plan, validator, llm_parameters)
+        choice, generation_model = await self._afailover_generate(case.failover_chain, function_plan, llm_parameters,
+                                                                  validator)
+        return self._get_generation_output(case, choice, generation_model)
+
+    def _prepare_generation(self, args, kwargs, function_plan, llm_parameters, validator):
+        """
+        Get everything a generation needs before the request to the model: the cached response, or the prompt and
+        model, and the teacher model to run speculatively or the failover chain
+        Returns:
+            cached_output (LanguageModelOutput): The output from the response cache, None if there was no fresh entry
+            case (GenerationCase): The generation case, None if the output was cached
+        """
+        func_hash = function_plan.func_hash
+        # the cache is looked up first, so that a hit does not pay for building the prompt
+        cache_key, cached_response = self._get_cached_response(args, kwargs, function_plan, llm_parameters)
+        if cached_response is not None:
+            # the cached response was already validated and saved to the datasets
+            return LanguageModelOutput(cached_response, False, False), None
         prompt, model, save_to_finetune, is_distilled_model = self.get_generation_case(args, kwargs,
-                                                                                       function_description,
-                                                                                       llm_parameters, 
+                                                                                       function_plan,
+                                                                                       llm_parameters,
                                                                                        func_hash)
-        # loggings
+        self._log_generation_model(function_plan, model, is_distilled_model)
+
+        case = GenerationCase(prompt, model, save_to_finetune, is_distilled_model, cache_key)
+        case.teacher_prompt, case.teacher_model = self._get_speculative_case(args, kwargs, function_plan, validator,
+                                                                             is_distilled_model, llm_parameters)
+        if not case.teacher_model and func_hash in self.failover_functions:
+            case.failover_chain = self._get_failover_chain(args, kwargs, function_plan, prompt, model, llm_parameters)
+        else:
+            case.failover_chain = [(prompt, model)]
+        return None, case
+
+    @staticmethod
+    def _get_generation_output(case, choice, generation_model):
+        # only the first model of the failover chain can be the distilled model
+        is_distilled_model = case.distilled_model and generation_model is case.model
+        return LanguageModelOutput(choice, case.suitable_for_finetuning, is_distilled_model, case.cache_key)
+
+    def _generate_answer(self, prompt, model, llm_parameters, function_plan, validator):
+        """
+        Generate an answer with the model, streaming it if the function is streamed
+        """
+        llm_parameters = self._get_model_parameters(function_plan, model, llm_parameters)
+        if validator is not None and function_plan.func_hash in self.streamed_functions:
+            return self._stream_answer(prompt, model, llm_parameters, function_plan, validator)
+        return self._synthesise_answer(prompt, model, llm_parameters)
+
+    async def _agenerate_answer(self, prompt, model, llm_parameters, function_plan, validator):
+        """
+        Generate an answer without blocking the event loop, see _generate_answer
+        """
+        llm_parameters = self._get_model_parameters(function_plan, model, llm_parameters)
+        if validator is not None and function_plan.func_hash in self.streamed_functions:
+            return await self._astream_answer(prompt, model, llm_parameters, function_plan, validator)
+        return await self._asynthesise_answer(prompt, model, llm_parameters)
+
+    def _get_failover_chain(self, args, kwargs, function_plan, prompt, model, llm_parameters):
+        """
+        Get the models to try in order, with the prompt rendered for each of them. The chain starts with the chosen
+        model and continues with the teacher models the input fits in, in the order they are configured in
+        """
+        chain = [(prompt, model)]
+        _, teacher_models = self.function_modeler.get_models(function_plan)
+        _, input_prompt_token_count = self.suitable_for_finetuning_token_check(args, kwargs,
+                                                                               function_plan.description_string,
+                                                                               model)
+        for teacher_model in teacher_models:
+            if (teacher_model.provider, teacher_model.model_name) == (model.provider, model.model_name):
+                continue
+            teacher_prompt, teacher_model = self._get_teacher_generation_case(args, kwargs, function_plan,
+                                                                              [teacher_model], llm_parameters,
+                                                                              input_prompt_token_count)
+            if teacher_model:
+                chain.append((teacher_prompt, teacher_model))
+        return chain
+
+    def _failover_generate(self, chain, function_plan, llm_parameters, validator):
+        """
+        Generate an answer with the models of the failover chain in order, failing over to the next model when the
+        provider of a model is unavailable
+        Returns:
+            choice (str): The generated response
+            model (BaseModelConfig): The model which generated the response
+        """
+        for index, (model_prompt, chain_model) in enumerate(chain):
+            with self._failover_attempt(function_plan, chain, index):
+                return self._generate_answer(model_prompt, chain_model, llm_parameters, function_plan,
+                                             validator), chain_model
+
+    async def _afailover_generate(self, chain, function_plan, llm_parameters, validator):
+        """
+        Generate an answer with failover without blocking the event loop, see _failover_generate
+        """
+        for index, (model_prompt, chain_model) in enumerate(chain):
+            with self._failover_attempt(function_plan, chain, index):
+                return await self._agenerate_answer(model_prompt, chain_model, llm_parameters, function_plan,
+                                                    validator), chain_model
+
+    @contextlib.contextmanager
+    def _failover_attempt(self, function_plan, chain, index):
+        """
+        The context of a generation with a model of the failover chain. The models before the last one are only
+        retried a few times so an outage does not stall the call, and if their provider is unavailable the error is
+        suppressed so that the next model is tried
+        """
+        if index == len(chain) - 1:
+            yield
+            return
+        try:
+            with limit_retries(self.failover_max_retries):
+                yield
+        except Exception as e:
+            if not is_provider_unavailable(e):
+                raise
+            self._log_failover(function_plan, chain[index][1], chain[index + 1][1], e)
+
+    @staticmethod
+    def _log_failover(function_plan, model, next_model, error):
+        logging.warning(f"{model.provider} is unavailable for {model.model_name} ({error}), "
+                        f"failing over to {next_model.model_name} for function {function_plan.name}.")
+
+    def _get_model_parameters(self, function_plan, model, llm_parameters):
+        """
+        Get the generation parameters for the model, adding the output schema if the function uses structured output
+        and both the model and its provider support it
+        """
+        if function_plan.func_hash not in self.structured_output_functions or function_plan.output_schema is None:
+            return llm_parameters
+        if not model.supports_structured_output:
+            return llm_parameters
+        if not getattr(self.api_provider[model.provider], "supports_structured_output", False):
+            return llm_parameters
+        return {**llm_parameters, "response_schema": function_plan.output_schema}
+
+    def _get_speculative_case(self, args, kwargs, function_plan, validator, is_distilled_model, llm_parameters):
+        """
+        Get the teacher prompt and model to run alongside the distilled model, if the call is speculative
+        Returns (None, None) if the call is not speculative
+        """
+        func_hash = function_plan.func_hash
+        if validator is None or not is_distilled_model or func_hash not in self.speculative_budgets:
+            return None, None
+        if not self.function_modeler.is_distilled_model_on_probation(func_hash):
+            return None, None
+        distilled_model, teacher_models = self.function_modeler.get_models(function_plan)
+        _, input_prompt_token_count = self.suitable_for_finetuning_token_check(args, kwargs,
+                                                                               function_plan.description_string,
+                                                                               distilled_model)
+        return self._get_teacher_generation_case(args, kwargs, function_plan, teacher_models, llm_parameters,
+                                                 input_prompt_token_count)
+
+    def _speculative_generate(self, case, function_plan, validator, llm_parameters):
+        """
+        Generate with the distilled model and a teacher model concurrently. The distilled output is used if it passes
+        validation within the speculative budget of the function, the teacher output otherwise
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            distilled_future = executor.submit(self._synthesise_answer, case.prompt, case.model,
+                                               self._get_model_parameters(function_plan, case.model, llm_parameters))
+            teacher_future = executor.submit(self._synthesise_answer, case.teacher_prompt, case.teacher_model,
+                                             self._get_model_parameters(function_plan, case.teacher_model,
+                                                                        llm_parameters))
+            done, _ = wait([distilled_future], timeout=self.speculative_budgets[function_plan.func_hash])
+            choice, valid = self._check_distilled_output(done, distilled_future, function_plan, validator)
+            if valid:
+                self.function_modeler.record_distilled_model_outcome(function_plan.func_hash, True)
+                return LanguageModelOutput(choice, case.suitable_for_finetuning, True, case.cache_key)
+            return self._get_teacher_output(case, teacher_future.result(), choice)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _aspeculative_generate(self, case, function_plan, validator, llm_parameters):
+        """
+        The asynchronous counterpart of _speculative_generate, the request that is not needed is cancelled
+        """
+        distilled_task = asyncio.ensure_future(self._asynthesise_answer(
+            case.prompt, case.model, self._get_model_parameters(function_plan, case.model, llm_parameters)))
+        teacher_task = asyncio.ensure_future(self._asynthesise_answer(
+            case.teacher_prompt, case.teacher_model,
+            self._get_model_parameters(function_plan, case.teacher_model, llm_parameters)))
+        try:
+            done, _ = await asyncio.wait([distilled_task], timeout=self.speculative_budgets[function_plan.func_hash])
+            choice, valid = self._check_distilled_output(done, distilled_task, function_plan, validator)
+            if valid:
+                teacher_task.cancel()
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.function_modeler.record_distilled_model_outcome,
+                                           function_plan.func_hash, True)
+                return LanguageModelOutput(choice, case.suitable_for_finetuning, True, case.cache_key)
+            distilled_task.cancel()
+            return self._get_teacher_output(case, await teacher_task, choice)
+        finally:
+            for task in (distilled_task, teacher_task):
+                task.cancel()
+
+    @staticmethod
+    def _get_teacher_output(case, teacher_choice, distilled_choice):
+        # a distilled output which failed validation is replaced by the teacher output, which counts as a repair
+        return LanguageModelOutput(teacher_choice, case.suitable_for_finetuning, False, case.cache_key,
+                                   repaired=distilled_choice is not None)
+
+    def _check_distilled_output(self, done, distilled_future, function_plan, validator):
+        """
+        Check the output of the distilled model in a speculative generation
+        Returns:
+            choice (str): The output of the distilled model, None if it was not generated within the budget
+            valid (bool): Whether the output passed validation
+        """
+        if distilled_future not in done:
+            logging.info(f"The distilled model of {function_plan.name} did not respond within the speculative budget, using the teacher model output")
+            return None, False
+        if distilled_future.exception() is not None:
+            logging.warning(f"The distilled model of {function_plan.name} failed to generate a response, using the teacher model output: {distilled_future.exception()}")
+            return None, False
+        choice = distilled_future.result()
+        _, valid = self._validate_response(choice, function_plan, validator)
+        if not valid:
+            logging.info(f"The distilled model output of {function_plan.name} failed type validation, using the teacher model output")
+        return choice, valid
+
+    def _get_cached_response(self, args, kwargs, function_plan, llm_parameters):
+        """
+        Look up the response of the call from the response cache, if caching is enabled for the function
+        Returns:
+            cache_key (str): The cache key of the call, None if caching is not enabled
+            cached_response (str): The cached response, None if there was no fresh entry
+        """
+        func_hash = function_plan.func_hash
+        if self.response_cache is None or func_hash not in self.cached_functions:
+            return None, None
+        # the cached responses are versioned by the models of the function, so they are invalidated after a finetune
+        # or when the teacher models are changed
+        distilled_model, teacher_models = self.function_modeler.get_models(function_plan)
+        model_version = ",".join([distilled_model.model_name] + [model.model_name for model in teacher_models])
+        self.response_cache.set_model_version(func_hash, model_version)
+        cache_key = ResponseCache.get_key(func_hash, args, kwargs, llm_parameters)
+        return cache_key, self.response_cache.get(func_hash, cache_key)
+
+    def _log_generation_model(self, function_plan, model, is_distilled_model):
+        """
+        Log which model is used to generate the outputs of the function, whenever that model changes
+        """
+        func_hash = function_plan.func_hash
         current_function_setup = self.initialized_functions.get(func_hash, None) # getting the current function setup - model and align statements
         if current_function_setup:
             generator_model = current_function_setup["model"]
             if is_distilled_model:
-                logging.info(f"Generating function outputs for {function_description.name} with a finetuned model: {model.model_name}.")
+                logging.info(f"Generating function outputs for {function_plan.name} with a finetuned model: {model.model_name}.")
                 self.initialized_functions[func_hash]["model"] = model.model_name
             elif generator_model == "":
-                logging.info(f"Found {len(current_function_setup['examples'])} align statements for {function_description.name}. Generating function outputs with {model.model_name}.")
+                logging.info(f"Found {len(current_function_setup['examples'])} align statements for {function_plan.name}. Generating function outputs with {model.model_name}.")
                 self.initialized_functions[func_hash]["model"] = model.model_name
             elif generator_model != model.model_name:
-                logging.info(f"Switching output generation from {generator_model} to {model.model_name} for function {function_description.name}.")
+                logging.info(f"Switching output generation from {generator_model} to {model.model_name} for function {function_plan.name}.")
                 self.initialized_functions[func_hash]["model"] = model.model_name
 
-        choice = self._synthesise_answer(prompt, model, llm_parameters)
-        output = LanguageModelOutput(choice, save_to_finetune, is_distilled_model)
-        return output
-
     def _synthesise_answer(self, prompt, model, llm_parameters):
         """
         Synthesise an answer given the prompt, model, model_type and llm_parameters
@@ -117,8 +551,117 @@ class LanguageModelManager(object):
             choice (str): The generated response
 
         """
-        system_message = model.system_message
-        return self.api_provider[model.provider].generate(model, system_message, prompt, **llm_parameters)
+        if self.rate_limiter.is_limited(model):
+            self.rate_limiter.acquire(model, self._estimate_request_tokens(prompt, model, llm_parameters))
+        start_time = time.monotonic()
+        try:
+            choice = self.api_provider[model.provider].generate(model, model.system_message, prompt, **llm_parameters)
+        except Exception:
+            self.model_router.record(model, error=True)
+            raise
+        return self._finish_answer(model, start_time, choice, llm_parameters)
+
+    async def _asynthesise_answer(self, prompt, model, llm_parameters):
+        """
+        Synthesise an answer without blocking the event loop, see _synthesise_answer
+        """
+        if self.rate_limiter.is_limited(model):
+            await self.rate_limiter.aacquire(model, self._estimate_request_tokens(prompt, model, llm_parameters))
+        start_time = time.monotonic()
+        try:
+            choice = await self.api_provider[model.provider].agenerate(model, model.system_message, prompt,
+                                                                       **llm_parameters)
+        except Exception:
+            self.model_router.record(model, error=True)
+            raise
+        return self._finish_answer(model, start_time, choice, llm_parameters)
+
+    def _finish_answer(self, model, start_time, choice, llm_parameters):
+        """
+        Record a successful generation and unwrap the structured output from the object the providers require at
+        the root
+        """
+        self._record_generation(model, start_time, choice)
+        if "response_schema" in llm_parameters:
+            return unwrap_structured_output(choice)
+        return choice
+
+    def _stream_answer(self, prompt, model, llm_parameters, function_plan, validator):
+        """
+        Synthesise an answer by streaming it, stopping the generation as soon as the end token of the model appears
+        or the output so far can no longer pass validation
+        """
+        if self.rate_limiter.is_limited(model):
+            self.rate_limiter.acquire(model, self._estimate_request_tokens(prompt, model, llm_parameters))
+        collector = self._get_stream_collector(model, llm_parameters, function_plan, validator)
+        start_time = time.monotonic()
+        stream = self.api_provider[model.provider].stream(model, model.system_message, prompt, **llm_parameters)
+        try:
+            for chunk in stream:
+                if collector.add(chunk):
+                    break
+        except Exception:
+            self.model_router.record(model, error=True)
+            raise
+        finally:
+            # closing the stream closes the connection, which stops the generation
+            stream.close()
+        return self._finish_stream(model, start_time, collector, llm_parameters, function_plan)
+
+    async def _astream_answer(self, prompt, model, llm_parameters, function_plan, validator):
+        """
+        Synthesise an answer by streaming it without blocking the event loop, see _stream_answer
+        """
+        if self.rate_limiter.is_limited(model):
+            await self.rate_limiter.aacquire(model, self._estimate_request_tokens(prompt, model, llm_parameters))
+        collector = self._get_stream_collector(model, llm_parameters, function_plan, validator)
+        start_time = time.monotonic()
+        stream = self.api_provider[model.provider].astream(model, model.system_message, prompt, **llm_parameters)
+        try:
+            async for chunk in stream:
+                if collector.add(chunk):
+                    break
+        except Exception:
+            self.model_router.record(model, error=True)
+            raise
+        finally:
+            await stream.aclose()
+        return self._finish_stream(model, start_time, collector, llm_parameters, function_plan)
+
+    @staticmethod
+    def _get_stream_collector(model, llm_parameters, function_plan, validator):
+        # structured outputs are constrained by the provider, and are wrapped so their prefix is not checked
+        structured_output = "response_schema" in llm_parameters
+        return StreamCollector(model, function_plan.output_type_hint, None if structured_output else validator)
+
+    def _finish_stream(self, model, start_time, collector, llm_parameters, function_plan):
+        """
+        Record a successful streamed generation and get the answer collected from the stream
+        """
+        if collector.aborted:
+            logging.info(f"Stopped the generation of {function_plan.name} early, the output can not be valid: '{collector.text}'")
+        self._record_generation(model, start_time, collector.text)
+        if "response_schema" in llm_parameters:
+            return unwrap_structured_output(collector.get_choice())
+        return collector.get_choice()
+
+    def _record_generation(self, model, start_time, choice):
+        """
+        Record the latency and output length of a successful generation in the rolling statistics of the model
+        """
+        self.model_router.record(model,
+                                 latency=time.monotonic() - start_time,
+                                 output_token_count=self.token_estimator.count(choice) if choice else 0)
+
+    def _estimate_request_tokens(self, prompt, model, llm_parameters):
+        """
+        Estimate the tokens a request uses against the rate limits, i.e. the prompt and the maximum generation length
+        """
+        if model.system_message_token_count < 0:
+            model.system_message_token_count = self.token_estimator.count(model.system_message)
+        generation_tokens = llm_parameters.get("max_new_tokens", self.default_generation_length)
+        prompt_token_count = self.token_estimator.count(prompt) + model.system_message_token_count
+        return self.token_estimator.adjust(prompt_token_count, model.model_name) + generation_tokens
 
 
     def get_generation_case(self, args, kwargs, function_description, llm_parameters, func_hash):
@@ -127,9 +670,10 @@ class LanguageModelManager(object):
         First get the current model, then if distilled model, do zero-shot prompt and return False as suitable_for_finetune
         If not distilled model, check if suitable for finetuning, create the prompt and return the correct model given the token count
         """
-        f = str(function_description.__dict__.__repr__())
+        function_plan = as_function_plan(function_description)
+        f = function_plan.description_string
 
-        distilled_model, teacher_models = self.function_modeler.get_models(function_description)
+        distilled_model, teacher_models = self.function_modeler.get_models(function_plan)
         is_distilled_model = distilled_model.model_name != ""
         suitable_for_distillation, input_prompt_token_count = self.suitable_for_finetuning_token_check(args, kwargs, f,
                                                                                                        distilled_model)
@@ -138,46 +682,152 @@ class LanguageModelManager(object):
             self.initialized_functions[func_hash] = {"model": "", "examples": []}
         # no examples needed, using a finetuned model. Dont save to finetune dataset
         if is_distilled_model and suitable_for_distillation:
-            prompt = self.construct_prompt(f, args, kwargs, [], distilled_model)
+            prompt = self._get_prompt_prefix(function_plan, distilled_model, few_shot=False) + \
+                     self.construct_prompt_input(args, kwargs)
             return prompt, distilled_model, suitable_for_distillation, True
 
         else:
-            aligns = self.function_modeler.get_symbolic_alignments(function_description.__hash__(), max=16)
-            examples = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput: {align['output']}" for align in
-                 aligns]
-            
             # update the examples in the initialized_functions dict
-            self.initialized_functions[func_hash]["examples"] = examples
+            self.initialized_functions[func_hash]["examples"] = self._get_align_examples(function_plan)[0]
 
-            examples_token_count = sum([approximate_token_count(example) for example in examples])
-            generation_tokens = llm_parameters.get("max_new_tokens", self.default_generation_length)
-            model = self.choose_model_from_tokens(teacher_models,
-                                                  examples_token_count + input_prompt_token_count + generation_tokens,
-                                                  len(examples))
+            prompt, model = self._get_teacher_generation_case(args, kwargs, function_plan, teacher_models,
+                                                              llm_parameters, input_prompt_token_count)
             if model:
-                examples_with_parsing_tokens = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput:{model.parsing_helper_tokens['start_token']}{align['output']}{model.parsing_helper_tokens['end_token']}" for align in
-                 aligns]
-                prompt = self.construct_prompt(f, args, kwargs, examples_with_parsing_tokens, model)
                 return prompt, model, suitable_for_distillation, False
             else:
                 raise ValueError(
                     "The input content and align statements combined are too long, please shorten it. The maximum currently allowed token limit is 32000")
 
+    def _get_teacher_generation_case(self, args, kwargs, function_plan, teacher_models, llm_parameters,
+                                     input_prompt_token_count):
+        """
+        Get the few-shot prompt and the teacher model to generate with given the token count
+        Returns (None, None) if the input is too long for all of the teacher models
+        """
+        retriever = self.function_modeler.get_symbolic_align_retriever(function_plan.func_hash)
+        if retriever is not None and len(retriever) > self.align_retrieval_k:
+            return self._get_retrieval_generation_case(args, kwargs, function_plan, teacher_models, llm_parameters,
+                                                       input_prompt_token_count, retriever)
+        examples, examples_token_count = self._get_align_examples(function_plan)
+        generation_tokens = llm_parameters.get("max_new_tokens", self.default_generation_length)
+        model = self.choose_model_from_tokens(teacher_models,
+                                              examples_token_count + input_prompt_token_count + generation_tokens,
+                                              len(examples),
+                                              routing=self.routing_policies.get(function_plan.func_hash),
+                                              generation_token_count=generation_tokens)
+        if model:
+            prompt = self._get_prompt_prefix(function_plan, model, few_shot=True) + \
+                     self.construct_prompt_input(args, kwargs)
+            return prompt, model
+        return None, None
+
+    def _get_retrieval_generation_case(self, args, kwargs, function_plan, teacher_models, llm_parameters,
+                                       input_prompt_token_count, retriever):
+        """
+        Get the few-shot prompt and the teacher model for a function with more align statements than fit in the
+        prompt. The teacher model is chosen for the input, and the align statements most relevant to the input are
+        packed greedily into the part of its context the input leaves over (at most EXAMPLE_ELEMENT_LIMIT tokens)
+        Returns (None, None) if the input is too long for all of the teacher models
+        """
+        prompt_input = self.construct_prompt_input(args, kwargs)
+        ranked_aligns = [retriever.aligns[index] for index in retriever.rank(prompt_input, self.align_retrieval_k)]
+        generation_tokens = llm_parameters.get("max_new_tokens", self.default_generation_length)
+        model = self.choose_model_from_tokens(teacher_models,
+                                              input_prompt_token_count + generation_tokens,
+                                              len(ranked_aligns),
+                                              routing=self.routing_policies.get(function_plan.func_hash),
+                                              generation_token_count=generation_tokens)
+        if not model:
+            return None, None
+        total_token_count = self._get_model_token_count(model, input_prompt_token_count + generation_tokens,
+                                                        len(ranked_aligns))
+        # the budget is in raw token counts, as the examples are counted uncalibrated
+        calibration_factor = self.token_estimator.get_calibration_factor(model.model_name)
+        token_budget = min(EXAMPLE_ELEMENT_LIMIT, (model.context_length - 1 - total_token_count) / calibration_factor)
+        start_token = model.parsing_helper_tokens["start_token"]
+        end_token = model.parsing_helper_tokens["end_token"]
+        examples = []
+        for align in ranked_aligns:
+            example = f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput:{start_token}{align['output']}{end_token}"
+            example_token_count = self.token_estimator.count(example)
+            # examples that do not fit are skipped, a less relevant but shorter one may still fit
+            if example_token_count <= token_budget:
+                examples.append(example)
+                token_budget -= example_token_count
+        prompt = self.construct_prompt_prefix(function_plan.description_string, examples, model) + prompt_input
+        return prompt, model
+
     def suitable_for_finetuning_token_check(self, args, kwargs, f, distilled_model: BaseModelConfig):
         """
         Check if the inputs are suitable for finetuning, i.e are below the finetuning token count
         """
         # check if finetunable
         finetuning_prompt = f"Function: {f}\n---\nInputs:\nArgs: {args}\nKwargs: {kwargs}\nOutput:"
-        input_prompt_token_count = approximate_token_count(finetuning_prompt)
+        input_prompt_token_count = self.token_estimator.count(finetuning_prompt)
         if distilled_model.system_message_token_count < 0:
-            distilled_model.system_message_token_count = approximate_token_count(distilled_model.system_message)
+            distilled_model.system_message_token_count = self.token_estimator.count(distilled_model.system_message)
         if distilled_model.instruction_token_count < 0:
-            distilled_model.instruction_token_count = approximate_token_count(distilled_model.instructions)
+            distilled_model.instruction_token_count = self.token_estimator.count(distilled_model.instructions)
 
-        suitable_for_finetune = input_prompt_token_count + distilled_model.instruction_token_count + distilled_model.system_message_token_count < distilled_model.context_length
+        total_token_count = input_prompt_token_count + distilled_model.instruction_token_count + distilled_model.system_message_token_count
+        suitable_for_finetune = self.token_estimator.adjust(total_token_count, distilled_model.model_name) < distilled_model.context_length
         return suitable_for_finetune, input_prompt_token_count
 
+    def _get_function_prompt_cache(self, function_plan):
+        """
+        Get the prompt cache of the function, resetting it if the align set has changed since it was built
+        """
+        func_hash = function_plan.func_hash
+        align_version = self.function_modeler.get_symbolic_align_version(func_hash)
+        function_cache = self.prompt_prefixes.get(func_hash)
+        if function_cache is None or function_cache["align_version"] != align_version:
+            function_cache = {"align_version": align_version, "aligns": None, "examples": None, "prefixes": {}}
+            self.prompt_prefixes[func_hash] = function_cache
+        return function_cache
+
+    def _get_align_examples(self, function_plan):
+        """
+        Get the rendered align examples of the function and their token count
+        """
+        function_cache = self._get_function_prompt_cache(function_plan)
+        return self._load_align_examples(function_plan, function_cache)
+
+    def _load_align_examples(self, function_plan, function_cache):
+        """
+        Render the align examples into the prompt cache of the function, if not rendered yet
+        """
+        if function_cache["examples"] is None:
+            aligns = self.function_modeler.get_symbolic_alignments(function_plan.func_hash, max=16)
+            examples = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput: {align['output']}" for align in
+                 aligns]
+            examples_token_count = sum([self.token_estimator.count(example) for example in examples])
+            function_cache["aligns"] = aligns
+            function_cache["examples"] = (examples, examples_token_count)
+        return function_cache["examples"]
+
+    def _get_prompt_prefix(self, function_plan, model, few_shot=True):
+        """
+        Get the static prefix of the prompt (instructions, function description and examples), which only changes
+        when the align set of the function changes. Few-shot prefixes include the align examples, rendered with the
+        parsing helper tokens of the model
+        """
+        function_cache = self._get_function_prompt_cache(function_plan)
+        prefix_key = (model.model_name,
+                      model.instructions,
+                      model.parsing_helper_tokens["start_token"],
+                      model.parsing_helper_tokens["end_token"],
+                      few_shot)
+        prefix = function_cache["prefixes"].get(prefix_key)
+        if prefix is None:
+            examples_with_parsing_tokens = []
+            if few_shot:
+                self._load_align_examples(function_plan, function_cache)
+                examples_with_parsing_tokens = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput:{model.parsing_helper_tokens['start_token']}{align['output']}{model.parsing_helper_tokens['end_token']}" for align in
+                 function_cache["aligns"]]
+            prefix = self.construct_prompt_prefix(function_plan.description_string, examples_with_parsing_tokens, model)
+            function_cache["prefixes"][prefix_key] = prefix
+        return prefix
+
     def construct_prompt(self, f, args, kwargs, examples, model):
         """
         Construct a prompt given the model, function description, args, kwargs and examples
@@ -192,6 +842,12 @@ class LanguageModelManager(object):
         Returns:
             content (str): The prompt to send to the model
         """
+        return self.construct_prompt_prefix(f, examples, model) + self.construct_prompt_input(args, kwargs)
+
+    def construct_prompt_prefix(self, f, examples, model):
+        """
+        Construct the static part of the prompt, which does not depend on the inputs of the call
+        """
         if examples:
             final_examples = "\n".join(
                     [f"{align}" for align in
@@ -201,31 +857,159 @@ class LanguageModelManager(object):
             example_input = ""
 
         instruction_prompt = model.instructions
-        content = f"{instruction_prompt}\nFunction: {f}\n{example_input}---\nInputs:\nArgs: {args}\nKwargs: {kwargs}\nOutput:"
-        return content
+        return f"{instruction_prompt}\nFunction: {f}\n{example_input}---\nInputs:\n"
+
+    def construct_prompt_input(self, args, kwargs):
+        """
+        Construct the part of the prompt with the inputs of the call
+        """
+        return f"Args: {args}\nKwargs: {kwargs}\nOutput:"
 
     def repair_generate(self, args, kwargs, f, failed_outputs_list, aligns, models, llm_parameters):
         """
         Repair the output given the input, function description, failed outputs list, examples and models
         """
-        # get the token counts
-        examples = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput: {align['output']}" for align in
-                 aligns]
-        examples_token_count = sum([approximate_token_count(example) for example in examples])
-        failed_examples_token_count = sum([approximate_token_count(failed_output[0]) + approximate_token_count(failed_output[1]) for failed_output in failed_outputs_list])
-        input_prompt_token_count = approximate_token_count(f"Function: {f}\n---\nInputs:\nArgs: {args}\nKwargs: {kwargs}\nOutput:")
-        generation_tokens = llm_parameters.get("max_new_tokens", self.default_generation_length)
-        model = self.choose_model_from_tokens(models, 
-                                              examples_token_count+input_prompt_token_count+generation_tokens+failed_examples_token_count,
-                                              len(examples))
+        prompt, model = self.get_repair_case(args, kwargs, f, failed_outputs_list, aligns, models, llm_parameters)
         if model:
-            prompt = self.generate_repair_prompt(args, kwargs, f, failed_outputs_list, examples, model)
             logging.info(f"Previous output failed type validation, attempting to repair with {model.model_name}")
             choice = self._synthesise_answer(prompt, model, llm_parameters)
             return choice
         else:
             return None
 
+    def get_repair_case(self, args, kwargs, f, failed_outputs_list, aligns, models, llm_parameters):
+        """
+        Get the repair prompt and the model to repair with given the token count
+        Returns (None, None) if the input is too long for all of the models
+        """
+        examples, token_count = self._get_repair_token_count(args, kwargs, f, failed_outputs_list, aligns, llm_parameters)
+        model = self.choose_model_from_tokens(models, token_count, len(examples))
+        if model:
+            prompt = self.generate_repair_prompt(args, kwargs, f, failed_outputs_list, examples, model)
+            return prompt, model
+        return None, None
+
+    def get_repair_cases(self, args, kwargs, f, failed_outputs_list, aligns, models, llm_parameters, nr_of_cases):
+        """
+        Get up to nr_of_cases repair cases (prompt, model and generation parameters) to generate concurrently.
+        The cases are spread over the models the input fits in, and once every model has a case, over increasing
+        temperatures so that the candidates differ from each other
+        Returns an empty list if the input is too long for all of the models
+        """
+        examples, token_count = self._get_repair_token_count(args, kwargs, f, failed_outputs_list, aligns, llm_parameters)
+        fitting_models = [model for model in models if self.choose_model_from_tokens([model], token_count, len(examples))]
+        if not fitting_models:
+            return []
+        prompts = {}
+        cases = []
+        for case_index in range(nr_of_cases):
+            model = fitting_models[case_index % len(fitting_models)]
+            temperature_index = case_index // len(fitting_models)
+            case_parameters = dict(llm_parameters)
+            if temperature_index > 0:
+                temperature = llm_parameters.get("temperature", DEFAULT_TEMPERATURE)
+                case_parameters["temperature"] = min(1, temperature + temperature_index * DEFAULT_REPAIR_TEMPERATURE_STEP)
+            if model.model_name not in prompts:
+                prompts[model.model_name] = self.generate_repair_prompt(args, kwargs, f, failed_outputs_list, examples, model)
+            cases.append((prompts[model.model_name], model, case_parameters))
+        return cases
+
+    def _get_repair_token_count(self, args, kwargs, f, failed_outputs_list, aligns, llm_parameters):
+        """
+        Get the examples of the repair prompt and the token count of the repair request
+        """
+        examples = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput: {align['output']}" for align in
+                 aligns]
+        examples_token_count = sum([self.token_estimator.count(example) for example in examples])
+        failed_examples_token_count = sum([self.token_estimator.count(failed_output[0]) + self.token_estimator.count(failed_output[1]) for failed_output in failed_outputs_list])
+        input_prompt_token_count = self.token_estimator.count(f"Function: {f}\n---\nInputs:\nArgs: {args}\nKwargs: {kwargs}\nOutput:")
+        generation_tokens = llm_parameters.get("max_new_tokens", self.default_generation_length)
+        token_count = examples_token_count + input_prompt_token_count + generation_tokens + failed_examples_token_count
+        return examples, token_count
+
+    def _validate_response(self, choice, function_plan, validator):
+        """
+        Parse a response and check it against the output type of the function
+        """
+        choice_parsed = self._parse_response(choice)
+        return choice_parsed, validator.check_type(choice_parsed, function_plan.output_type_hint)
+
+    def parallel_repair_generate(self, cases, function_plan, validator):
+        """
+        Generate the repair cases concurrently and return the first candidate that passes validation.
+        The cases which have not started yet are cancelled once a candidate is valid, the requests already in flight
+        run to completion in the background and are discarded
+
+        Returns:
+            choice (str): The valid candidate, or the last candidate if none are valid
+            choice_parsed: The parsed choice
+            valid (bool): Whether a valid candidate was found
+            failed_choices (list): The candidates that failed validation
+        """
+        logging.info(f"Previous output failed type validation, attempting {len(cases)} concurrent repairs with "
+                     f"{', '.join(sorted(set(model.model_name for _, model, _ in cases)))}")
+        executor = ThreadPoolExecutor(max_workers=len(cases))
+        try:
+            pending = {executor.submit(self._synthesise_answer, prompt, model, case_parameters)
+                       for prompt, model, case_parameters in cases}
+            choice, choice_parsed, valid, failed_choices, errors = None, None, False, [], []
+            while pending and not valid:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                choice, choice_parsed, valid = self._check_finished_repairs(done, function_plan, validator,
+                                                                            failed_choices, errors,
+                                                                            (choice, choice_parsed, valid))
+            return self._repair_result(choice, choice_parsed, valid, failed_choices, errors)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aparallel_repair_generate(self, cases, function_plan, validator):
+        """
+        The asynchronous counterpart of parallel_repair_generate, the requests still in flight are cancelled once a
+        candidate is valid
+        """
+        logging.info(f"Previous output failed type validation, attempting {len(cases)} concurrent repairs with "
+                     f"{', '.join(sorted(set(model.model_name for _, model, _ in cases)))}")
+        pending = {asyncio.ensure_future(self._asynthesise_answer(prompt, model, case_parameters))
+                   for prompt, model, case_parameters in cases}
+        try:
+            choice, choice_parsed, valid, failed_choices, errors = None, None, False, [], []
+            while pending and not valid:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                choice, choice_parsed, valid = self._check_finished_repairs(done, function_plan, validator,
+                                                                            failed_choices, errors,
+                                                                            (choice, choice_parsed, valid))
+            return self._repair_result(choice, choice_parsed, valid, failed_choices, errors)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _check_finished_repairs(self, done, function_plan, validator, failed_choices, errors, result):
+        """
+        Validate the finished repair candidates, collecting the invalid ones and the errors
+        """
+        for future in done:
+            if future.exception() is not None:
+                errors.append(future.exception())
+                continue
+            candidate = future.result()
+            if not candidate:
+                continue
+            candidate_parsed, candidate_valid = self._validate_response(candidate, function_plan, validator)
+            if candidate_valid:
+                return candidate, candidate_parsed, True
+            failed_choices.append(candidate)
+            result = (candidate, candidate_parsed, False)
+        return result
+
+    @staticmethod
+    def _repair_result(choice, choice_parsed, valid, failed_choices, errors):
+        """
+        The result of a round of concurrent repairs, raising the error if every candidate failed to generate
+        """
+        if not valid and not failed_choices and errors:
+            raise errors[0]
+        return choice, choice_parsed, valid, failed_choices
+
     def generate_repair_prompt(self, args, kwargs, f, failed_outputs_list, examples, model):
         """
         Generate a repair prompt given the args, kwargs, function description, failed outputs list and examples
@@ -248,7 +1032,8 @@ class LanguageModelManager(object):
         prompt = f"{model.repair_instruction}{end_token_addition}\nFUNCTION DESCRIPTION: {f}\n{successful_examples}---{model.parsing_helper_tokens['start_token']}Inputs:\nArgs: {args}\nKwargs: {kwargs}\nFAILED EXAMPLES: {failed_examples}Correct output:"
         return prompt
 
-    def choose_model_from_tokens(self, models, input_token_count, nr_of_examples=0):
+    def choose_model_from_tokens(self, models, input_token_count, nr_of_examples=0, routing=None,
+                                 generation_token_count=0):
         """
         Choose a model from the models given the token count and number of examples
 
@@ -256,31 +1041,46 @@ class LanguageModelManager(object):
             models (list): The models to choose from
             input_token_count (int): The token count of the input
             nr_of_examples (int): The number of examples
+            routing (str): The routing policy to choose between the models that fit, None for the first model
+            generation_token_count (int): The maximum number of generated tokens included in the input token count
         
         Returns:
             model (BaseModelConfig): The chosen model
         """
+        fitting_models = []
 
         for model in models:
             # check if input token count is less than the context length
-            # If the model config has custom messages, then use those, otherwise use the default ones
-            if model.system_message_token_count < 0:
-                model.system_message_token_count = approximate_token_count(model.system_message)
-            if model.instruction_token_count < 0:
-                model.instruction_token_count = approximate_token_count(model.instructions)
-            if model.parsing_helper_tokens["start_token"]:
-                input_token_count += 2*nr_of_examples
-            if model.parsing_helper_tokens["end_token"]:
-                input_token_count += 2*nr_of_examples
-            total_token_count = input_token_count + model.instruction_token_count + model.system_message_token_count
+            total_token_count = self._get_model_token_count(model, input_token_count, nr_of_examples)
             if total_token_count < model.context_length:
-                return model
-        return None
+                if routing is None:
+                    return model
+                fitting_models.append((model, total_token_count - generation_token_count))
+        return self.model_router.choose(fitting_models, routing, generation_token_count)
+
+    def _get_model_token_count(self, model, input_token_count, nr_of_examples=0):
+        """
+        Get the calibrated token count of a request to the model, adding the instructions, the system message and the
+        parsing helper tokens of the examples to the input token count
+        """
+        # If the model config has custom messages, then use those, otherwise use the default ones
+        if model.system_message_token_count < 0:
+            model.system_message_token_count = self.token_estimator.count(model.system_message)
+        if model.instruction_token_count < 0:
+            model.instruction_token_count = self.token_estimator.count(model.instructions)
+        # the parsing helper tokens of every example are counted per model, without carrying over to the next one
+        model_input_token_count = input_token_count
+        if model.parsing_helper_tokens["start_token"]:
+            model_input_token_count += 2*nr_of_examples
+        if model.parsing_helper_tokens["end_token"]:
+            model_input_token_count += 2*nr_of_examples
+        total_token_count = model_input_token_count + model.instruction_token_count + model.system_message_token_count
+        return self.token_estimator.adjust(total_token_count, model.model_name)
 
     def repair_output(self,
                       args: tuple,
                       kwargs: dict,
-                      function_description: FunctionDescription,
+                      function_description: Union[FunctionDescription, FunctionPlan],
                       choice,
                       validator: Validator,
                       generation_parameters: dict) -> tuple:
@@ -299,49 +1099,104 @@ class LanguageModelManager(object):
             valid (bool): Whether the output was correctly repaired was valid
         """
 
-        # get the teacher models
-        teacher_models = self.function_modeler.get_models(function_description)[1]
-        valid = False
-        retry_index = 5
-        f = str(function_description.__dict__.__repr__() + "\n")
-        error = f"Output type was not valid. Expected an valid object of type {function_description.output_type_hint}, got '{choice}'"
-        # instantiate the failed outputs list
-        failed_outputs_list = [(choice, error)]
-        while retry_index > 0 and not valid:
-            # get the alignments
-            aligns = self.function_modeler.get_symbolic_alignments(function_description.__hash__(), max=5)
-            # Generate the reparied LLM output
-            choice = self.repair_generate(args, 
-                                          kwargs, 
-                                          f, 
-                                          failed_outputs_list, 
-                                          aligns, 
-                                          teacher_models,
-                                          generation_parameters)
-            if not choice:
-                # if no choice then the input was too long for the model
-                # no specific error but the retry index goes down
-                retry_index -= 1
+        function_plan = as_function_plan(function_description)
+        repair = self._start_repair(function_plan, choice)
+        while repair.retries_left > 0 and not repair.valid:
+            cases = self._get_next_repair_cases(args, kwargs, repair, generation_parameters)
+            if not cases:
                 continue
+            if repair.parallel_repairs > 1:
+                # generate several candidates at once and keep the first valid one
+                result = self.parallel_repair_generate(cases, function_plan, validator)
+            else:
+                prompt, model, case_parameters = cases[0]
+                result = self._check_repair(self._synthesise_answer(prompt, model, case_parameters),
+                                            function_plan, validator)
+            self._record_repair(repair, function_plan, len(cases), *result)
+        return repair.choice, repair.choice_parsed, repair.valid
 
-            # start parsing the object
-            try:
-                # json load
-                choice_parsed = json.loads(choice)
-            except:
-                # if it fails, it's not a json object, try eval
-                try:
-                    choice_parsed = eval(choice)
-                except:
-                    choice_parsed = choice
-
-            valid = validator.check_type(choice_parsed, function_description.output_type_hint)
-            if not valid:
-                # if it's not valid, add it to the failed outputs list
-                error = f"Output type was not valid. Expected an object of type {function_description.output_type_hint}, got '{choice}'"
-                failed_outputs_list.append((choice, error))
-                retry_index -= 1
-            if valid:
-                logging.info(f"Successfully repaired output.")
+    async def arepair_output(self,
+                             args: tuple,
+                             kwargs: dict,
+                             function_description: Union[FunctionDescription, FunctionPlan],
+                             choice,
+                             validator: Validator,
+                             generation_parameters: dict) -> tuple:
+        """
+        The asynchronous counterpart of repair_output, the repair requests are awaited on the running event loop
+        """
+
+        function_plan = as_function_plan(function_description)
+        # the teacher models and align statements can be read from storage, so they are loaded off the event loop
+        loop = asyncio.get_running_loop()
+        repair = await loop.run_in_executor(None, self._start_repair, function_plan, choice)
+        while repair.retries_left > 0 and not repair.valid:
+            cases = self._get_next_repair_cases(args, kwargs, repair, generation_parameters)
+            if not cases:
+                continue
+            if repair.parallel_repairs > 1:
+                result = await self.aparallel_repair_generate(cases, function_plan, validator)
+            else:
+                prompt, model, case_parameters = cases[0]
+                result = self._check_repair(await self._asynthesise_answer(prompt, model, case_parameters),
+                                            function_plan, validator)
+            self._record_repair(repair, function_plan, len(cases), *result)
+        return repair.choice, repair.choice_parsed, repair.valid
+
+    def _start_repair(self, function_plan, choice) -> RepairState:
+        """
+        Get the state of the repair of an output which failed type validation
+        """
+        error = f"Output type was not valid. Expected an valid object of type {function_plan.output_type_hint}, got '{choice}'"
+        return RepairState(f=function_plan.description_string + "\n",
+                           teacher_models=self.function_modeler.get_models(function_plan)[1],
+                           # the alignments do not change between the repair attempts
+                           aligns=self.function_modeler.get_symbolic_alignments(function_plan.func_hash, max=5),
+                           parallel_repairs=self.parallel_repairs.get(function_plan.func_hash, 1),
+                           retries_left=5,
+                           choice=choice,
+                           failed_outputs_list=[(choice, error)])
 
-        return choice, choice_parsed, valid
+    def _get_next_repair_cases(self, args, kwargs, repair, generation_parameters):
+        """
+        Get the repair cases (prompt, model and generation parameters) of the next round of a repair, several to
+        generate concurrently if the function has parallel repairs. A round without cases, as the input was too long
+        for all of the models, uses up a retry
+        """
+        if repair.parallel_repairs > 1:
+            cases = self.get_repair_cases(args, kwargs, repair.f, repair.failed_outputs_list, repair.aligns,
+                                          repair.teacher_models, generation_parameters,
+                                          min(repair.parallel_repairs, repair.retries_left))
+        else:
+            prompt, model = self.get_repair_case(args, kwargs, repair.f, repair.failed_outputs_list, repair.aligns,
+                                                 repair.teacher_models, generation_parameters)
+            cases = [(prompt, model, generation_parameters)] if model else []
+            if model:
+                logging.info(f"Previous output failed type validation, attempting to repair with {model.model_name}")
+        if not cases:
+            repair.retries_left -= 1
+        return cases
+
+    def _check_repair(self, choice, function_plan, validator):
+        """
+        Validate a serially generated repair candidate
+        Returns the same as parallel_repair_generate
+        """
+        if not choice:
+            # no specific error, but the retry is used up
+            return choice, None, False, []
+        choice_parsed, valid = self._validate_response(choice, function_plan, validator)
+        return choice, choice_parsed, valid, [] if valid else [choice]
+
+    @staticmethod
+    def _record_repair(repair, function_plan, nr_of_cases, choice, choice_parsed, valid, failed_choices):
+        """
+        Record the result of a round of a repair, adding the candidates which failed validation to the failed outputs
+        """
+        repair.choice, repair.choice_parsed, repair.valid = choice, choice_parsed, valid
+        repair.retries_left -= nr_of_cases
+        for failed_choice in failed_choices:
+            error = f"Output type was not valid. Expected an object of type {function_plan.output_type_hint}, got '{failed_choice}'"
+            repair.failed_outputs_list.append((failed_choice, error))
+        if valid:
+            logging.info(f"Successfully repaired output.")
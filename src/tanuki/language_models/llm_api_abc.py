@@ -1,8 +1,14 @@
 # import abstract base class
+import asyncio
+import contextvars
+import functools
 from abc import ABC, abstractmethod
 
 
 class LLM_API(ABC):
+    # whether the provider constrains generations to the JSON Schema given as the response_schema parameter
+    supports_structured_output = False
+
     def __init__(self) -> None:
         pass
         
@@ -11,4 +17,32 @@ class LLM_API(ABC):
         """
         The main generation function, given the args, kwargs, function_modeler, function description and model type, generate a response and check if the datapoint can be saved to the finetune dataset
         """
-        pass
\ No newline at end of file
+        pass
+
+    async def agenerate(self, model, system_message, prompt, **kwargs):
+        """
+        The asynchronous generation function. Providers with a non-blocking client should override this,
+        by default the blocking generate function is run in the default executor so the event loop is not stalled
+        """
+        loop = asyncio.get_running_loop()
+        # the context is copied so that context-local settings, e.g. the retry limits, apply in the executor
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, functools.partial(context.run,
+                                                                  self.generate,
+                                                                  model,
+                                                                  system_message,
+                                                                  prompt,
+                                                                  **kwargs))
+
+    def stream(self, model, system_message, prompt, **kwargs):
+        """
+        Stream the generated text in chunks. Closing the generator stops reading the generation.
+        Providers which support streaming should override this, by default the whole generation is a single chunk
+        """
+        yield self.generate(model, system_message, prompt, **kwargs)
+
+    async def astream(self, model, system_message, prompt, **kwargs):
+        """
+        Stream the generated text in chunks without blocking the event loop, see stream
+        """
+        yield await self.agenerate(model, system_message, prompt, **kwargs)
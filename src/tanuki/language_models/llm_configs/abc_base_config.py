@@ -15,6 +15,11 @@ class BaseModelConfig(abc.ABC, BaseModel):
     system_message : Optional[str] -- the system message for the model
     instructions : Optional[str] -- the instructions for the model
     parsing_helper_tokens : Optional[dict] -- the parsing helper tokens for the model
+    requests_per_minute : Optional[int] -- the client-side limit of requests per minute to the model
+    tokens_per_minute : Optional[int] -- the client-side limit of prompt and generation tokens per minute to the model
+    input_token_cost : Optional[float] -- the price of 1000 prompt tokens in dollars, used for cost-aware routing
+    output_token_cost : Optional[float] -- the price of 1000 generated tokens in dollars, used for cost-aware routing
+    supports_structured_output : bool -- whether the model can be constrained to a JSON Schema by its provider
     """
     #model_config = ConfigDict(
     #        protected_namespaces=()
@@ -29,4 +34,9 @@ class BaseModelConfig(abc.ABC, BaseModel):
     system_message_token_count: int = -1
     instruction_token_count: int = -1
     parsing_helper_tokens: Optional[dict] = {"start_token": "", "end_token": ""}
-    base_model_for_sft: str = ""
\ No newline at end of file
+    base_model_for_sft: str = ""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    input_token_cost: Optional[float] = None
+    output_token_cost: Optional[float] = None
+    supports_structured_output: bool = False
\ No newline at end of file
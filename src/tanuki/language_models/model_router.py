@@ -0,0 +1,136 @@
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from tanuki.constants import ROUTING_POLICIES, LATENCY_ROUTING, DEFAULT_ROUTING_STATS_DECAY, \
+    DEFAULT_ROUTING_EXPLORATION_RATE
+from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
+
+
+class ModelStats(object):
+    """
+    The rolling statistics of a model, as exponentially weighted moving averages so that recent requests count most
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.output_token_count = 0.0
+
+    def update(self, decay: float, latency: Optional[float], error: bool, output_token_count: int = 0) -> None:
+        weight = max(decay, 1 / (self.samples + 1))
+        self.samples += 1
+        self.error_rate += weight * ((1.0 if error else 0.0) - self.error_rate)
+        if not error and latency is not None:
+            # failed requests say nothing about how long a generation takes
+            if self.latency == 0:
+                self.latency, self.output_token_count = latency, float(output_token_count)
+            else:
+                self.latency += decay * (latency - self.latency)
+                self.output_token_count += decay * (output_token_count - self.output_token_count)
+
+
+class ModelRouter(object):
+    """
+    Chooses which of the models an input fits in generates the output, according to the routing policy of the
+    function. The router keeps rolling latency, error rate and output length statistics per model:
+    - "latency" routes to the model with the lowest expected latency, counting the retries its error rate causes
+    - "cost" routes to the model with the lowest expected price of the request, from the token prices of the configs
+    Without a policy the first model that fits is used, in the order the models are configured in.
+    Models without statistics are tried first, and a small share of the requests go to a random model, so that the
+    statistics of the models which are not chosen stay current
+    """
+
+    def __init__(self,
+                 decay: float = DEFAULT_ROUTING_STATS_DECAY,
+                 exploration_rate: float = DEFAULT_ROUTING_EXPLORATION_RATE):
+        """
+        Args:
+            decay: The weight of the latest request in the rolling statistics
+            exploration_rate: The share of the requests routed to a random model
+        """
+        self.decay = decay
+        self.exploration_rate = exploration_rate
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(model: BaseModelConfig) -> Tuple[str, str]:
+        return model.provider, model.model_name
+
+    def get_stats(self, model: BaseModelConfig) -> Optional[ModelStats]:
+        """
+        Get the rolling statistics of the model, None if it has not been used yet
+        """
+        return self.stats.get(self._get_key(model))
+
+    def record(self,
+               model: BaseModelConfig,
+               latency: Optional[float] = None,
+               error: bool = False,
+               output_token_count: int = 0) -> None:
+        """
+        Record the outcome of a request to the model
+        Args:
+            model: The model the request was sent to
+            latency: How long the request took in seconds, for successful requests
+            error: Whether the request failed
+            output_token_count: The number of generated tokens, for successful requests
+        """
+        with self._lock:
+            stats = self.stats.setdefault(self._get_key(model), ModelStats())
+            stats.update(self.decay, latency, error, output_token_count)
+
+    def choose(self,
+               models: List[Tuple[BaseModelConfig, int]],
+               policy: Optional[str] = None,
+               generation_token_count: int = 0) -> Optional[BaseModelConfig]:
+        """
+        Choose a model to generate with
+        Args:
+            models: The models the input fits in with the input token counts, in the configured order
+            policy: The routing policy, "latency" or "cost", None for the first model
+            generation_token_count: The maximum number of generated tokens, used before the output lengths are known
+        Returns:
+            The chosen model, None if there are no models
+        """
+        if not models:
+            return None
+        if policy is None or len(models) == 1:
+            return models[0][0]
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy {policy}, the supported policies are {ROUTING_POLICIES}")
+        untried_models = [model for model, _ in models if self.get_stats(model) is None]
+        if policy == LATENCY_ROUTING and untried_models:
+            return untried_models[0]
+        if self.exploration_rate and random.random() < self.exploration_rate:
+            return random.choice(models)[0]
+        if policy == LATENCY_ROUTING:
+            scores = [self._get_expected_latency(model) for model, _ in models]
+        else:
+            scores = [self._get_expected_cost(model, input_token_count, generation_token_count)
+                      for model, input_token_count in models]
+        # ties keep the configured order
+        return models[scores.index(min(scores))][0]
+
+    def _get_expected_latency(self, model: BaseModelConfig) -> float:
+        stats = self.get_stats(model)
+        if stats.error_rate >= 1 or not stats.latency:
+            # none of the requests to the model have succeeded
+            return float("inf")
+        return stats.latency / (1 - stats.error_rate)
+
+    def _get_expected_cost(self, model: BaseModelConfig, input_token_count: int, generation_token_count: int) -> float:
+        if model.input_token_cost is None or model.output_token_cost is None:
+            # models without prices are only used when none of the models have prices
+            return float("inf")
+        stats = self.get_stats(model)
+        output_token_count = generation_token_count
+        error_rate = 0
+        if stats is not None:
+            error_rate = min(stats.error_rate, 0.99)
+            if stats.output_token_count:
+                output_token_count = stats.output_token_count
+        cost = (input_token_count * model.input_token_cost + output_token_count * model.output_token_cost) / 1000
+        return cost / (1 - error_rate)
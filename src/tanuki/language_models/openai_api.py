@@ -1,33 +1,46 @@
-from typing import List
+from typing import List, Optional
 
 import logging
-import time
 # import abstract base class
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from openai.types import CreateEmbeddingResponse
 from openai.types.fine_tuning import FineTuningJob
 
+from tanuki.json_schema import wrap_output_schema, is_strict_schema
 from tanuki.language_models.llm_finetune_api_abc import LLM_Finetune_API
 from tanuki.models.embedding import Embedding
 from tanuki.language_models.embedding_api_abc import Embedding_API
 from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.http_transport import HTTPTransport
+from tanuki.language_models.openai_compatible_api import OpenAICompatibleAPI
+from tanuki.language_models.retry_policy import RetryPolicy, CircuitBreaker
 import os
 from tanuki.constants import DEFAULT_DISTILLED_MODEL_NAME
 from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
 from tanuki.models.finetune_job import FinetuneJob
 import copy
 OPENAI_URL = "https://api.openai.com/v1/chat/completions"
-import requests
-LLM_GENERATION_PARAMETERS = ["temperature", "top_p", "max_new_tokens", "frequency_penalty", "presence_penalty"]
+LLM_GENERATION_PARAMETERS = ["temperature", "top_p", "max_new_tokens", "frequency_penalty", "presence_penalty",
+                             "response_schema"]
 
-class OpenAI_API(LLM_API, Embedding_API, LLM_Finetune_API):
-    def __init__(self) -> None:
+class OpenAI_API(OpenAICompatibleAPI, LLM_API, Embedding_API, LLM_Finetune_API):
+    provider_name = "OpenAI"
+    supports_structured_output = True
+
+    def __init__(self,
+                 transport: Optional[HTTPTransport] = None,
+                 retry_policy: Optional[RetryPolicy] = None) -> None:
         # initialise the abstract base class
         super().__init__()
 
         self.api_key = os.environ.get("OPENAI_API_KEY")
 
         self.client = None
+        self.async_client = None
+        # the pooled HTTP transport, shared between the providers created by the APIManager
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
 
     def embed(self, texts: List[str], model: OpenAIConfig, **kwargs) -> List[Embedding]:
         """
@@ -57,18 +70,42 @@ class OpenAI_API(LLM_API, Embedding_API, LLM_Finetune_API):
             print(f"An error occurred: {e}")
             return None
 
-    def generate(self, model, system_message, prompt, **kwargs):
-        """
-        The main generation function, given the args, kwargs, function_modeler, function description and model type, generate a response
-        Args
-            model (OpenAIConfig): The model to use for generation.
-            system_message (str): The system message to use for generation.
-            prompt (str): The prompt to use for generation.
-            kwargs (dict): Additional generation parameters.
+    async def aembed(self, texts: List[str], model: OpenAIConfig, **kwargs) -> List[Embedding]:
         """
+        Generate embeddings for the provided texts using the specified OpenAI model, without blocking the event loop.
 
+        :param texts: A list of texts to embed.
+        :param model: The model to use for embeddings.
+        :return: A list of embeddings.
+        """
         self.check_api_key()
+        if not self.async_client:
+            self.async_client = AsyncOpenAI(api_key=self.api_key)
+
+        try:
+            response: CreateEmbeddingResponse = await self.async_client.embeddings.create(
+                input=texts,
+                model=model.model_name,
+                **kwargs
+            )
+            assert response.object == "list"
+            assert len(response.data) == len(texts)
+            embeddings = []
+            for embedding_response in response.data:
+                assert embedding_response.object == "embedding"
+                embeddings.append(Embedding(embedding_response.embedding))
+            return embeddings
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return None
+
+    def _chat_completions_url(self):
+        return OPENAI_URL
 
+    def _create_generation_params(self, model, system_message, prompt, **kwargs):
+        """
+        Create the request body for a chat completion
+        """
         temperature = kwargs.get("temperature", 0.1)
         top_p = kwargs.get("top_p", 1)
         frequency_penalty = kwargs.get("frequency_penalty", 0)
@@ -101,37 +138,16 @@ class OpenAI_API(LLM_API, Embedding_API, LLM_Finetune_API):
             }
         ]
         params["messages"] = messages
-
-        counter = 0
-        choice = None
-        # initiate response so exception logic doesnt error out when checking for error in response
-        response = {}
-        while counter <= 5:
-            try:
-                openai_headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                }
-                response = requests.post(
-                    OPENAI_URL, headers=openai_headers, json=params, timeout=50
-                )
-                response = response.json()
-                choice = response["choices"][0]["message"]["content"].strip("'")
-                break
-            except Exception as e:
-                if ("error" in response and
-                        "code" in response["error"] and
-                        response["error"]["code"] == 'invalid_api_key'):
-                    raise Exception(f"The supplied OpenAI API key {self.api_key} is invalid")
-                if counter == 5:
-                    raise Exception(f"OpenAI API failed to generate a response: {e}")
-                counter += 1
-                time.sleep(2 ** counter)
-                continue
-
-        if not choice:
-            raise Exception("OpenAI API failed to generate a response")
-        
+        response_schema = kwargs.get("response_schema")
+        if response_schema is not None:
+            # constrain the generation to the output schema, strict mode only supports a subset of JSON Schema
+            params["response_format"] = {"type": "json_schema",
+                                         "json_schema": {"name": "function_output",
+                                                         "schema": wrap_output_schema(response_schema),
+                                                         "strict": is_strict_schema(response_schema)}}
+        return params
+
+    def _remove_parsing_helper_tokens(self, model, choice):
         if model.parsing_helper_tokens["end_token"]:
             # remove the end token from the choice
             choice = choice.split(model.parsing_helper_tokens["end_token"])[0]
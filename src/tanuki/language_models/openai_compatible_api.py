@@ -0,0 +1,171 @@
+from tanuki.language_models.token_estimator import record_token_usage
+from tanuki.language_models.streaming import iter_sse_data, aiter_sse_data, parse_chat_completion_chunk
+from tanuki.language_models.retry_policy import RetryableError, FatalRequestError, raise_for_retryable_status
+
+
+class OpenAICompatibleAPI(object):
+    """
+    The generation and streaming of providers that serve an OpenAI compatible chat completions endpoint. Providers
+    set the provider_name, give the endpoint in _chat_completions_url and build the request body in
+    _create_generation_params
+    """
+    provider_name = "OpenAI"
+
+    def _chat_completions_url(self) -> str:
+        raise NotImplementedError
+
+    def _create_generation_params(self, model, system_message, prompt, **kwargs) -> dict:
+        raise NotImplementedError
+
+    def _remove_parsing_helper_tokens(self, model, choice):
+        raise NotImplementedError
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        """
+        The main generation function, given the args, kwargs, function_modeler, function description and model type, generate a response
+        Args
+            model (BaseModelConfig): The model to use for generation.
+            system_message (str): The system message to use for generation.
+            prompt (str): The prompt to use for generation.
+            kwargs (dict): Additional generation parameters.
+        """
+
+        self.check_api_key()
+        params = self._create_generation_params(model, system_message, prompt, **kwargs)
+
+        def send():
+            response = self.transport.post(self._chat_completions_url(), headers=self._get_headers(), json=params)
+            return self._parse_generation_response(response, model, system_message, prompt)
+
+        choice = self.retry_policy.call(send, self.circuit_breaker, self.provider_name)
+
+        return self._remove_parsing_helper_tokens(model, choice)
+
+    async def agenerate(self, model, system_message, prompt, **kwargs):
+        """
+        The asynchronous generation function, which uses a non-blocking HTTP client so many generations can be
+        in flight on one event loop
+        Args
+            model (BaseModelConfig): The model to use for generation.
+            system_message (str): The system message to use for generation.
+            prompt (str): The prompt to use for generation.
+            kwargs (dict): Additional generation parameters.
+        """
+
+        self.check_api_key()
+        params = self._create_generation_params(model, system_message, prompt, **kwargs)
+
+        async def send():
+            response = await self.transport.apost(self._chat_completions_url(), headers=self._get_headers(), json=params)
+            return self._parse_generation_response(response, model, system_message, prompt)
+
+        choice = await self.retry_policy.acall(send, self.circuit_breaker, self.provider_name)
+
+        return self._remove_parsing_helper_tokens(model, choice)
+
+    def stream(self, model, system_message, prompt, **kwargs):
+        """
+        Stream the generated text in chunks as it is generated. Closing the generator closes the connection, which
+        stops the generation
+        Args
+            model: The model to use for generation.
+            system_message (str): The system message to use for generation.
+            prompt (str): The prompt to use for generation.
+            kwargs (dict): Additional generation parameters.
+        """
+
+        self.check_api_key()
+        params = self._create_generation_params(model, system_message, prompt, **kwargs)
+        params["stream"] = True
+
+        def send():
+            response = self.transport.open_stream(self._chat_completions_url(), headers=self._get_headers(), json=params)
+            if response.status_code != 200:
+                response.read()
+                response.close()
+                self._raise_stream_error(response)
+            return response
+
+        response = self.retry_policy.call(send, self.circuit_breaker, self.provider_name)
+        try:
+            for data in iter_sse_data(response.iter_lines()):
+                chunk = parse_chat_completion_chunk(data)
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
+    async def astream(self, model, system_message, prompt, **kwargs):
+        """
+        Stream the generated text in chunks without blocking the event loop, see stream
+        """
+
+        self.check_api_key()
+        params = self._create_generation_params(model, system_message, prompt, **kwargs)
+        params["stream"] = True
+
+        async def send():
+            response = await self.transport.aopen_stream(self._chat_completions_url(), headers=self._get_headers(), json=params)
+            if response.status_code != 200:
+                await response.aread()
+                await response.aclose()
+                self._raise_stream_error(response)
+            return response
+
+        response = await self.retry_policy.acall(send, self.circuit_breaker, self.provider_name)
+        try:
+            async for data in aiter_sse_data(response.aiter_lines()):
+                chunk = parse_chat_completion_chunk(data)
+                if chunk:
+                    yield chunk
+        finally:
+            await response.aclose()
+
+    def _raise_stream_error(self, response):
+        """
+        Raise the error of a rejected streamed request, a RetryableError for transient failures and a
+        FatalRequestError otherwise
+        """
+        raise_for_retryable_status(response)
+        try:
+            response_json = response.json()
+        except ValueError:
+            response_json = {}
+        error = response_json.get("error") if isinstance(response_json, dict) else None
+        self._raise_error(error or response.status_code)
+
+    def _parse_generation_response(self, response, model, system_message, prompt):
+        """
+        Get the generated text from the response, raising a RetryableError for transient failures and a
+        FatalRequestError for failures that retrying will not fix. The reported prompt token usage is fed to the
+        token estimator
+        """
+        raise_for_retryable_status(response)
+        try:
+            response_json = response.json()
+        except ValueError:
+            raise RetryableError(f"{self.provider_name} API returned a malformed response")
+        if "error" in response_json:
+            self._raise_error(response_json["error"])
+        try:
+            choice = response_json["choices"][0]["message"]["content"].strip("'")
+        except (KeyError, IndexError, TypeError):
+            raise RetryableError(f"{self.provider_name} API returned a malformed response")
+        if not choice:
+            raise FatalRequestError(f"{self.provider_name} API failed to generate a response")
+        record_token_usage(model.model_name, f"{system_message}\n{prompt}", response_json.get("usage"))
+        return choice
+
+    def _raise_error(self, error):
+        """
+        Raise a FatalRequestError for an error returned by the endpoint
+        """
+        if isinstance(error, dict) and error.get("code") == 'invalid_api_key':
+            raise FatalRequestError(f"The supplied {self.provider_name} API key {self.api_key} is invalid")
+        raise FatalRequestError(f"{self.provider_name} API failed to generate a response: {error}")
+
+    def _get_headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
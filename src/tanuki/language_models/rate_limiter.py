@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
+
+
+class TokenBucket(object):
+    """
+    A token bucket refilling `limit` tokens per minute, up to a burst of `limit` tokens.
+    Callers reserve tokens up front and the bucket may go into debt, so concurrent callers queue up in order
+    of arrival and each one waits until its own reservation is covered.
+    """
+
+    def __init__(self, limit: int):
+        self.capacity = float(limit)
+        self.refill_rate = limit / 60
+        self.tokens = float(limit)
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Reserve the tokens, returning how long the caller needs to wait (in seconds) before using them
+        """
+        # a request larger than the bucket could never be served, so it waits for at most a full bucket
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+            self.last_refill = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.refill_rate
+
+
+class RateLimiter(object):
+    """
+    Client-side requests-per-minute and tokens-per-minute limits, keyed by provider and model name.
+    Requests are delayed until they fit in the limits, instead of being sent and rejected by the provider.
+    """
+
+    def __init__(self):
+        self.limits: Dict[Tuple[str, str], Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+
+    def set_limits(self,
+                   provider: str,
+                   model_name: str,
+                   requests_per_minute: Optional[int] = None,
+                   tokens_per_minute: Optional[int] = None) -> None:
+        """
+        Set the limits of a model, overriding the limits of the model config
+        """
+        with self._lock:
+            self.limits[(provider, model_name)] = (TokenBucket(requests_per_minute) if requests_per_minute else None,
+                                                   TokenBucket(tokens_per_minute) if tokens_per_minute else None)
+
+    def _get_buckets(self, model: BaseModelConfig) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        key = (model.provider, model.model_name)
+        if key not in self.limits:
+            with self._lock:
+                if key not in self.limits:
+                    requests_per_minute = model.requests_per_minute
+                    tokens_per_minute = model.tokens_per_minute
+                    self.limits[key] = (TokenBucket(requests_per_minute) if requests_per_minute else None,
+                                        TokenBucket(tokens_per_minute) if tokens_per_minute else None)
+        return self.limits[key]
+
+    def is_limited(self, model: BaseModelConfig) -> bool:
+        """
+        Whether there are any limits for the model
+        """
+        request_bucket, token_bucket = self._get_buckets(model)
+        return request_bucket is not None or token_bucket is not None
+
+    def reserve(self, model: BaseModelConfig, token_count: int) -> float:
+        """
+        Reserve a request of token_count tokens, returning how long to wait (in seconds) before sending it
+        """
+        request_bucket, token_bucket = self._get_buckets(model)
+        wait = 0
+        if request_bucket:
+            wait = max(wait, request_bucket.reserve(1))
+        if token_bucket:
+            wait = max(wait, token_bucket.reserve(token_count))
+        return wait
+
+    def acquire(self, model: BaseModelConfig, token_count: int) -> None:
+        """
+        Wait until a request of token_count tokens to the model fits in the limits
+        """
+        wait = self.reserve(model, token_count)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, model: BaseModelConfig, token_count: int) -> None:
+        """
+        Wait until a request of token_count tokens to the model fits in the limits, without blocking the event loop
+        """
+        wait = self.reserve(model, token_count)
+        if wait > 0:
+            await asyncio.sleep(wait)
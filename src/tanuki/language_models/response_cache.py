@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from tanuki.constants import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL, DEFAULT_CACHE_DISK_SIZE, CACHE_DISK_PRUNE_RATIO
+from tanuki.utils import json_dumps
+
+VERSION_FILE = "model_version"
+
+
+class ResponseCache(object):
+    """
+    An exact-match cache of validated model responses.
+    The entries are kept in an in-process LRU with size and TTL eviction, and optionally in an on-disk tier
+    (one file per entry, grouped by function hash) so that the cache survives restarts. Once the on-disk tier is
+    full, its expired and then its oldest entries are deleted.
+    The cache is versioned per function by the distilled model, when that changes (i.e. after a finetune) all
+    the entries of the function are dropped.
+    """
+
+    def __init__(self,
+                 max_size: int = DEFAULT_CACHE_SIZE,
+                 ttl: Optional[float] = DEFAULT_CACHE_TTL,
+                 directory: Optional[str] = None,
+                 max_disk_size: int = DEFAULT_CACHE_DISK_SIZE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        # the number of entries in the on-disk tier, counted when the first entry is written
+        self._disk_size: Optional[int] = None
+        self.entries: OrderedDict = OrderedDict()
+        self.model_versions = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def get_key(func_hash: str, args: tuple, kwargs: dict, llm_parameters: dict) -> str:
+        """
+        Get the cache key for a call. The args and kwargs are canonicalised the same way they are rendered in the
+        prompt, with the kwargs sorted by name. The models are not part of the key, the entries are versioned by them
+        """
+        canonical_kwargs = [[name, repr(value)] for name, value in sorted(kwargs.items())]
+        canonical_call = json_dumps([func_hash, repr(tuple(args)), canonical_kwargs, llm_parameters])
+        return hashlib.md5(canonical_call.encode("utf-8")).hexdigest()
+
+    def get(self, func_hash: str, key: str) -> Optional[str]:
+        """
+        Get the cached response for the key, or None if there is no fresh entry
+        """
+        with self._lock:
+            entry = self.entries.get((func_hash, key))
+            if entry is not None:
+                if not self._is_expired(entry[0]):
+                    self.entries.move_to_end((func_hash, key))
+                    return entry[1]
+                del self.entries[(func_hash, key)]
+
+        entry = self._read_entry(func_hash, key)
+        if entry is None:
+            return None
+        if self._is_expired(entry[0]):
+            self._remove_entry(func_hash, key)
+            return None
+        self._add_to_memory(func_hash, key, entry)
+        return entry[1]
+
+    def set(self, func_hash: str, key: str, response: str) -> None:
+        """
+        Cache the response for the key
+        """
+        entry = (time.time(), response)
+        self._add_to_memory(func_hash, key, entry)
+        self._write_entry(func_hash, key, entry)
+
+    def set_model_version(self, func_hash: str, model_version: str) -> None:
+        """
+        Set the model version of the function, dropping all of its entries if the version has changed
+        """
+        with self._lock:
+            if self.model_versions.get(func_hash) == model_version:
+                return
+            previous_version = self.model_versions.get(func_hash, self._read_model_version(func_hash))
+            self.model_versions[func_hash] = model_version
+            if previous_version is not None and previous_version != model_version:
+                logging.info(f"Model changed from {previous_version} to {model_version}, invalidating cached responses")
+                self.invalidate(func_hash)
+            self._write_model_version(func_hash, model_version)
+
+    def invalidate(self, func_hash: str) -> None:
+        """
+        Drop all the cached entries of a function
+        """
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self.entries if cache_key[0] == func_hash]:
+                del self.entries[cache_key]
+        if self.directory:
+            shutil.rmtree(os.path.join(self.directory, func_hash), ignore_errors=True)
+            with self._lock:
+                # recounted when the next entry is written
+                self._disk_size = None
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _add_to_memory(self, func_hash: str, key: str, entry: Tuple[float, str]) -> None:
+        with self._lock:
+            self.entries[(func_hash, key)] = entry
+            self.entries.move_to_end((func_hash, key))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def _get_entry_path(self, func_hash: str, key: str) -> str:
+        return os.path.join(self.directory, func_hash, key + ".json")
+
+    def _read_entry(self, func_hash: str, key: str) -> Optional[Tuple[float, str]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._get_entry_path(func_hash, key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry["created"], entry["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_entry(self, func_hash: str, key: str, entry: Tuple[float, str]) -> None:
+        if not self.directory:
+            return
+        path = self._get_entry_path(func_hash, key)
+        is_new_entry = not os.path.exists(path)
+        self._write_atomic(path, json.dumps({"created": entry[0], "response": entry[1]}))
+        if is_new_entry:
+            self._add_to_disk_size()
+
+    def _add_to_disk_size(self) -> None:
+        """
+        Count a new entry of the on-disk tier, pruning the tier if it is full
+        """
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = len(self._list_disk_entries())
+            else:
+                self._disk_size += 1
+            if self._disk_size > self.max_disk_size:
+                self._prune_disk()
+
+    def _list_disk_entries(self) -> List[Tuple[float, str]]:
+        """
+        Get the modification time and the path of every entry of the on-disk tier, the entries of other processes
+        included
+        """
+        entries = []
+        try:
+            function_directories = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return entries
+        for function_directory in function_directories:
+            try:
+                for entry in os.scandir(function_directory):
+                    if entry.name.endswith(".json"):
+                        entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    def _prune_disk(self) -> None:
+        """
+        Delete the expired entries of the on-disk tier, and then the oldest ones until it is below the prune ratio
+        of its maximum size, so that it is not pruned on every write
+        """
+        entries = sorted(self._list_disk_entries())
+        target_size = int(self.max_disk_size * CACHE_DISK_PRUNE_RATIO)
+        removed = 0
+        for modified, path in entries:
+            if len(entries) - removed <= target_size and not self._is_expired(modified):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            removed += 1
+        self._disk_size = len(entries) - removed
+
+    def _remove_entry(self, func_hash: str, key: str) -> None:
+        with self._lock:
+            self.entries.pop((func_hash, key), None)
+        if self.directory:
+            try:
+                os.remove(self._get_entry_path(func_hash, key))
+            except OSError:
+                pass
+
+    def _read_model_version(self, func_hash: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, func_hash, VERSION_FILE), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_model_version(self, func_hash: str, model_version: str) -> None:
+        if not self.directory:
+            return
+        self._write_atomic(os.path.join(self.directory, func_hash, VERSION_FILE), model_version)
+
+    def _write_atomic(self, path: str, data: str) -> None:
+        """
+        Write the file through a temporary file, so that concurrent readers never see a partial entry
+        """
+        try:
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write to the response cache: {e}")
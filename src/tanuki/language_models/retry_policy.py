@@ -0,0 +1,263 @@
+import asyncio
+import contextlib
+import email.utils
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import httpx
+import requests
+
+from tanuki.constants import DEFAULT_MAX_RETRIES, DEFAULT_RETRY_BASE_DELAY, DEFAULT_RETRY_MAX_DELAY, \
+    DEFAULT_MAX_RETRY_AFTER, DEFAULT_CIRCUIT_FAILURE_THRESHOLD, DEFAULT_CIRCUIT_RESET_TIMEOUT
+
+# status codes that signal a transient problem on the side of the provider
+RETRYABLE_STATUS_CODES = (408, 409, 425, 429, 500, 502, 503, 504)
+
+# the retry limit of the requests sent from the current thread or task, while failing over to other providers
+_retry_limit: ContextVar[Optional[int]] = ContextVar("retry_limit", default=None)
+
+
+class RetryableError(Exception):
+    """
+    A transient request failure, which is worth retrying (possibly after the delay the server asked for)
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FatalRequestError(Exception):
+    """
+    A request failure which will not be fixed by retrying, e.g. an invalid API key or a malformed request
+    """
+
+
+class ProviderUnavailableError(Exception):
+    """
+    Raised when a provider can not serve requests, i.e. the transient failures persisted through the retries
+    """
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """
+    Raised instead of sending a request while the circuit breaker of the provider is open
+    """
+
+
+@contextlib.contextmanager
+def limit_retries(max_retries: int) -> Iterator[None]:
+    """
+    Limit the retries of the requests sent within the context, so that a failing provider is given up on quickly
+    when there is another provider to fail over to
+    """
+    token = _retry_limit.set(max_retries)
+    try:
+        yield
+    finally:
+        _retry_limit.reset(token)
+
+
+def is_provider_unavailable(error: Exception) -> bool:
+    """
+    Whether the error means the provider is unavailable, so the request can be failed over to another provider
+    """
+    return isinstance(error, ProviderUnavailableError) or is_retryable_error(error)
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Get the delay in seconds the server asked for from the Retry-After (seconds or HTTP date) or retry-after-ms headers
+    """
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return max(float(retry_after_ms) / 1000, 0)
+        retry_after = headers.get("retry-after")
+        if retry_after is None:
+            return None
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            retry_date = email.utils.parsedate_to_datetime(retry_after)
+            return max(retry_date.timestamp() - time.time(), 0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def raise_for_retryable_status(response) -> None:
+    """
+    Raise a RetryableError, including the server retry hints, if the HTTP response has a retryable status code
+    """
+    status_code = getattr(response, "status_code", None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        raise RetryableError(f"The server responded with status code {status_code}",
+                             retry_after=parse_retry_after(getattr(response, "headers", None)))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Whether the error is a transient failure, i.e. a retryable response or a connection problem
+    """
+    return isinstance(error, (RetryableError,
+                              requests.ConnectionError,
+                              requests.Timeout,
+                              httpx.TransportError,
+                              ConnectionError,
+                              TimeoutError))
+
+
+class CircuitBreaker(object):
+    """
+    A circuit breaker for a provider endpoint.
+    After `failure_threshold` consecutive transient failures the circuit opens and requests fail fast. After
+    `reset_timeout` seconds a single trial request is let through, which closes the circuit again if it succeeds.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        """
+        Whether a request can be sent, letting a single trial request through once the reset timeout has passed
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_flight or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class RetryPolicy(object):
+    """
+    The retry policy shared by the API providers.
+    Transient failures are retried with full-jitter exponential backoff (or after the delay the server asked for),
+    while fatal errors are raised straight away.
+    """
+
+    def __init__(self,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+                 max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+                 max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+                 is_retryable: Callable[[Exception], bool] = is_retryable_error):
+        """
+        Args:
+            max_retries: The maximum number of retries after the first attempt
+            base_delay: The backoff delay cap of the first retry, in seconds
+            max_delay: The maximum backoff delay cap, in seconds
+            max_retry_after: The maximum delay honored from the server retry hints, in seconds
+            is_retryable: The function deciding whether an error is transient
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.is_retryable = is_retryable
+
+    def get_delay(self, retry_index: int, retry_after: Optional[float] = None) -> float:
+        """
+        Get the delay before a retry. Without a server hint this is full jitter, a random delay up to the
+        exponentially growing cap, so that retries from many workers are spread out
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry_index))
+
+    def call(self, send: Callable[[], Any], circuit_breaker: Optional[CircuitBreaker], name: str) -> Any:
+        """
+        Call send until it succeeds, a fatal error is raised or the retries run out
+        Args:
+            send: The function sending the request and returning the result
+            circuit_breaker: The circuit breaker of the provider
+            name: The name of the provider, used in the error messages
+        Returns:
+            The result of send
+        """
+        retry_index = 0
+        while True:
+            self._check_circuit(circuit_breaker, name)
+            try:
+                result = send()
+            except Exception as e:
+                delay = self._handle_error(e, retry_index, circuit_breaker, name)
+                retry_index += 1
+                time.sleep(delay)
+                continue
+            if circuit_breaker:
+                circuit_breaker.record_success()
+            return result
+
+    async def acall(self, send: Callable[[], Awaitable[Any]], circuit_breaker: Optional[CircuitBreaker], name: str) -> Any:
+        """
+        The asynchronous counterpart of call, the backoff delays are awaited
+        """
+        retry_index = 0
+        while True:
+            self._check_circuit(circuit_breaker, name)
+            try:
+                result = await send()
+            except Exception as e:
+                delay = self._handle_error(e, retry_index, circuit_breaker, name)
+                retry_index += 1
+                await asyncio.sleep(delay)
+                continue
+            if circuit_breaker:
+                circuit_breaker.record_success()
+            return result
+
+    def _check_circuit(self, circuit_breaker: Optional[CircuitBreaker], name: str) -> None:
+        if circuit_breaker and not circuit_breaker.allow_request():
+            raise CircuitOpenError(f"{name} API is unavailable after repeated failures, "
+                                   f"retrying in at most {circuit_breaker.reset_timeout} seconds")
+
+    def _handle_error(self, error: Exception, retry_index: int, circuit_breaker: Optional[CircuitBreaker], name: str) -> float:
+        """
+        Raise the error if it is fatal or the retries have run out, otherwise return the delay before the next retry
+        """
+        if not self.is_retryable(error):
+            # the endpoint is up, the request itself failed
+            if circuit_breaker:
+                circuit_breaker.record_success()
+            raise error
+        if circuit_breaker:
+            circuit_breaker.record_failure()
+        retry_limit = _retry_limit.get()
+        max_retries = self.max_retries if retry_limit is None else min(self.max_retries, retry_limit)
+        if retry_index >= max_retries:
+            raise ProviderUnavailableError(f"{name} API failed to generate a response: {error}") from error
+        delay = self.get_delay(retry_index, getattr(error, "retry_after", None))
+        logging.info(f"{name} API request failed ({error}), retrying in {delay:.2f} seconds")
+        return delay
@@ -0,0 +1,115 @@
+import json
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
+from tanuki.language_models.retry_policy import FatalRequestError, RetryableError
+from tanuki.validator import Validator
+
+SSE_DATA_PREFIX = "data:"
+SSE_DONE = "[DONE]"
+
+
+def iter_sse_data(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Get the data payloads of a server-sent event stream, until the [DONE] event
+    """
+    for line in lines:
+        if not line.startswith(SSE_DATA_PREFIX):
+            continue
+        data = line[len(SSE_DATA_PREFIX):].strip()
+        if data == SSE_DONE:
+            return
+        yield data
+
+
+async def aiter_sse_data(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Get the data payloads of a server-sent event stream without blocking the event loop, see iter_sse_data
+    """
+    async for line in lines:
+        if not line.startswith(SSE_DATA_PREFIX):
+            continue
+        data = line[len(SSE_DATA_PREFIX):].strip()
+        if data == SSE_DONE:
+            return
+        yield data
+
+
+def parse_chat_completion_chunk(data: str) -> str:
+    """
+    Get the generated text of a streamed chat completion chunk
+    """
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        raise RetryableError("The streamed response was malformed")
+    if "error" in chunk:
+        raise FatalRequestError(f"The streamed generation failed: {chunk['error']}")
+    try:
+        return chunk["choices"][0]["delta"].get("content") or ""
+    except (KeyError, IndexError, TypeError, AttributeError):
+        # chunks without choices (e.g. usage chunks) carry no text
+        return ""
+
+
+class StreamCollector(object):
+    """
+    Accumulates a streamed generation and tells the caller when to stop reading it: as soon as the end token of the
+    model appears, or when the output so far can no longer be valid for the output type of the function
+    """
+
+    def __init__(self,
+                 model: BaseModelConfig,
+                 output_type_hint=None,
+                 validator: Optional[Validator] = None):
+        self.model = model
+        self.output_type_hint = output_type_hint
+        self.validator = validator
+        self.text = ""
+        self.finished = False
+        self.aborted = False
+        self._end_token_search_start = 0
+
+    def add(self, chunk: str) -> bool:
+        """
+        Add a streamed chunk, returning whether the stream can be stopped
+        """
+        self.text += chunk
+        end_token = self.model.parsing_helper_tokens["end_token"]
+        if end_token:
+            if self.text.find(end_token, self._end_token_search_start) >= 0:
+                self.finished = True
+                return True
+            # the end token may be split over chunks
+            self._end_token_search_start = max(0, len(self.text) - len(end_token) + 1)
+        if self.validator is not None and not self._may_be_valid():
+            self.aborted = True
+            return True
+        return False
+
+    def _may_be_valid(self) -> bool:
+        start_token = self.model.parsing_helper_tokens["start_token"]
+        output = self.text.strip("'")
+        if start_token:
+            if start_token in output:
+                output = output.split(start_token)[-1]
+            elif start_token.startswith(output.lstrip()):
+                # the start token is still being streamed
+                return True
+        return self.validator.check_prefix(output, self.output_type_hint)
+
+    def get_choice(self) -> str:
+        """
+        Get the generated output without the parsing helper tokens, the same way the providers do for full responses
+        """
+        choice = self.text.strip("'")
+        start_token = self.model.parsing_helper_tokens["start_token"]
+        end_token = self.model.parsing_helper_tokens["end_token"]
+        if end_token:
+            # remove the end token from the choice
+            choice = choice.split(end_token)[0]
+            # check if starting token is in choice
+            if start_token and start_token in choice:
+                # remove the starting token from the choice
+                choice = choice.split(start_token)[-1]
+        return choice
@@ -1,21 +1,31 @@
+import asyncio
 import logging
-import time
 # import abstract base class
 from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.http_transport import HTTPTransport
+from tanuki.language_models.token_estimator import record_token_usage
+from tanuki.language_models.retry_policy import RetryPolicy, CircuitBreaker, RetryableError, FatalRequestError, \
+    raise_for_retryable_status
 import os
+from typing import Optional
 import together
 
 TOGETHER_AI_URL = "https://api.together.xyz/inference"
-import requests
 LLM_GENERATION_PARAMETERS = ["temperature", "top_p", "max_new_tokens", "frequency_penalty", "presence_penalty"]
 
 class TogetherAI_API(LLM_API):
-    def __init__(self) -> None:
+    def __init__(self,
+                 transport: Optional[HTTPTransport] = None,
+                 retry_policy: Optional[RetryPolicy] = None) -> None:
         # initialise the abstract base class
         super().__init__()
 
         self.api_key = os.environ.get("TOGETHER_API_KEY")
         self.model_configs = {}
+        # the pooled HTTP transport, shared between the providers created by the APIManager
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = CircuitBreaker()
 
 
     def generate(self, model, system_message, prompt, **kwargs):
@@ -31,6 +41,72 @@ class TogetherAI_API(LLM_API):
         self.check_api_key()
         if model.model_name not in self.model_configs:
             self.model_configs[model.model_name] = together.Models.info(model.model_name)['config']
+        params = self._create_generation_params(model, system_message, prompt, **kwargs)
+
+        def send():
+            response = self.transport.post(TOGETHER_AI_URL, headers=self._get_headers(), json=params)
+            return self._parse_generation_response(response, model, params["prompt"])
+
+        choice = self.retry_policy.call(send, self.circuit_breaker, "Together AI")
+
+        return self._remove_parsing_helper_tokens(model, choice)
+
+    async def agenerate(self, model, system_message, prompt, **kwargs):
+        """
+        The asynchronous generation function, which uses a non-blocking HTTP client so many generations can be
+        in flight on one event loop
+        Args
+            model (OpenAIConfig): The model to use for generation.
+            system_message (str): The system message to use for generation.
+            prompt (str): The prompt to use for generation.
+            kwargs (dict): Additional generation parameters.
+        """
+
+        self.check_api_key()
+        if model.model_name not in self.model_configs:
+            # the together client is blocking, so fetch the model info off the event loop
+            loop = asyncio.get_running_loop()
+            model_info = await loop.run_in_executor(None, together.Models.info, model.model_name)
+            self.model_configs[model.model_name] = model_info['config']
+        params = self._create_generation_params(model, system_message, prompt, **kwargs)
+
+        async def send():
+            response = await self.transport.apost(TOGETHER_AI_URL, headers=self._get_headers(), json=params)
+            return self._parse_generation_response(response, model, params["prompt"])
+
+        choice = await self.retry_policy.acall(send, self.circuit_breaker, "Together AI")
+
+        return self._remove_parsing_helper_tokens(model, choice)
+
+    def _parse_generation_response(self, response, model, final_prompt):
+        """
+        Get the generated text from the response, raising a RetryableError for transient failures and a
+        FatalRequestError for failures that retrying will not fix. The reported prompt token usage is fed to the
+        token estimator together with the chat templated prompt that was sent
+        """
+        raise_for_retryable_status(response)
+        try:
+            response_json = response.json()
+        except ValueError:
+            raise RetryableError("Together AI API returned a malformed response")
+        if "error" in response_json:
+            error = response_json["error"]
+            if isinstance(error, dict) and error.get("code") == 'invalid_api_key':
+                raise FatalRequestError(f"The supplied Together AI API key {self.api_key} is invalid")
+            raise FatalRequestError(f"Together AI API failed to generate a response: {error}")
+        try:
+            choice = response_json["output"]["choices"][0]["text"].strip("'")
+        except (KeyError, IndexError, TypeError):
+            raise RetryableError("Together AI API returned a malformed response")
+        if not choice:
+            raise FatalRequestError("Together AI API failed to generate a response")
+        record_token_usage(model.model_name, final_prompt, response_json.get("usage") or response_json["output"].get("usage"))
+        return choice
+
+    def _create_generation_params(self, model, system_message, prompt, **kwargs):
+        """
+        Create the request body for a completion, including the chat template of the model
+        """
         temperature = kwargs.get("temperature", 0.1)
         top_p = kwargs.get("top_p", 1)
         frequency_penalty = kwargs.get("frequency_penalty", 0)
@@ -69,37 +145,15 @@ class TogetherAI_API(LLM_API):
         if model.parsing_helper_tokens["start_token"]:
             final_prompt += model.parsing_helper_tokens["start_token"]
         params["prompt"] = final_prompt
+        return params
 
-        counter = 0
-        choice = None
-        # initiate response so exception logic doesnt error out when checking for error in response
-        response = {}
-        while counter <= 5:
-            try:
-                openai_headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                }
-                response = requests.post(
-                    TOGETHER_AI_URL, headers=openai_headers, json=params, timeout=50
-                )
-                response = response.json()
-                choice = response["output"]["choices"][0]["text"].strip("'")
-                break
-            except Exception as e:
-                if ("error" in response and
-                        "code" in response["error"] and
-                        response["error"]["code"] == 'invalid_api_key'):
-                    raise Exception(f"The supplied Together AI API key {self.api_key} is invalid")
-                if counter == 5:
-                    raise Exception(f"Together AI API failed to generate a response: {e}")
-                counter += 1
-                time.sleep(2 ** counter)
-                continue
+    def _get_headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
 
-        if not choice:
-            raise Exception("TogetherAI API failed to generate a response")
-        
+    def _remove_parsing_helper_tokens(self, model, choice):
         if model.parsing_helper_tokens["end_token"]:
             # remove the end token from the choice
             choice = choice.split(model.parsing_helper_tokens["end_token"])[0]
@@ -0,0 +1,99 @@
+import math
+import threading
+from typing import Dict, Optional, Union
+
+from tanuki.constants import MIN_TOKEN_CALIBRATION_SAMPLES, MAX_TOKEN_CALIBRATION_FACTOR
+from tanuki.utils import approximate_token_count
+
+
+class TokenEstimator(object):
+    """
+    Estimates the token counts of prompts.
+    The raw count is the approximate_token_count heuristic, subclasses can override `count` to plug in a real
+    tokenizer. The estimator can calibrate itself per model, by regressing its estimates against the prompt token
+    counts the providers report in their responses.
+    """
+
+    def __init__(self,
+                 min_calibration_samples: int = MIN_TOKEN_CALIBRATION_SAMPLES,
+                 max_calibration_factor: float = MAX_TOKEN_CALIBRATION_FACTOR):
+        """
+        Args:
+            min_calibration_samples: The number of usage reports needed before the calibration of a model is applied
+            max_calibration_factor: The maximum factor the estimates can be scaled up or down by
+        """
+        self.min_calibration_samples = min_calibration_samples
+        self.max_calibration_factor = max_calibration_factor
+        # the running sums of the least squares fit actual = factor * estimated, per model
+        self.calibration_stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, content: Union[str, bytes]) -> int:
+        """
+        Get the raw (uncalibrated) token count of the content
+        """
+        return approximate_token_count(content)
+
+    def estimate(self, content: Union[str, bytes], model_name: Optional[str] = None) -> int:
+        """
+        Get the token count of the content, calibrated for the model if there is enough usage data
+        """
+        return self.adjust(self.count(content), model_name)
+
+    def adjust(self, token_count: int, model_name: Optional[str] = None) -> int:
+        """
+        Calibrate a raw token count for the model. Uncalibrated counts are returned unchanged
+        """
+        factor = self.get_calibration_factor(model_name)
+        if factor == 1:
+            return token_count
+        return int(math.ceil(token_count * factor))
+
+    def get_calibration_factor(self, model_name: Optional[str]) -> float:
+        """
+        Get the factor the raw estimates of the model are scaled by, 1 if the model is not calibrated yet
+        """
+        stats = self.calibration_stats.get(model_name) if model_name else None
+        if not stats or stats["samples"] < self.min_calibration_samples or stats["estimated_squared"] == 0:
+            return 1
+        factor = stats["product"] / stats["estimated_squared"]
+        return min(max(factor, 1 / self.max_calibration_factor), self.max_calibration_factor)
+
+    def record_usage(self, model_name: str, content: Union[str, bytes], actual_token_count: int) -> None:
+        """
+        Record the token count the provider reported for the content sent to the model
+        """
+        estimated_token_count = self.count(content)
+        if not model_name or estimated_token_count <= 0 or actual_token_count <= 0:
+            return
+        with self._lock:
+            stats = self.calibration_stats.setdefault(model_name, {"samples": 0, "product": 0, "estimated_squared": 0})
+            stats["samples"] += 1
+            stats["product"] += estimated_token_count * actual_token_count
+            stats["estimated_squared"] += estimated_token_count ** 2
+
+
+_token_estimator = TokenEstimator()
+
+
+def get_token_estimator() -> TokenEstimator:
+    """
+    Get the token estimator used by the language model manager and fed by the providers
+    """
+    return _token_estimator
+
+
+def set_token_estimator(token_estimator: TokenEstimator) -> None:
+    """
+    Replace the token estimator, e.g. with one that counts with the tokenizer of the models
+    """
+    global _token_estimator
+    _token_estimator = token_estimator
+
+
+def record_token_usage(model_name: str, content: str, usage: Optional[dict]) -> None:
+    """
+    Feed the prompt token count from the usage section of a provider response to the token estimator
+    """
+    if isinstance(usage, dict) and isinstance(usage.get("prompt_tokens"), int):
+        get_token_estimator().record_usage(model_name, content, usage["prompt_tokens"])
@@ -1,5 +1,5 @@
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from tanuki.constants import OPENAI_PROVIDER, LLAMA_BEDROCK_PROVIDER, TITAN_BEDROCK_PROVIDER, TOGETHER_AI_PROVIDER, ANYSCALE_PROVIDER
 
 
@@ -10,8 +10,36 @@ class APIManager(object):
     """
 
     def __init__(self,
+                 transport: Optional[Any] = None,
+                 retry_policy: Optional[Any] = None,
                  ) -> None:
         self.api_providers = {}
+        # the HTTP transport and retry policy shared by all the providers, created on first use
+        self.transport = transport
+        self.retry_policy = retry_policy
+
+    def get_transport(self):
+        """
+        Returns the HTTP transport shared by the API providers.
+        """
+        if self.transport is None:
+            from tanuki.language_models.http_transport import HTTPTransport
+            self.transport = HTTPTransport()
+        return self.transport
+
+    def configure_transport(self, **kwargs) -> None:
+        """
+        Replaces the shared HTTP transport with one created with the given configuration
+        (pool_connections, pool_maxsize, connect_timeout, read_timeout, http2), also for the existing providers.
+        """
+        from tanuki.language_models.http_transport import HTTPTransport
+        previous_transport = self.transport
+        self.transport = HTTPTransport(**kwargs)
+        for api_provider in self.api_providers.values():
+            if hasattr(api_provider, "transport"):
+                api_provider.transport = self.transport
+        if previous_transport is not None:
+            previous_transport.close()
 
     def  __getitem__(self,
                  provider: str) -> Any:
@@ -26,6 +54,26 @@ class APIManager(object):
         """
         return self.api_providers.keys()
 
+    def get_retry_policy(self):
+        """
+        Returns the retry policy shared by the API providers.
+        """
+        if self.retry_policy is None:
+            from tanuki.language_models.retry_policy import RetryPolicy
+            self.retry_policy = RetryPolicy()
+        return self.retry_policy
+
+    def configure_retry_policy(self, **kwargs) -> None:
+        """
+        Replaces the shared retry policy with one created with the given configuration
+        (max_retries, base_delay, max_delay, max_retry_after, is_retryable), also for the existing providers.
+        """
+        from tanuki.language_models.retry_policy import RetryPolicy
+        self.retry_policy = RetryPolicy(**kwargs)
+        for api_provider in self.api_providers.values():
+            if hasattr(api_provider, "retry_policy"):
+                api_provider.retry_policy = self.retry_policy
+
     def add_api_provider(self, provider):
         """
         Adds an API provider to the API manager.
@@ -33,14 +81,16 @@ class APIManager(object):
         if provider == OPENAI_PROVIDER:
             try:
                 from tanuki.language_models.openai_api import OpenAI_API
-                self.api_providers[provider] = OpenAI_API()
+                self.api_providers[provider] = OpenAI_API(transport=self.get_transport(),
+                                                         retry_policy=self.get_retry_policy())
             except ImportError:
                 raise Exception(f"You need to install the openai package to use the openai api provider."\
                                 "Please install it as pip install openai")
         elif provider == ANYSCALE_PROVIDER:
             try:
                 from tanuki.language_models.anyscale_api import Anyscale_API
-                self.api_providers[provider] = Anyscale_API()
+                self.api_providers[provider] = Anyscale_API(transport=self.get_transport(),
+                                                           retry_policy=self.get_retry_policy())
             except ImportError:
                 raise Exception(f"You need to install the openai package to use the anyscale api provider."\
                                 "Please install it as pip install openai")
@@ -48,6 +98,7 @@ class APIManager(object):
             try:
                 from tanuki.language_models.llama_bedrock_api import LLama_Bedrock_API
                 self.api_providers[provider] = LLama_Bedrock_API()
+                self.api_providers[provider].retry_policy = self.get_retry_policy()
             except ImportError:
                 raise Exception(f"You need to install the Tanuki aws_bedrock package to use the llama_bedrock api provider."\
                                  "Please install it as pip install tanuki.py[aws_bedrock]")
@@ -55,13 +106,15 @@ class APIManager(object):
             try:
                 from tanuki.language_models.titan_bedrock_api import Titan_Bedrock_API
                 self.api_providers[provider] = Titan_Bedrock_API()
+                self.api_providers[provider].retry_policy = self.get_retry_policy()
             except ImportError:
                 raise Exception(f"You need to install the Tanuki aws_bedrock package to use the titan_bedrock api provider."\
                                  "Please install it as pip install tanuki.py[aws_bedrock]")
         elif provider == TOGETHER_AI_PROVIDER:
             try:
                 from tanuki.language_models.togetherai_api import TogetherAI_API
-                self.api_providers[provider] = TogetherAI_API()
+                self.api_providers[provider] = TogetherAI_API(transport=self.get_transport(),
+                                                             retry_policy=self.get_retry_policy())
             except ImportError:
                 raise Exception(f"You need to install the Tanuki together_ai package to use the together ai api provider."\
                                  "Please install it as pip install tanuki.py[together_ai]")
@@ -0,0 +1,74 @@
+import functools
+import inspect
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from tanuki.json_schema import compile_json_schema
+from tanuki.models.embedding import Embedding
+from tanuki.models.function_description import FunctionDescription
+
+
+@dataclass(frozen=True, eq=False)
+class FunctionPlan:
+    """
+    A precompiled call plan for a patched function.
+    Everything in the plan only depends on the function signature and docstring, so it is built once when the
+    function is patched and reused on every call, instead of re-inspecting and re-hashing the function each time.
+
+    Parameters
+    ----------
+    description : FunctionDescription -- the description of the patched function
+    func_hash : str -- the general hash of the function description
+    finetune_hash : str -- the (shorter) hash used to name finetuned models
+    description_string : str -- the rendered function description used in prompts
+    output_type_hint : type -- the output type hint of the function
+    is_embeddable : bool -- whether the function outputs an embedding rather than a symbolic object
+    """
+    description: FunctionDescription
+    func_hash: str
+    finetune_hash: str
+    description_string: str
+    output_type_hint: type
+    is_embeddable: bool
+
+    @property
+    def name(self) -> str:
+        return self.description.name
+
+    @functools.cached_property
+    def output_schema(self) -> Optional[dict]:
+        """
+        The JSON Schema of the output, None if the output type can not be expressed as one. It is compiled when it is
+        first used by a structured generation rather than when the function is patched, so that the output type can
+        refer to classes which are defined after the function
+        """
+        if self.is_embeddable:
+            return None
+        return compile_json_schema(self.output_type_hint)
+
+    @staticmethod
+    def from_description(function_description: FunctionDescription) -> "FunctionPlan":
+        """
+        Compile a function description into a call plan
+        Args:
+            function_description: The function description to compile
+        Returns:
+            The function plan
+        """
+        output_type_hint = function_description.output_type_hint
+        is_embeddable = inspect.isclass(output_type_hint) and issubclass(output_type_hint, Embedding)
+        return FunctionPlan(description=function_description,
+                            func_hash=function_description.__hash__(),
+                            finetune_hash=function_description.__hash__(purpose="finetune"),
+                            description_string=str(function_description.__dict__.__repr__()),
+                            output_type_hint=output_type_hint,
+                            is_embeddable=is_embeddable)
+
+
+def as_function_plan(function: Union[FunctionDescription, FunctionPlan]) -> FunctionPlan:
+    """
+    Return the call plan for a function, compiling it from the description if a plan was not passed in
+    """
+    if isinstance(function, FunctionPlan):
+        return function
+    return FunctionPlan.from_description(function)
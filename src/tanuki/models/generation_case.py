@@ -0,0 +1,19 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
+
+
+@dataclass()
+class GenerationCase:
+    prompt: str
+    model: BaseModelConfig
+    suitable_for_finetuning: bool
+    distilled_model: bool
+    # the response cache key of the call, if the response should be cached once it has been validated
+    cache_key: Optional[str] = None
+    # the teacher model (and its prompt) run alongside the distilled model, if the generation is speculative
+    teacher_prompt: Optional[str] = None
+    teacher_model: Optional[BaseModelConfig] = None
+    # the prompts and models to try in order, the models after the first one are failed over to
+    failover_chain: List[Tuple[str, BaseModelConfig]] = field(default_factory=list)
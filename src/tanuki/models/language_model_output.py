@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass()
@@ -6,3 +7,7 @@ class LanguageModelOutput:
     generated_response: str
     suitable_for_finetuning: bool
     distilled_model: bool
+    # the response cache key of the call, if the response should be cached once it has been validated
+    cache_key: Optional[str] = None
+    # whether the response replaces an output of the distilled model that failed validation
+    repaired: bool = False
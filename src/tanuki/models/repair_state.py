@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+
+from tanuki.language_models.llm_configs.abc_base_config import BaseModelConfig
+
+
+@dataclass()
+class RepairState:
+    # the function description the repair prompts are built from
+    f: str
+    teacher_models: List[BaseModelConfig]
+    aligns: List[dict]
+    # the number of repair candidates generated concurrently, 1 repairs serially
+    parallel_repairs: int
+    retries_left: int
+    choice: Any
+    # the failed outputs and their errors, which are shown to the model in the repair prompts
+    failed_outputs_list: List[Tuple[Any, str]]
+    choice_parsed: Any = None
+    valid: bool = False
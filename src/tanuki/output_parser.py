@@ -0,0 +1,239 @@
+import re
+from json.decoder import scanstring
+from typing import Any
+
+from tanuki.constants import MAX_PARSED_OUTPUT_LENGTH, MAX_PARSED_OUTPUT_DEPTH
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DIGITS = r"\d(?:_?\d)*"
+_NUMBER = re.compile(rf"[-+]?(?:{_DIGITS}(?:\.(?:{_DIGITS})?)?|\.{_DIGITS})(?:[eE][-+]?{_DIGITS})?")
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# the string content up to the next quote or escape
+_STRING_CHUNKS = {"'": re.compile(r"[^'\\\n]*"), '"': re.compile(r'[^"\\\n]*')}
+
+_CONSTANTS = {"true": True, "True": True,
+              "false": False, "False": False,
+              "null": None, "None": None,
+              "NaN": float("nan"), "Infinity": float("inf")}
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "a": "\a", "v": "\v", "0": "\0",
+            "\\": "\\", "'": "'", '"': '"', "/": "/", "\n": ""}
+_HEX_ESCAPE_LENGTHS = {"x": 2, "u": 4, "U": 8}
+# the string prefixes of Python literals, b for bytes, r for raw strings and u for (the default) unicode strings
+_STRING_PREFIXES = {"b", "r", "u", "br", "rb"}
+_CLOSING_BRACKETS = {"[": "]", "(": ")", "{": "}"}
+
+
+class OutputParseError(ValueError):
+    """
+    Raised when a model output is not a JSON or Python literal value, or exceeds the parsing limits
+    """
+
+
+def parse_output(text: str,
+                 max_length: int = MAX_PARSED_OUTPUT_LENGTH,
+                 max_depth: int = MAX_PARSED_OUTPUT_DEPTH) -> Any:
+    """
+    Parse a model output or a stored dataset line in a single pass. Accepts JSON as well as Python literal syntax,
+    i.e single quoted, bytes and raw strings, True, False and None, tuples and sets, so that the outputs models
+    commonly generate and the repr of the stored examples can be read without evaluating any code
+    Args:
+        text: The text to parse
+        max_length: The maximum length of the text in characters
+        max_depth: The maximum nesting depth of the containers
+    Returns:
+        The parsed value
+    Raises:
+        OutputParseError: If the text is not a single literal value or exceeds the limits
+    """
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode("utf-8")
+    if not isinstance(text, str):
+        raise OutputParseError(f"Can only parse strings, got {type(text).__name__}")
+    if len(text) > max_length:
+        raise OutputParseError(f"The text is {len(text)} characters long, the maximum is {max_length}")
+    parser = _OutputParser(text, max_depth)
+    value = parser.parse_value(0)
+    parser.skip_whitespace()
+    if parser.position != len(text):
+        raise parser.error("Unexpected text after the value")
+    return value
+
+
+def parse_output_or_text(text: str) -> Any:
+    """
+    Parse a model output, returning the text itself if it is not a literal value (e.g an unquoted string)
+    """
+    try:
+        return parse_output(text)
+    except OutputParseError:
+        return text
+
+
+class _OutputParser(object):
+    """
+    A recursive descent parser over JSON and Python literals, the position is advanced as the value is read
+    """
+
+    def __init__(self, text: str, max_depth: int):
+        self.text = text
+        self.max_depth = max_depth
+        self.position = 0
+
+    def error(self, message: str) -> OutputParseError:
+        return OutputParseError(f"{message} at position {self.position}")
+
+    def skip_whitespace(self) -> None:
+        self.position = _WHITESPACE.match(self.text, self.position).end()
+
+    def parse_value(self, depth: int) -> Any:
+        self.skip_whitespace()
+        if self.position >= len(self.text):
+            raise self.error("Expected a value")
+        char = self.text[self.position]
+        if char == '"' or char == "'":
+            return self.parse_string(char)
+        if char in _CLOSING_BRACKETS:
+            if depth >= self.max_depth:
+                raise self.error(f"The value is nested deeper than {self.max_depth} levels")
+            if char == "{":
+                return self.parse_braces(depth + 1)
+            return self.parse_sequence(char, depth + 1)
+        identifier = _IDENTIFIER.match(self.text, self.position)
+        if identifier is not None:
+            prefix = identifier.group().lower()
+            if prefix in _STRING_PREFIXES and self.text[identifier.end():identifier.end() + 1] in ("'", '"'):
+                self.position = identifier.end()
+                return self.parse_string(self.text[self.position], prefix)
+            if identifier.group() not in _CONSTANTS:
+                raise self.error(f"Unexpected name {identifier.group()}")
+            self.position = identifier.end()
+            return _CONSTANTS[identifier.group()]
+        return self.parse_number()
+
+    def parse_number(self) -> Any:
+        if self.text.startswith("-Infinity", self.position):
+            self.position += len("-Infinity")
+            return float("-inf")
+        number = _NUMBER.match(self.text, self.position)
+        if number is None:
+            raise self.error("Expected a value")
+        self.position = number.end()
+        literal = number.group()
+        if "." in literal or "e" in literal or "E" in literal:
+            return float(literal)
+        return int(literal)
+
+    def parse_string(self, quote: str, prefix: str = "") -> Any:
+        start = self.position
+        is_bytes = "b" in prefix
+        is_raw = "r" in prefix
+        if quote == '"' and not prefix:
+            try:
+                # the JSON string scanner is implemented in C, it handles all strings without Python-only escapes
+                value, self.position = scanstring(self.text, start + 1)
+                return value
+            except ValueError:
+                pass
+        chunk = _STRING_CHUNKS[quote]
+        parts = []
+        position = start + 1
+        while True:
+            match = chunk.match(self.text, position)
+            if is_bytes and not match.group().isascii():
+                self.position = start
+                raise self.error("Bytes literals can only contain ASCII characters")
+            parts.append(match.group())
+            position = match.end()
+            if position >= len(self.text) or self.text[position] == "\n":
+                self.position = start
+                raise self.error("Unterminated string")
+            if self.text[position] == quote:
+                self.position = position + 1
+                if is_bytes:
+                    # every character, and every \\x escape, of a bytes literal is a single byte
+                    return "".join(parts).encode("latin-1")
+                return "".join(parts)
+            # an escape sequence
+            escape = self.text[position + 1:position + 2]
+            if is_raw:
+                # raw strings keep the backslash, it only stops the next character from ending the string
+                parts.append(self.text[position:position + 2])
+                position += 2
+            elif escape in _HEX_ESCAPE_LENGTHS and (escape == "x" or not is_bytes):
+                length = _HEX_ESCAPE_LENGTHS[escape]
+                digits = self.text[position + 2:position + 2 + length]
+                try:
+                    parts.append(chr(int(digits, 16)))
+                except ValueError:
+                    self.position = position
+                    raise self.error(f"Invalid escape \\{escape}{digits}")
+                position += 2 + length
+            elif escape in _ESCAPES:
+                parts.append(_ESCAPES[escape])
+                position += 2
+            else:
+                # unknown escapes (and unicode escapes in bytes) are kept as they are, as Python does
+                parts.append("\\")
+                position += 1
+
+    def parse_sequence(self, opening: str, depth: int) -> Any:
+        closing = _CLOSING_BRACKETS[opening]
+        self.position += 1
+        items = []
+        trailing_comma = False
+        while True:
+            self.skip_whitespace()
+            if self.text.startswith(closing, self.position):
+                self.position += 1
+                break
+            if items and not trailing_comma:
+                raise self.error(f"Expected , or {closing}")
+            items.append(self.parse_value(depth))
+            self.skip_whitespace()
+            trailing_comma = self.text.startswith(",", self.position)
+            if trailing_comma:
+                self.position += 1
+        if opening == "(":
+            # (1) is a parenthesised value, (1,) and () are tuples
+            if len(items) == 1 and not trailing_comma:
+                return items[0]
+            return tuple(items)
+        return items
+
+    def parse_braces(self, depth: int) -> Any:
+        """
+        Parse a dict or a set, which are told apart by the first item
+        """
+        self.position += 1
+        self.skip_whitespace()
+        if self.text.startswith("}", self.position):
+            self.position += 1
+            return {}
+        result = None
+        while True:
+            key = self.parse_value(depth)
+            self.skip_whitespace()
+            if result is None:
+                result = {} if self.text.startswith(":", self.position) else set()
+            try:
+                if isinstance(result, dict):
+                    if not self.text.startswith(":", self.position):
+                        raise self.error("Expected :")
+                    self.position += 1
+                    result[key] = self.parse_value(depth)
+                    self.skip_whitespace()
+                else:
+                    result.add(key)
+            except TypeError:
+                raise self.error(f"Unhashable {type(key).__name__} can not be a dict key or set item")
+            if self.text.startswith(",", self.position):
+                self.position += 1
+                self.skip_whitespace()
+                if self.text.startswith("}", self.position):
+                    self.position += 1
+                    return result
+            elif self.text.startswith("}", self.position):
+                self.position += 1
+                return result
+            else:
+                raise self.error("Expected , or }")
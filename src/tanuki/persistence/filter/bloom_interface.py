@@ -1,3 +1,6 @@
+import mmap
+from typing import Optional
+
 from bitarray import bitarray
 
 
@@ -7,3 +10,28 @@ class IBloomFilterPersistence:
 
     def load(self) -> bitarray:
         pass
+
+    def map(self, length: int) -> Optional[mmap.mmap]:
+        """
+        Map the bloom filter state of the length in bytes into memory shared with the other processes, None if the
+        persistence does not support it, in which case the state is loaded and saved instead.
+        """
+        return None
+
+    def get_partition(self, name: str) -> Optional["IBloomFilterPersistence"]:
+        """
+        Get the persistence of a named part of the bloom filter state, e.g. the filter of a function or a slice of it.
+        None if the persistence does not support it, in which case a single unpartitioned filter is kept in the
+        persistence itself.
+        """
+        return None
+
+    def save_metadata(self, metadata: dict) -> None:
+        """
+        Save the metadata of the bloom filter state, e.g. the hash version it was saved with. Persistences which do not
+        save it have the filter rebuilt from the datasets whenever it is loaded.
+        """
+        pass
+
+    def load_metadata(self) -> Optional[dict]:
+        pass
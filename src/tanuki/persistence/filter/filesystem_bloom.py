@@ -1,4 +1,8 @@
+import json
+import logging
+import mmap
 import os
+from typing import Optional
 
 from bitarray._bitarray import bitarray
 
@@ -23,9 +27,34 @@ class BloomFilterFileSystemDriver(IBloomFilterPersistence):
         while len(bit_array) % 8 != 0:
             bit_array.append(0)
 
-        with open(bloom_filter_path, 'wb') as f:
+        os.makedirs(self.log_directory, exist_ok=True)
+        # the state is written in place, the file must not be truncated while other processes have it memory mapped
+        with open(bloom_filter_path, 'r+b' if os.path.exists(bloom_filter_path) else 'wb') as f:
             f.write(bit_array.tobytes())
 
+    def map(self, length: int) -> mmap.mmap:
+        """
+        Memory map the bloom filter state file, so that the bits set by any process are visible to all of the
+        processes using the log directory. The file is created if it does not exist, and reinitialised if it does not
+        have the length.
+        :param length: The length of the bloom filter in bytes
+        :return: A shared, writable memory map of the state file
+        """
+        os.makedirs(self.log_directory, exist_ok=True)
+        bloom_filter_path = os.path.join(self.log_directory, 'bloom_filter_state.bin')
+        fd = os.open(bloom_filter_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        with os.fdopen(fd, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                # extending the file fills it with zeros, without overwriting the bits another process just set
+                f.truncate(length)
+            elif size != length:
+                logging.warning("Bit array length does not match expected size, and so might be corrupted. Reinitializing.")
+                f.seek(0)
+                f.write(bytes(length))
+                f.flush()
+            return mmap.mmap(f.fileno(), length)
+
     def load(self) -> bitarray:
         """
         Load a bloom filter from the local filesystem.
@@ -39,4 +68,34 @@ class BloomFilterFileSystemDriver(IBloomFilterPersistence):
         while len(bit_array) % 8 != 0:
             bit_array.append(0)
 
-        return bit_array
\ No newline at end of file
+        return bit_array
+    def get_partition(self, name: str) -> "BloomFilterFileSystemDriver":
+        """
+        Get the persistence of a named part of the bloom filter state, which is kept in a subdirectory.
+        :param name: The name of the partition, e.g. a function hash
+        :return: A persistence provider for the partition
+        """
+        return BloomFilterFileSystemDriver(log_directory=os.path.join(self.log_directory, name))
+
+    def save_metadata(self, metadata: dict) -> None:
+        """
+        Write the metadata of the bloom filter, e.g. the slices of a scalable filter.
+        The file is replaced atomically, so that other processes never read a partially written file.
+        """
+        os.makedirs(self.log_directory, exist_ok=True)
+        metadata_path = os.path.join(self.log_directory, 'bloom_filter_metadata.json')
+        temporary_path = f"{metadata_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(temporary_path, metadata_path)
+
+    def load_metadata(self) -> Optional[dict]:
+        """
+        Read the metadata of the bloom filter, None if it has not been saved.
+        """
+        metadata_path = os.path.join(self.log_directory, 'bloom_filter_metadata.json')
+        try:
+            with open(metadata_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
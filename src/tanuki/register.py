@@ -3,6 +3,7 @@ from typing import get_type_hints, Literal, get_origin, Tuple, Callable, Optiona
 import json
 from tanuki.models.embedding import Embedding
 from tanuki.models.function_description import FunctionDescription
+from tanuki.models.function_plan import FunctionPlan
 from tanuki.models.function_type import FunctionType
 from tanuki.utils import get_source
 
@@ -107,6 +108,17 @@ class Register:
 
         return Register.load_function_description(func_object)
 
+    @staticmethod
+    def load_function_plan(func_object) -> FunctionPlan:
+        """
+        Create a precompiled call plan from a function object. This should be done once when the function is patched,
+        so that the function does not need to be inspected and hashed on every call.
+        :param func_object:
+        :return:
+        """
+        function_description = Register.load_function_description(func_object)
+        return FunctionPlan.from_description(function_description)
+
     @staticmethod
     def load_function_description(func_object) -> FunctionDescription:
         """
@@ -45,11 +45,21 @@ class RuntimeAssertionVisitor(ast.NodeTransformer):
             # raise an error or handle it according to your needs.
             raise NotImplementedError(f"Unsupported function call type: {type(call_node.func)}")
 
+    def unwrap_await(self, node):
+        """
+        Returns the awaited expression if the node is an await (i.e. `await func(x)` in an async align), otherwise
+        the node itself.
+        """
+        if isinstance(node, ast.Await):
+            return node.value
+        return node
+
     def visit_Assert(self, node):
         # Check if either side of the assert involves a patched function
-        left_func_name = self.extract_func_name(node.test.left) if isinstance(node.test.left, ast.Call) else None
-        right_func_name = self.extract_func_name(node.test.comparators[0]) if isinstance(node.test.comparators[0],
-                                                                                         ast.Call) else None
+        left = self.unwrap_await(node.test.left)
+        right = self.unwrap_await(node.test.comparators[0])
+        left_func_name = self.extract_func_name(left) if isinstance(left, ast.Call) else None
+        right_func_name = self.extract_func_name(right) if isinstance(right, ast.Call) else None
 
         left_is_patchable = self.is_function_patchable(left_func_name, self.instance) if left_func_name else False
         right_is_patchable = self.is_function_patchable(right_func_name,
@@ -73,6 +83,8 @@ class RuntimeAssertionVisitor(ast.NodeTransformer):
         self.generic_visit(node)
         return node
 
+    visit_AsyncFunctionDef = visit_FunctionDef
+
     def is_function_patchable(self, func_name, instance=None):
         """
         Checks if a function is listed as a patchable function in the Register.
@@ -104,7 +116,7 @@ class RuntimeAssertionVisitor(ast.NodeTransformer):
 
     def create_register_call(self, assert_node, _align_direction: bool = True):
         # Extract the function call and the expected output from the assert statement
-        func_call = assert_node.test.left
+        func_call = self.unwrap_await(assert_node.test.left)
         expected_output = assert_node.test.comparators[0]
 
         # Assuming the function call is directly a call to a function (not nested in other expressions)
@@ -2,11 +2,13 @@ import json
 from abc import abstractmethod
 from typing import Dict, Any, Literal
 
-from tanuki.bloom_filter import BloomFilter
+from tanuki.bloom_filter import BloomFilter, PartitionedBloomFilter
 from tanuki.constants import EXPECTED_ITEMS, FALSE_POSITIVE_RATE, ALIGN_FILE_EXTENSION, \
-    POSITIVE_FILE_EXTENSION, NEGATIVE_FILE_EXTENSION, PATCH_FILE_EXTENSION
+    POSITIVE_FILE_EXTENSION, NEGATIVE_FILE_EXTENSION, PATCH_FILE_EXTENSION, FSYNC_NEVER, BLOOM_FILTER_SYNC_INTERVAL, \
+    BLOOM_FILTER_INITIAL_CAPACITY, BLOOM_FILTER_PARTITIONS, BLOOM_FILTER_HASH_VERSION
 from tanuki.persistence.filter.bloom_interface import IBloomFilterPersistence
 from tanuki.trackers.dataset_worker import DatasetWorker
+from tanuki.trackers.dataset_writer import DatasetWriter, flush_all_writers
 from tanuki.models.function_config import FunctionConfig
 
 # PATCH_FILE_EXTENSION_TYPE = Literal[".patches"]
@@ -26,18 +28,16 @@ from tanuki.models.function_config import FunctionConfig
 
 
 class ABCBufferedLogger(DatasetWorker):
-    def __init__(self, name, level=15):
-        self.buffers = {}
+    def __init__(self, name, level=15, fsync_policy=FSYNC_NEVER):
         self.mapped_files = {}
         self.miss_count = 0
         self.hit_count = 0
-        self.flush_limit = {}
-        self.buffer_rolling_size = {}
-        self.write_count = 0
-        self.write_limit = 1000  # Save the Bloom filter every 1000 writes
 
         super().__init__(name, level)
         self.bloom_filter = self.create_bloom_filter()
+        # the datapoints are appended by a background thread, which saves the bloom filter after every batch
+        self.writer = DatasetWriter(self._append, sync=self.sync, on_write=self.save_bloom_filter,
+                                    fsync_policy=fsync_policy)
         self.load_bloom_filter()
 
         self.default_function_config = FunctionConfig()
@@ -84,6 +84,15 @@ class ABCBufferedLogger(DatasetWorker):
     def read(self, path) -> str:
         pass
 
+    def sync(self, path) -> None:
+        """
+        Make sure the data written to the path is on durable storage, used by the fsync policies of the writer.
+        """
+        pass
+
+    def _append(self, path, data: bytes) -> None:
+        self.write(path, data, mode="a+b")
+
     @abstractmethod
     def get_hash_from_path(self, path) -> str:
         pass
@@ -94,25 +103,77 @@ class ABCBufferedLogger(DatasetWorker):
 
     def create_bloom_filter(self):
         bloom_filter_persistence = self.get_bloom_filter_persistence()
-
-        bloom_filter = BloomFilter(
-            bloom_filter_persistence,
-            expected_number_of_elements=EXPECTED_ITEMS,
-            false_positive_probability=FALSE_POSITIVE_RATE)
+        partitions = bloom_filter_persistence.get_partition(BLOOM_FILTER_PARTITIONS)
+        if partitions is None:
+            # a persistence without partitions keeps a single filter of a fixed size
+            return BloomFilter(
+                bloom_filter_persistence,
+                expected_number_of_elements=EXPECTED_ITEMS,
+                false_positive_probability=FALSE_POSITIVE_RATE,
+                sync_interval=BLOOM_FILTER_SYNC_INTERVAL)
+
+        # every function has its own scalable filter, which grows with the number of its datapoints
+        bloom_filter = PartitionedBloomFilter(
+            partitions,
+            initial_capacity=BLOOM_FILTER_INITIAL_CAPACITY,
+            false_positive_probability=FALSE_POSITIVE_RATE,
+            sync_interval=BLOOM_FILTER_SYNC_INTERVAL)
         return bloom_filter
 
     def load_bloom_filter(self):
+        # the bloom filter saved by the other loggers of the process must include their queued datapoints
+        flush_all_writers()
+        state_exists = True
         try:
             self.bloom_filter.load()
         except FileNotFoundError:
+            state_exists = False
             self.debug("No Bloom filter found. Creating a new one.")
+        metadata = self.bloom_filter.persistence.load_metadata() or {}
+        if metadata.get("hash_version") != BLOOM_FILTER_HASH_VERSION:
+            self._rebuild_bloom_filter(state_exists)
+
+    def _rebuild_bloom_filter(self, state_exists):
+        """
+        Rebuild the bloom filter from the datasets when its state was saved with another hashing of the strings, or
+        for the filter per function, when it is first used after the single bloom filter of earlier versions, as the
+        saved bits do not match the datapoints they were set for
+        """
+        if isinstance(self.bloom_filter, PartitionedBloomFilter):
+            # the filters of the functions start empty, the single bloom filter can not be split into them
+            try:
+                self.get_bloom_filter_persistence().load()
+                self.warning("Migrating the bloom filter to a filter per function, the datapoints of the existing "
+                             "datasets are added to the new filters and the old bloom filter state is no longer used")
+            except Exception:
+                pass
+        else:
+            if state_exists:
+                self.warning("The bloom filter was saved with another hash version, it is rebuilt from the datasets")
+            self.bloom_filter.reset()
+        self.seed_bloom_filter()
+        self.bloom_filter.persistence.save_metadata({"hash_version": BLOOM_FILTER_HASH_VERSION})
+
+    def seed_bloom_filter(self):
+        """
+        Add the datapoints of the existing datasets to the bloom filter, so that they are not logged again
+        """
+        for dataset_type, func_hashes in self.load_existing_datasets().items():
+            for func_hash in func_hashes:
+                dataset = self.load_dataset(dataset_type, func_hash, return_type="dataset")
+                if not dataset:
+                    continue
+                # the datapoints are added the way they are logged, as the function hash and the line of the datapoint
+                lines = dataset.decode('utf-8', errors='replace').split("\n")
+                self.bloom_filter.add_many(func_hash + '_' + line + '\n' for line in lines if line)
+        self.save_bloom_filter()
 
     def write_symbolic_align_call(self, func_hash, example) -> bool:
         log_file_path = self.get_patch_location_for_function(func_hash, extension=ALIGN_FILE_EXTENSION)
         try:
-            # Now, write to the file
+            # queue the write to the file
             dumpable_object = str(example.__dict__)
-            self.write(log_file_path, dumpable_object + "\n", mode="a")
+            self.writer.put(log_file_path, (dumpable_object + "\n").encode('utf-8'), func_hash)
             return True
         except Exception as e:
             return False
@@ -124,9 +185,9 @@ class ABCBufferedLogger(DatasetWorker):
             log_file_path = self.get_patch_location_for_function(func_hash, extension=NEGATIVE_FILE_EXTENSION)
 
         try:
-            # Now, write to the file
+            # queue the write to the file
             dumpable_object = str(example.__dict__)
-            self.write(log_file_path, dumpable_object + "\n", mode="a")
+            self.writer.put(log_file_path, (dumpable_object + "\n").encode('utf-8'), func_hash)
             return True
         except Exception as e:
             return False
@@ -152,9 +213,8 @@ class ABCBufferedLogger(DatasetWorker):
         if self.bloom_filter.lookup(bloom_filter_representation):
             return successfully_saved, new_datapoint
         new_datapoint = True
-        # add to bloom filter
+        # add to bloom filter, which is saved once the align is written
         self.bloom_filter.add(bloom_filter_representation)
-        self.save_bloom_filter()
 
         successfully_saved = self.write_embeddable_align_call(func_hash, example, positive)
         return successfully_saved, new_datapoint
@@ -181,9 +241,8 @@ class ABCBufferedLogger(DatasetWorker):
         if self.bloom_filter.lookup(bloom_filter_representation):
             return successfully_saved, new_datapoint
         new_datapoint = True
-        # add to bloom filter
+        # add to bloom filter, which is saved once the align is written
         self.bloom_filter.add(bloom_filter_representation)
-        self.save_bloom_filter()
 
         successfully_saved = self.write_symbolic_align_call(func_hash, example)
         return successfully_saved, new_datapoint
@@ -216,41 +275,12 @@ class ABCBufferedLogger(DatasetWorker):
             return {}
 
         log_file_path = self.get_patch_location_for_function(func_hash, extension=PATCH_FILE_EXTENSION)
-
-        if log_file_path not in self.buffers:
-            self.buffers[log_file_path] = bytearray()
-
-        if log_file_path not in self.flush_limit:
-            self.flush_limit[log_file_path] = 1
-
-        self.buffers[log_file_path].extend(example_data)
-
-        self.write_count += 1
-        if log_file_path not in self.buffer_rolling_size:
-            self.buffer_rolling_size[log_file_path] = 1
-        else:
-            self.buffer_rolling_size[log_file_path] += 1
-        if self.write_count >= self.write_limit:
-            written_datapoints = self.flush()
-            self.save_bloom_filter()
-            self.write_count = 0  # Reset counter
-            return written_datapoints
-
-        if len(self.buffers[log_file_path]) >= min(self.flush_limit[log_file_path], 4096):  # Flush after reaching 4KB
-            written_datapoints = {}
-            try:
-                self.write(log_file_path, self.buffers[log_file_path], mode="a+b")
-                # update buffers
-                written_datapoints[func_hash] = self.buffer_rolling_size[log_file_path]
-                self.buffers[log_file_path].clear()
-                self.buffer_rolling_size[log_file_path] = 0
-                self.flush_limit[log_file_path] = 2 * self.flush_limit[log_file_path]
-                self.save_bloom_filter()
-            except Exception as e:
-                pass
-
-            return written_datapoints
-        return {}
+        try:
+            # the patch is appended and the bloom filter saved by the writer
+            self.writer.put(log_file_path, example_data, func_hash)
+        except Exception as e:
+            return {}
+        return {func_hash: 1}
 
     def save_bloom_filter(self):
         try:
@@ -259,18 +289,17 @@ class ABCBufferedLogger(DatasetWorker):
             self.warning("Could not save Bloom filter: {}".format(e))
 
     def flush(self):
-        # get log directory
-        written_datapoints = {}
-        for log_file_path, buffer in self.buffers.items():
-            if len(buffer) > 0:
-                try:
-                    self.write(log_file_path, buffer, mode="a+b")
-                    written_datapoints[self.get_hash_from_path(log_file_path)] = self.buffer_rolling_size[log_file_path]
-                    self.buffer_rolling_size[log_file_path] = 0
-                    buffer.clear()
-                except Exception as e:
-                    pass
-        return written_datapoints
+        """
+        Write all of the queued datapoints
+        :return: The number of datapoints written per function hash
+        """
+        return self.writer.flush()
+
+    def call_after_write(self, callback):
+        """
+        Call the callback from the writer thread with the group commit of the datapoints queued so far
+        """
+        self.writer.call_after_write(callback)
 
     def load_function_config(self, func_hash):
 
@@ -0,0 +1,162 @@
+import os
+import struct
+import threading
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from tanuki.constants import DATASET_INDEX_EXTENSION, DATASET_INDEX_CHECKSUM_SIZE, ALIGN_SCAN_CHUNK_SIZE
+
+try:
+    import fcntl
+except ImportError:
+    # the index is not locked between processes on platforms without fcntl
+    fcntl = None
+
+# the magic, the number of records, the size of the indexed data, the modification time (ns) and the inode of the
+# dataset, and the checksum of the end of the indexed data
+_HEADER = struct.Struct("<8sQQQQI")
+_MAGIC = b"TNKIDX02"
+_OFFSET_SIZE = 8
+
+
+class DatasetIndex(object):
+    """
+    A sidecar index of a dataset file, which holds the number of records (lines) of the dataset, the size, the
+    modification time and the inode of the data it covers, a checksum of the end of that data, and the end offset of
+    every record.
+    The index is checked against the size and modification time of the dataset whenever it is used. Data appended
+    since, by any process, is indexed by scanning only the new bytes. A dataset which was rewritten, i.e. replaced by
+    another file or changed before the end of the indexed data, is reindexed, so the number of records is known
+    without reading the dataset and any record can be read on its own
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        Args:
+            path: The path of the dataset file
+            index_path: The path of the index, next to the dataset if not given
+        """
+        self.path = path
+        self.index_path = index_path if index_path is not None else path + DATASET_INDEX_EXTENSION
+        self.record_count = 0
+        self.data_size = 0
+        self.modified = 0
+        self.inode = 0
+        self.checksum = 0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """
+        Bring the index up to date with the dataset
+        Returns:
+            The number of records in the dataset
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return 0
+            if self._is_current(stat):
+                return self.record_count
+            with open(self.index_path, "a+b") as index_file:
+                if fcntl is not None:
+                    fcntl.flock(index_file.fileno(), fcntl.LOCK_EX)
+                # another process may have brought the index up to date already
+                self._read_header(index_file)
+                if not self._is_current(stat):
+                    # appending grows the dataset, anything else means it was rewritten and is indexed from the start
+                    if not self._is_appended(stat):
+                        self._reset()
+                    self._index(index_file, stat)
+            return self.record_count
+
+    def get_record(self, position: int) -> Optional[bytes]:
+        """
+        Read the record at the position without reading the rest of the dataset, None if there is no such record
+        """
+        record_count = self.refresh()
+        if position < 0:
+            position += record_count
+        if not 0 <= position < record_count:
+            return None
+        with open(self.index_path, "rb") as index_file:
+            if position == 0:
+                index_file.seek(_HEADER.size)
+                start, end = 0, struct.unpack("<Q", index_file.read(_OFFSET_SIZE))[0]
+            else:
+                index_file.seek(_HEADER.size + (position - 1) * _OFFSET_SIZE)
+                start, end = struct.unpack("<2Q", index_file.read(2 * _OFFSET_SIZE))
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _is_current(self, stat: os.stat_result) -> bool:
+        return stat.st_size == self.data_size and stat.st_mtime_ns == self.modified
+
+    def _is_appended(self, stat: os.stat_result) -> bool:
+        """
+        Check whether the dataset is the indexed data with data appended to it
+        """
+        if self.data_size >= stat.st_size or self.modified > stat.st_mtime_ns or self.inode != stat.st_ino:
+            return False
+        return self._get_checksum() == self.checksum
+
+    def _get_checksum(self) -> int:
+        """
+        Checksum the end of the indexed data in the dataset
+        """
+        with open(self.path, "rb") as f:
+            start = max(0, self.data_size - DATASET_INDEX_CHECKSUM_SIZE)
+            f.seek(start)
+            return zlib.crc32(f.read(self.data_size - start))
+
+    def _reset(self) -> None:
+        self.record_count = self.data_size = self.modified = self.inode = self.checksum = 0
+
+    def _read_header(self, index_file) -> None:
+        index_file.seek(0, os.SEEK_END)
+        index_size = index_file.tell()
+        index_file.seek(0)
+        header = index_file.read(_HEADER.size)
+        if len(header) == _HEADER.size:
+            magic, record_count, data_size, modified, inode, checksum = _HEADER.unpack(header)
+            # an index without all of its offsets, e.g. after a crash while it was written, is rebuilt
+            if magic == _MAGIC and index_size >= _HEADER.size + record_count * _OFFSET_SIZE:
+                self.record_count, self.data_size, self.modified = record_count, data_size, modified
+                self.inode, self.checksum = inode, checksum
+                return
+        self._reset()
+
+    def _index(self, index_file, stat: os.stat_result) -> None:
+        """
+        Index the records of the dataset from the end of the indexed data, and write the index
+        """
+        offsets = []
+        with open(self.path, "rb") as f:
+            f.seek(self.data_size)
+            position = self.data_size
+            while position < stat.st_size:
+                chunk = f.read(min(ALIGN_SCAN_CHUNK_SIZE, stat.st_size - position))
+                if not chunk:
+                    break
+                newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+                offsets.append((newlines + position + 1).astype("<u8"))
+                position += len(chunk)
+        new_offsets = np.concatenate(offsets) if offsets else np.empty(0, dtype="<u8")
+        # the data after the last newline is a record which is still being written, it is indexed with the next scan
+        # as the scan continues from the indexed size
+        index_file.seek(_HEADER.size + self.record_count * _OFFSET_SIZE)
+        index_file.truncate()
+        index_file.write(new_offsets.tobytes())
+        self.record_count += len(new_offsets)
+        self.data_size = position
+        self.modified = stat.st_mtime_ns
+        self.inode = stat.st_ino
+        self.checksum = self._get_checksum()
+        index_file.seek(0)
+        index_file.write(_HEADER.pack(_MAGIC, self.record_count, self.data_size, self.modified, self.inode,
+                                      self.checksum))
+        index_file.flush()
@@ -1,5 +1,6 @@
 from abc import abstractmethod
 from logging import Logger
+from typing import Optional
 
 from tanuki.models.function_example import FunctionExample
 
@@ -132,6 +133,30 @@ class DatasetWorker(Logger):
         """
         pass
 
+    def get_dataset_path(self, dataset_type, func_hash) -> Optional[str]:
+        """
+        Get the path of a dataset on the local filesystem, so that it can be memory mapped instead of read into memory
+        Workers which do not store datasets as local files return None, and the dataset is loaded with load_dataset
+
+        Args:
+            dataset_type (str): either "alignments" or "patches"
+            func_hash (str): the function hash
+        Returns:
+            str: the path of the dataset file, None if there is no local dataset file
+        """
+        return None
+
+    def call_after_write(self, callback):
+        """
+        Call the callback once the datapoints logged so far are written, e.g. to save bookkeeping which depends on them
+        without adding disk latency to the call that logged them
+        Workers which write the datapoints as they are logged call it straight away
+
+        Args:
+            callback (Callable[[], None]): called without arguments, possibly from another thread
+        """
+        callback()
+
     @abstractmethod
     def update_function_config(self, func_hash, config_to_be_saved):
         """
@@ -0,0 +1,306 @@
+import atexit
+import logging
+import queue
+import signal
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Optional
+
+from tanuki.constants import DATASET_WRITE_QUEUE_SIZE, DATASET_WRITE_BATCH_SIZE, DATASET_WRITE_INTERVAL, \
+    DATASET_WRITE_CLOSE_TIMEOUT, FSYNC_NEVER, FSYNC_ON_WRITE, FSYNC_ON_CLOSE, FSYNC_POLICIES
+
+# the writers which have not been closed, they are closed when the process exits
+_writers = weakref.WeakSet()
+_exit_handlers_lock = threading.Lock()
+_exit_handlers_installed = False
+_sigterm_handler_installed = False
+
+# queued to make the background thread write everything before it and exit
+_CLOSE = object()
+
+
+class _FlushRequest(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.written = {}
+
+
+class _AfterWrite(object):
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+
+
+class DatasetWriter(object):
+    """
+    Appends datapoints to the dataset files from a background thread, so that logging a datapoint does not wait for
+    the disk.
+    The queued datapoints are grouped per file and appended in a single write (group commit) once the pending data of
+    the file reaches the batch size, or the oldest pending datapoint has waited for the interval. After every group
+    commit the on_write callback is called, e.g. to save the bloom filter once per batch instead of once per datapoint,
+    and bookkeeping which depends on the datapoints being written can be deferred to the group commit with
+    call_after_write.
+    Logging blocks while the queue is full, so that a slow disk slows the callers down instead of growing the queue
+    without bounds. The pending datapoints are written when the process exits normally, see install_shutdown_flush
+    to write them when the process is terminated with SIGTERM as well
+    """
+
+    def __init__(self,
+                 write: Callable[[str, bytes], None],
+                 sync: Optional[Callable[[str], None]] = None,
+                 on_write: Optional[Callable[[], None]] = None,
+                 fsync_policy: str = FSYNC_NEVER,
+                 max_queue_size: int = DATASET_WRITE_QUEUE_SIZE,
+                 batch_size: int = DATASET_WRITE_BATCH_SIZE,
+                 interval: float = DATASET_WRITE_INTERVAL):
+        """
+        Args:
+            write: Appends the data to the file at the path
+            sync: Flushes the file at the path to the disk, used by the fsync policies
+            on_write: Called after every group commit
+            fsync_policy: When the written files are synced to the disk, "never", after every "write" or on "close"
+            max_queue_size: The number of queued datapoints after which logging blocks
+            batch_size: The size in bytes of the pending data of a file after which it is written
+            interval: The time in seconds after which the pending data is written
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync_policy}, the supported policies are {FSYNC_POLICIES}")
+        self._write = write
+        self._sync = sync
+        self._on_write = on_write
+        self.fsync_policy = fsync_policy
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(max_queue_size)
+        # reentrant, so that a signal handler which closes the writer can not deadlock the thread it interrupted
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._written_paths = set()
+        _writers.add(self)
+        _install_exit_handler()
+
+    def put(self, path: str, data: bytes, key: Optional[str] = None) -> None:
+        """
+        Queue data to be appended to the file at the path, blocking while the queue is full
+        Args:
+            path: The path of the dataset file
+            data: The serialised datapoint
+            key: What the datapoint is counted under in the results of flush, the path if not given
+        """
+        key = path if key is None else key
+        with self._lock:
+            if self._closed:
+                # the process is exiting, so the datapoint is written straight away
+                self._write_batches({path: (bytearray(data), {key: 1})})
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tanuki-dataset-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((path, data, key))
+
+    def flush(self, timeout: Optional[float] = None) -> Dict[str, int]:
+        """
+        Write all of the queued datapoints, waiting until they are written
+        Returns:
+            The number of datapoints written by the flush per key, the datapoints written before are not counted
+        """
+        with self._lock:
+            if self._closed or self._thread is None:
+                return {}
+        request = _FlushRequest()
+        self._queue.put(request)
+        request.done.wait(timeout)
+        return request.written
+
+    def call_after_write(self, callback: Callable[[], None]) -> None:
+        """
+        Call the callback from the background thread once the datapoints queued so far are written, i.e. with their
+        group commit, blocking while the queue is full. The callback is called straight away if nothing is queued
+        """
+        with self._lock:
+            if self._closed or self._thread is None:
+                self._call(callback)
+                return
+        self._queue.put(_AfterWrite(callback))
+
+    def close(self, timeout: float = DATASET_WRITE_CLOSE_TIMEOUT) -> None:
+        """
+        Write all of the queued datapoints and stop the background thread, the datapoints logged afterwards are
+        written synchronously
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            try:
+                self._queue.put(_CLOSE, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                logging.warning("Could not write the queued datapoints, the dataset writer is not responding")
+                return
+        # datapoints queued while the writer was being closed
+        remaining = {}
+        callbacks = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                self._add_to_batches(remaining, *item)
+            elif isinstance(item, _AfterWrite):
+                callbacks.append(item.callback)
+        self._write_batches(remaining)
+        self._call_all(callbacks)
+        if self.fsync_policy == FSYNC_ON_CLOSE:
+            for path in self._written_paths:
+                self._sync_path(path)
+
+    def _run(self) -> None:
+        batches = {}
+        # the callbacks waiting for the datapoints in the batches to be written
+        callbacks = []
+        oldest = None
+        while True:
+            timeout = None if oldest is None else max(0.0, oldest + self.interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_batches(batches)
+                self._call_all(callbacks)
+                oldest = None
+                continue
+            if item is _CLOSE:
+                self._write_batches(batches)
+                self._call_all(callbacks)
+                return
+            if isinstance(item, _FlushRequest):
+                # everything queued before the request is in the batches
+                item.written = self._write_batches(batches)
+                self._call_all(callbacks)
+                oldest = None
+                item.done.set()
+                continue
+            if isinstance(item, _AfterWrite):
+                callbacks.append(item.callback)
+                if not batches:
+                    self._call_all(callbacks)
+                continue
+            path, data, key = item
+            self._add_to_batches(batches, path, data, key)
+            if oldest is None:
+                oldest = time.monotonic()
+            if len(batches[path][0]) >= self.batch_size:
+                self._write_batches({path: batches.pop(path)})
+                if not batches:
+                    self._call_all(callbacks)
+                    oldest = None
+
+    @staticmethod
+    def _add_to_batches(batches, path, data, key) -> None:
+        batch, counts = batches.setdefault(path, (bytearray(), {}))
+        batch.extend(data)
+        counts[key] = counts.get(key, 0) + 1
+
+    def _write_batches(self, batches) -> Dict[str, int]:
+        """
+        Append the batches to their files, each in a single write
+        Returns:
+            The number of datapoints written per key
+        """
+        written = {}
+        for path, (batch, counts) in batches.items():
+            try:
+                self._write(path, bytes(batch))
+            except Exception as e:
+                logging.warning(f"Could not write {len(batch)} bytes to {path}: {e}")
+                continue
+            self._written_paths.add(path)
+            if self.fsync_policy == FSYNC_ON_WRITE:
+                self._sync_path(path)
+            for key, count in counts.items():
+                written[key] = written.get(key, 0) + count
+        batches.clear()
+        if written and self._on_write is not None:
+            try:
+                self._on_write()
+            except Exception as e:
+                logging.warning(f"Could not finish the dataset write: {e}")
+        return written
+
+    def _call_all(self, callbacks) -> None:
+        for callback in callbacks:
+            self._call(callback)
+        callbacks.clear()
+
+    @staticmethod
+    def _call(callback: Callable[[], None]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            logging.warning(f"Could not finish the dataset write: {e}")
+
+    def _sync_path(self, path: str) -> None:
+        if self._sync is None:
+            return
+        try:
+            self._sync(path)
+        except Exception as e:
+            logging.warning(f"Could not sync {path} to the disk: {e}")
+
+
+def flush_all_writers() -> None:
+    """
+    Write the queued datapoints of all of the dataset writers of the process, e.g. before another reader loads the
+    state they write
+    """
+    for writer in list(_writers):
+        writer.flush()
+
+
+def close_all_writers() -> None:
+    for writer in list(_writers):
+        writer.close()
+
+
+def _handle_sigterm(signum, frame):
+    # the writers are not closed in the signal handler, the thread it interrupted may hold the locks they need,
+    # instead the process exits normally and the writers are closed by the atexit handler
+    raise SystemExit(128 + signum)
+
+
+def install_shutdown_flush() -> bool:
+    """
+    Write the pending datapoints when the process is terminated with SIGTERM, e.g. by a container runtime, by turning
+    SIGTERM into a regular exit. Opt-in, as it replaces the default handler of the process, and it is not installed
+    if the application has a handler of its own. Must be called from the main thread
+    Returns:
+        Whether the handler is installed
+    """
+    global _sigterm_handler_installed
+    _install_exit_handler()
+    if not hasattr(signal, "SIGTERM") or threading.current_thread() is not threading.main_thread():
+        return False
+    with _exit_handlers_lock:
+        if _sigterm_handler_installed:
+            return True
+        try:
+            if signal.getsignal(signal.SIGTERM) != signal.SIG_DFL:
+                return False
+            signal.signal(signal.SIGTERM, _handle_sigterm)
+        except (ValueError, OSError):
+            return False
+        _sigterm_handler_installed = True
+        return True
+
+
+def _install_exit_handler() -> None:
+    global _exit_handlers_installed
+    with _exit_handlers_lock:
+        if _exit_handlers_installed:
+            return
+        _exit_handlers_installed = True
+    atexit.register(close_all_writers)
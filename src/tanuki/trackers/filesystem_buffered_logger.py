@@ -8,6 +8,7 @@ from tanuki.constants import *
 from tanuki.persistence.filter.bloom_interface import IBloomFilterPersistence
 from tanuki.persistence.filter.filesystem_bloom import BloomFilterFileSystemDriver
 from tanuki.trackers.abc_buffered_logger import ABCBufferedLogger
+from tanuki.trackers.dataset_index import DatasetIndex
 
 
 class FilesystemBufferedLogger(ABCBufferedLogger):
@@ -16,9 +17,11 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
     It includes the logic for a bloom filter, to ensure that we only store unique invocations.
     """
 
-    def __init__(self, name, level=15):
+    def __init__(self, name, level=15, fsync_policy=FSYNC_NEVER):
         self.log_directory = self._get_log_directory()
-        super().__init__(name, level)
+        # the sidecar indexes of the dataset files, by the path of the dataset
+        self.dataset_indexes: Dict[str, DatasetIndex] = {}
+        super().__init__(name, level, fsync_policy=fsync_policy)
 
     def get_bloom_filter_persistence(self) -> IBloomFilterPersistence:
         """
@@ -85,13 +88,9 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
         """
         Get the size of the dataset for a function hash
         """
-        log_directory = self._get_log_directory()
-        dataset_type_map = {"alignments": ALIGN_FILE_EXTENSION,
-                            "positive": POSITIVE_FILE_EXTENSION,
-                            "negative": NEGATIVE_FILE_EXTENSION,
-                            "patches": PATCH_FILE_EXTENSION}
-
-        log_file_path = os.path.join(log_directory, func_hash + dataset_type_map[dataset_type])
+        # the queued datapoints are written first, so that they are included
+        self.flush()
+        log_file_path = self._get_dataset_file_path(dataset_type, func_hash)
         if not os.path.exists(log_file_path):
             if return_type == "both":
                 return 0, None
@@ -100,16 +99,16 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
             elif return_type == "length":
                 return 0
         try:
+            if return_type == "length":
+                # the length is read from the index, without reading the dataset
+                return self.get_dataset_index(log_file_path).refresh()
             with open(log_file_path, "rb") as f:
                 dataset = f.read()
-            dataset_string = repr(dataset)
-            dataset_length = dataset_string.count("\\n") - dataset_string.count("\\\\n")
+            dataset_length = dataset.count(b"\n")
             if return_type == "both":
                 return dataset_length, dataset
             elif return_type == "dataset":
                 return dataset
-            elif return_type == "length":
-                return dataset_length
         except Exception as e:
             if return_type == "both":
                 return 0, None
@@ -118,6 +117,47 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
             elif return_type == "length":
                 return 0
 
+    def get_dataset_index(self, path: str) -> DatasetIndex:
+        """
+        Get the sidecar index of a dataset file.
+        :param path: The path of the dataset file
+        :return: The index, which may not be up to date with the dataset yet
+        """
+        index = self.dataset_indexes.get(path)
+        if index is None:
+            index = self.dataset_indexes.setdefault(path, DatasetIndex(path))
+        return index
+
+    def get_dataset_record(self, dataset_type, func_hash, position: int) -> Optional[bytes]:
+        """
+        Read a single datapoint of a dataset through its index, without reading the rest of the dataset.
+        :param dataset_type: The type of the dataset, e.g. "patches" or "alignments"
+        :param func_hash: The representation of the function
+        :param position: The position of the datapoint in the dataset
+        :return: The serialised datapoint, None if there is no datapoint at the position
+        """
+        self.flush()
+        return self.get_dataset_index(self._get_dataset_file_path(dataset_type, func_hash)).get_record(position)
+
+    def _get_dataset_file_path(self, dataset_type, func_hash) -> str:
+        log_directory = self._get_log_directory()
+        dataset_type_map = {"alignments": ALIGN_FILE_EXTENSION,
+                            "positive": POSITIVE_FILE_EXTENSION,
+                            "negative": NEGATIVE_FILE_EXTENSION,
+                            "patches": PATCH_FILE_EXTENSION}
+
+        return os.path.join(log_directory, func_hash + dataset_type_map[dataset_type])
+
+    def get_dataset_path(self, dataset_type, func_hash) -> Optional[str]:
+        """
+        Get the path of the dataset file for a function hash, None if it does not exist
+        """
+        self.flush()
+        log_file_path = self._get_dataset_file_path(dataset_type, func_hash)
+        if not os.path.exists(log_file_path):
+            return None
+        return log_file_path
+
     def load_existing_datasets(self) -> Dict[str, Dict[str, str]]:
         log_directory = self.log_directory
         dataset_lengths = {
@@ -134,6 +174,8 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
             files = os.listdir(log_directory)
             # discard all .json files
             files = [x for x in files if ".json" not in x]
+            # discard the sidecar indexes of the datasets
+            files = [x for x in files if not x.endswith(DATASET_INDEX_EXTENSION)]
         except Exception as e:
             return dataset_lengths
 
@@ -151,7 +193,8 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
                 dataset_type = NEGATIVE_EMBEDDABLE_ALIGNMENTS
             else:
                 dataset_type = PATCHES
-            func_hash = file.replace(ALIGN_FILE_EXTENSION, "").replace(PATCH_FILE_EXTENSION, "")
+            func_hash = file.replace(ALIGN_FILE_EXTENSION, "").replace(PATCH_FILE_EXTENSION, "") \
+                .replace(POSITIVE_FILE_EXTENSION, "").replace(NEGATIVE_FILE_EXTENSION, "")
             dataset_lengths[dataset_type][func_hash] = -1
         return dataset_lengths
 
@@ -162,6 +205,21 @@ class FilesystemBufferedLogger(ABCBufferedLogger):
         with open(path, mode) as f:
             f.write(data)
 
+    def _append(self, path, data: bytes) -> None:
+        super()._append(path, data)
+        # the index is kept up to date as the datapoints are written, so that reading it only needs a stat
+        try:
+            self.get_dataset_index(path).refresh()
+        except Exception as e:
+            self.warning(f"Could not update the index of {path}: {e}")
+
+    def sync(self, path: str) -> None:
+        """
+        Flush a file to the disk
+        """
+        with open(path, "ab") as f:
+            os.fsync(f.fileno())
+
     def read(self, path: str) -> str:
         """
         Read data from a file
@@ -83,25 +83,28 @@ def get_model(content, logger, func_hash):
         raise ValueError("The input content and align statements combined are too long, please shorten it. The maximum currently allowed token limit is 32000")
     
 
+# the characters which are usually their own tokens, the backslash is counted twice
+COMMON_SPECIAL_CHARACTERS = r"\/(){}[]<>|`~@#$%^&*+=-_:;\""
+_SPECIAL_CHARACTER_BYTES = COMMON_SPECIAL_CHARACTERS.encode("utf-8")
+
+
 def approximate_token_count(content):
     """
     Approximate the token count of input
     Number of tokens is word tokens (nr of words * 1.33) + nr of special characters (which are usually their own tokens)
+    The special characters are counted in one pass over the bytes by deleting them, which is equivalent to counting
+    them one by one as they are ASCII and never part of a multi-byte UTF-8 character
     Args:
         content (str, bytes): the content to be approximated
     Returns:
         number_of_tokens (int): the number of tokens
     """
-    common_special_characters = r"\/(){}[]<>|`~@#$%^&*+=-_:;\""
-    # check if input type is string
     if isinstance(content, str):
-        number_of_word_tokens = int(len(content.split(" "))*1.333)
-        nr_of_special_characters = sum([content.count(char) for char in common_special_characters])
-        return number_of_word_tokens + nr_of_special_characters
-    # check if input is a byte string
-    if isinstance(content, bytes):
-        number_of_word_tokens = int(len(content.split(b" "))*1.333)
-        nr_of_special_characters = sum([content.count(char.encode("utf-8")) for char in common_special_characters])
+        content = content.encode("utf-8", "surrogatepass")
+    if isinstance(content, (bytes, bytearray)):
+        number_of_word_tokens = int((content.count(b" ") + 1)*1.333)
+        nr_of_special_characters = len(content) - len(content.translate(None, _SPECIAL_CHARACTER_BYTES)) \
+                                   + content.count(b"\\")
         return number_of_word_tokens + nr_of_special_characters
 
 
@@ -13,6 +13,8 @@ from typing import get_origin, get_args, Any, Mapping, MutableMapping, OrderedDi
 from pydantic import BaseModel, create_model
 import datetime
 
+from tanuki.output_parser import parse_output, OutputParseError
+
 class Validator:
 
     def __init__(self):
@@ -79,8 +81,8 @@ class Validator:
 
     def validate_output(self, output: str, type_definition: Any) -> bool:
         try:
-            deserialized_output = json.loads(output)
-        except json.JSONDecodeError:
+            deserialized_output = parse_output(output)
+        except OutputParseError:
             return False
 
         return self.check_type(deserialized_output, type_definition)
@@ -244,6 +246,54 @@ class Validator:
 
         return False
 
+    def check_prefix(self, prefix: str, type_definition: Any) -> bool:
+        """
+        Check whether a partial (streamed) output could still be completed into a valid output of the type.
+        Only the start of the output is checked, so this can give false positives but never false negatives.
+
+        Args:
+            prefix: The start of the output text
+            type_definition: The type definition to validate against
+
+        Returns:
+            Whether the output may still be valid
+        """
+        prefix = prefix.lstrip()
+        if not prefix:
+            return True
+
+        if type_definition is Any or type_definition is str:
+            # unparseable outputs are returned as strings
+            return True
+        if type_definition is None or type_definition is type(None):
+            return self._is_prefix_compatible(prefix, ["null", "None"])
+        if type_definition is bool:
+            return self._is_prefix_compatible(prefix, ["true", "false", "True", "False"])
+        if type_definition in (int, float):
+            return prefix[0] in "+-.0123456789"
+
+        origin = get_origin(type_definition) or type_definition
+        args = get_args(type_definition)
+
+        if origin == Literal:
+            forms = []
+            for literal in args:
+                forms.extend([str(literal), json.dumps(literal), repr(literal)])
+            return self._is_prefix_compatible(prefix, forms)
+        if origin == Union:
+            return any(self.check_prefix(prefix, union_type) for union_type in args)
+        if origin in (list, tuple) or self._is_list_like(origin) or self._is_tuple_like(origin):
+            return prefix[0] in "[("
+        if origin in (dict, set) or self._is_dict_like(origin) or self._is_set_like(origin) \
+                or self.is_pydantic_model(origin) or self.is_dataclass_instance(origin):
+            return prefix[0] == "{"
+        return True
+
+    @staticmethod
+    def _is_prefix_compatible(prefix: str, forms: Sequence[str]) -> bool:
+        """Whether the prefix is the start of one of the forms, or starts with one of them."""
+        return any(form.startswith(prefix) or prefix.startswith(form) for form in forms)
+
     @staticmethod
     def is_pydantic_model(cls):
         return hasattr(cls, 'parse_obj')
@@ -0,0 +1,27 @@
+import pytest
+
+import tanuki
+from tanuki.constants import OPENAI_PROVIDER
+
+
+@pytest.fixture
+def fake_api_key(monkeypatch):
+    """
+    A fake OpenAI API key for the duration of the test
+    """
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-fake")
+
+
+@pytest.fixture
+def use_fake_api(monkeypatch, fake_api_key):
+    """
+    Serve the given providers with a fake API for the duration of the test, e.g. use_fake_api(FakeAPI()) or
+    use_fake_api(FakeAPI(), "openai", "together_ai"). The original providers are restored after the test
+    """
+
+    def use(api, *providers):
+        for provider in providers or (OPENAI_PROVIDER,):
+            monkeypatch.setitem(tanuki.api_provider.api_providers, provider, api)
+        return api
+
+    return use
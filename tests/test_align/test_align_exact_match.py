@@ -0,0 +1,73 @@
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.register import Register
+
+
+class Person(BaseModel):
+    name: str
+    age: int
+
+
+class CountingAPI(LLM_API):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        self.calls += 1
+        return "'Bad'"
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+def classify_sentiment_exact(input: str) -> Optional[Literal['Good', 'Bad']]:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+def extract_person_exact(input: str) -> Person:
+    """
+    Extract the person from the input
+    """
+
+
+@tanuki.align
+def align_exact_match():
+    assert classify_sentiment_exact("I love you") == 'Good'
+    assert extract_person_exact("Jack is 30 years old") == Person(name="Jack", age=30)
+
+
+def test_exact_align_match(use_fake_api):
+    align_exact_match()
+    fake_api = use_fake_api(CountingAPI())
+    assert classify_sentiment_exact("I love you") == 'Good'
+    assert extract_person_exact("Jack is 30 years old") == Person(name="Jack", age=30)
+    assert fake_api.calls == 0
+
+    # inputs that do not match exactly are generated by the model
+    assert classify_sentiment_exact("I love you!") == 'Bad'
+    assert fake_api.calls == 1
+
+
+def test_index_from_dataset():
+    func_hash = Register.load_function_plan(classify_sentiment_exact).func_hash
+    function_modeler = tanuki.function_modeler
+    store = function_modeler.symbolic_align_stores[func_hash]
+    index = function_modeler.symbolic_align_index[func_hash]
+    retriever = function_modeler.symbolic_align_retrievers[func_hash]
+    try:
+        function_modeler._load_symbolic_align_store(
+            func_hash,
+            align_dataset=b"{'args': ('I hate you',), 'kwargs': {}, 'output': 'Bad'}\r\n"
+                          b"{\"args\": [\"I like you\"], \"kwargs\": {}, \"output\": \"Good\"}\r\n")
+        assert function_modeler.get_symbolic_align_output(func_hash, ("I hate you",), {}) == (True, 'Bad')
+        assert function_modeler.get_symbolic_align_output(func_hash, ("I like you",), {}) == (True, 'Good')
+        assert function_modeler.get_symbolic_align_output(func_hash, ("I love you",), {}) == (False, None)
+    finally:
+        function_modeler.symbolic_align_stores[func_hash] = store
+        function_modeler.symbolic_align_index[func_hash] = index
+        function_modeler.symbolic_align_retrievers[func_hash] = retriever
@@ -0,0 +1,80 @@
+from typing import Literal
+
+import tanuki
+from tanuki.align_retriever import AlignRetriever
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.register import Register
+
+ANIMALS = ["cat", "dog", "horse", "cow", "sheep", "goat", "duck", "goose", "mouse", "rabbit",
+           "fox", "wolf", "bear", "deer", "eagle", "owl", "frog", "toad", "snake", "lizard",
+           "shark", "whale", "seal", "otter", "crab", "squid", "bee", "ant", "moth", "wasp"]
+
+
+def test_rank_by_relevance():
+    documents = ["the cat sat on the mat", "a dog in the fog", "the cat and the dog", "nothing relevant here"]
+    retriever = AlignRetriever([{"output": i} for i in range(4)], documents)
+    assert sorted(retriever.rank("cat", 2)) == [0, 2]
+    assert retriever.rank("dog fog", 1) == [1]
+    # unknown terms score nothing, so the aligns keep the order they were saved in
+    assert retriever.rank("zebra", 3) == [0, 1, 2]
+    assert len(retriever) == 4
+
+
+def test_rare_terms_weigh_more():
+    documents = ["red apple", "red car", "red house", "green apple"]
+    retriever = AlignRetriever([{}] * 4, documents)
+    scores = retriever.score("red green")
+    assert scores[3] > scores[0]
+
+
+def test_documents_are_indexed_incrementally():
+    documents = ["the cat sat on the mat", "a dog in the fog", "the cat and the dog", "nothing relevant here"]
+    retriever = AlignRetriever([{}] * 4, documents[:2])
+    for document in documents[2:]:
+        retriever.add(document)
+    # the same scores as an index built over all of the documents at once
+    assert retriever.score("the cat dog").tolist() == AlignRetriever([{}] * 4, documents).score("the cat dog").tolist()
+    assert len(retriever) == 4
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+def classify_animal(input: str) -> Literal['Mammal', 'Other']:
+    """
+    Determine if the animal is a mammal
+    """
+
+
+def save_animal_aligns(func_hash):
+    for animal in ANIMALS:
+        tanuki.function_modeler.save_symbolic_align_statements(func_hash, (f"a {animal}",), {}, "Mammal")
+
+
+def test_prompt_has_the_most_relevant_aligns():
+    function_plan = Register.load_function_plan(classify_animal)
+    save_animal_aligns(function_plan.func_hash)
+    prompt, model, _, _ = tanuki.language_modeler.get_generation_case(("a wolf",), {}, function_plan, {},
+                                                                      function_plan.func_hash)
+    assert "Args: ('a wolf',)" in prompt.split("---")[0]
+    assert prompt.count("Inputs:") == tanuki.language_modeler.align_retrieval_k + 1
+    # the aligns are indexed as they are saved, without rebuilding the index
+    retriever = tanuki.function_modeler.get_symbolic_align_retriever(function_plan.func_hash)
+    tanuki.function_modeler.save_symbolic_align_statements(function_plan.func_hash, ("a lynx",), {}, "Mammal")
+    assert tanuki.function_modeler.get_symbolic_align_retriever(function_plan.func_hash) is retriever
+    assert retriever.rank("lynx", 1) == [len(retriever) - 1]
+
+
+def test_aligns_are_packed_into_the_model_context():
+    function_plan = Register.load_function_plan(classify_animal)
+    language_modeler = tanuki.language_modeler
+    small_model = OpenAIConfig(model_name="small", context_length=language_modeler.default_generation_length + 400)
+    _, input_token_count = language_modeler.suitable_for_finetuning_token_check(("a wolf",), {},
+                                                                                function_plan.description_string,
+                                                                                small_model)
+    retriever = tanuki.function_modeler.get_symbolic_align_retriever(function_plan.func_hash)
+    prompt, model = language_modeler._get_retrieval_generation_case(("a wolf",), {}, function_plan, [small_model],
+                                                                    {}, input_token_count, retriever)
+    assert model is small_model
+    nr_of_examples = prompt.count("Inputs:") - 1
+    assert 0 < nr_of_examples < language_modeler.align_retrieval_k
+    # the most relevant align comes first
+    assert "Args: ('a wolf',)" in prompt.split("Inputs:")[1]
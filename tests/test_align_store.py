@@ -0,0 +1,106 @@
+from typing import Literal
+
+import tanuki
+import tanuki.align_store as align_store
+from tanuki.align_store import AlignStore, AlignCache
+from tanuki.register import Register
+
+
+def test_store_parses_and_deduplicates():
+    store = AlignStore([b"{'args': ('a',), 'kwargs': {}, 'output': 1}\r",
+                        b"",
+                        b"{'args': ('a',), 'kwargs': {}, 'output': 1}",
+                        b"not an align",
+                        b'{"args": ["b"], "kwargs": {}, "output": 2}'])
+    assert store.get() == [{"args": ("a",), "kwargs": {}, "output": 1}, {"args": ["b"], "kwargs": {}, "output": 2}]
+    assert store.add(b"{'args': ('a',), 'kwargs': {}, 'output': 1}") is None
+    assert store.add(b"{'args': ('c',), 'kwargs': {}, 'output': 3}") == {"args": ("c",), "kwargs": {}, "output": 3}
+    assert len(store) == 3
+
+
+def test_store_from_file(tmp_path):
+    path = tmp_path / "aligns"
+    path.write_bytes(b"{'args': ('a',), 'kwargs': {}, 'output': 1}\r\n"
+                     b"\n"
+                     b"{'args': ('a',), 'kwargs': {}, 'output': 1}\n"
+                     b"not an align\n"
+                     b'  {"args": ["b"], "kwargs": {}, "output": 2}')
+    added = []
+    store = AlignStore.from_file(str(path), on_add=lambda position, example: added.append((position, example)))
+    assert store.mapped_line_count == 4
+    assert added == [(0, {"args": ("a",), "kwargs": {}, "output": 1}), (1, {"args": ["b"], "kwargs": {}, "output": 2})]
+    assert store.get() == [example for _, example in added]
+    assert store.add(b'{"args": ["b"], "kwargs": {}, "output": 2}') is None
+    assert store.add(b"{'args': ('c',), 'kwargs': {}, 'output': 3}") is not None
+    assert [example["output"] for example in store] == [1, 2, 3]
+
+    empty_path = tmp_path / "empty"
+    empty_path.write_bytes(b"")
+    empty_store = AlignStore.from_file(str(empty_path))
+    assert len(empty_store) == 0 and empty_store.mapped_line_count == 0
+
+
+def test_cache_is_bounded(tmp_path, monkeypatch):
+    lines = [f"{{'args': ('{i}',), 'kwargs': {{}}, 'output': {i}}}".encode("utf-8") for i in range(10)]
+    path = tmp_path / "aligns"
+    path.write_bytes(b"\n".join(lines))
+    align_cache = AlignCache(max_size=len(lines[0]) * 3)
+    store = AlignStore.from_file(str(path), align_cache=align_cache)
+    assert align_cache.size == 0
+
+    parsed = []
+
+    def counting_parse_output(text):
+        parsed.append(text)
+        return original_parse_output(text)
+
+    original_parse_output = align_store.parse_output
+    monkeypatch.setattr(align_store, "parse_output", counting_parse_output)
+    assert [example["output"] for example in store] == list(range(10))
+    assert len(parsed) == 10
+    assert align_cache.size <= align_cache.max_size
+    # the most recently used statements stay materialised
+    assert store[9]["output"] == 9
+    assert len(parsed) == 10
+    assert store[0]["output"] == 0
+    assert len(parsed) == 11
+
+    align_cache.set_max_size(0)
+    assert align_cache.size == 0
+
+
+def test_store_limits():
+    store = AlignStore([f"{{'args': ('{i}',), 'kwargs': {{}}, 'output': {i}}}".encode("utf-8") for i in range(10)])
+    assert [example["output"] for example in store.get(max=3)] == [0, 1, 2]
+    token_count = store.token_counts[0]
+    assert len(store.get(token_limit=token_count * 4)) == 4
+    assert store.get(max=2, token_limit=token_count * 4) == store.get(max=2)
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+def classify_store(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+def test_aligns_are_parsed_once(monkeypatch):
+    parsed = []
+
+    def counting_parse_output(text):
+        parsed.append(text)
+        return original_parse_output(text)
+
+    original_parse_output = align_store.parse_output
+    monkeypatch.setattr(align_store, "parse_output", counting_parse_output)
+    func_hash = Register.load_function_plan(classify_store).func_hash
+    function_modeler = tanuki.function_modeler
+    function_modeler.save_symbolic_align_statements(func_hash, ("I love you",), {}, "Good")
+    function_modeler.save_symbolic_align_statements(func_hash, ("I hate you",), {}, "Bad")
+    assert len(parsed) == 2
+
+    for _ in range(3):
+        aligns = function_modeler.get_symbolic_alignments(func_hash, max=16)
+        assert [align["output"] for align in aligns] == ["Good", "Bad"]
+    assert len(parsed) == 2
+
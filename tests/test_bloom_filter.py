@@ -1,12 +1,17 @@
 import os
+import subprocess
+import sys
 
 from bitarray import bitarray
 
-from tanuki.bloom_filter import BloomFilter
+from tanuki.bloom_filter import BloomFilter, ScalableBloomFilter, PartitionedBloomFilter
 from tanuki.models.function_example import FunctionExample
+from tanuki.persistence.filter.bloom_interface import IBloomFilterPersistence
+from tanuki.persistence.filter.filesystem_bloom import BloomFilterFileSystemDriver
 import random
 import string
 
+from tanuki.constants import BLOOM_FILTER_HASH_VERSION
 from tanuki.trackers.abc_buffered_logger import EXPECTED_ITEMS, FALSE_POSITIVE_RATE
 from tanuki.trackers.filesystem_buffered_logger import FilesystemBufferedLogger
 
@@ -213,6 +218,182 @@ def test_multiple_loggers():
     assert nr_of_errors/nr_of_calls <= 0.2
 
 
+def test_add_many_lookup_many():
+    bf = BloomFilter(
+        bloom_filter_persistence,
+        expected_number_of_elements=EXPECTED_ITEMS,
+        false_positive_probability=FALSE_POSITIVE_RATE)
+    items = [f"test_{i}" for i in range(2000)]
+    # later duplicates in the batch are not new
+    assert bf.add_many(items[:1000] + items[:10]) == [True] * 1000 + [False] * 10
+    for item in items[1000:1500]:
+        bf.add(item)
+    # the batch and single item apis set and check the same bits
+    assert all(bf.lookup(item) for item in items[:1000])
+    assert all(bf.lookup_many(items[:1500]))
+    assert sum(bf.lookup_many(items[1500:])) <= 0.05 * 500
+    assert bf.get_indices_many(items[:10]).tolist() == [bf.get_indices(item) for item in items[:10]]
+    assert bf.add_many([]) == [] and bf.lookup_many([]) == []
+
+
+def test_shared_between_processes(tmp_path):
+    persistence = BloomFilterFileSystemDriver(log_directory=str(tmp_path))
+    bf1 = BloomFilter(persistence, expected_number_of_elements=EXPECTED_ITEMS, false_positive_probability=FALSE_POSITIVE_RATE)
+    bf1.load()
+    bf1.add("parent")
+    # the bits set by another process are visible without saving or loading
+    subprocess.run([sys.executable, "-c", f"""
+from tanuki.bloom_filter import BloomFilter
+from tanuki.persistence.filter.bloom_interface import IBloomFilterPersistence
+from tanuki.persistence.filter.filesystem_bloom import BloomFilterFileSystemDriver
+bf = BloomFilter(BloomFilterFileSystemDriver(log_directory={str(tmp_path)!r}),
+                 expected_number_of_elements={EXPECTED_ITEMS}, false_positive_probability={FALSE_POSITIVE_RATE})
+bf.load()
+assert bf.lookup("parent")
+bf.add("child")
+"""], check=True)
+    assert bf1.lookup("child")
+    assert os.path.getsize(tmp_path / "bloom_filter_state.bin") == len(bf1.bit_array) // 8
+
+    # saving a memory mapped filter does not rewrite the state file
+    def rewrite(bit_array):
+        raise AssertionError("The state file was rewritten")
+
+    persistence.save = rewrite
+    bf1.save()
+    bf1.sync()
+
+
+def test_scalable_bloom_filter_grows(tmp_path):
+    persistence = BloomFilterFileSystemDriver(log_directory=str(tmp_path))
+    bf = ScalableBloomFilter(persistence, initial_capacity=100, false_positive_probability=0.01)
+    bf.load()
+    items = [f"item_{i}" for i in range(1200)]
+    assert bf.add_many(items[:500]) == [True] * 500
+    for item in items[500:900]:
+        bf.add(item)
+    # the slices hold 100 + 200 + 400 strings, give or take the estimates of the slice counts
+    assert bf.capacities[:4] == [100, 200, 400, 800]
+    assert all(bf.lookup_many(items[:900]))
+    assert sum(bf.lookup_many(items[900:])) <= 0.05 * 300
+    assert len(persistence.load_metadata()["slices"]) == len(bf.slices)
+
+    # another process sees the slices and their bits, and adds to the same last slice
+    other = ScalableBloomFilter(persistence, initial_capacity=100, false_positive_probability=0.01)
+    other.load()
+    assert len(other.slices) == len(bf.slices)
+    assert all(other.lookup(item) for item in items[:900])
+    other.add("from another process")
+    assert bf.lookup("from another process")
+
+
+def test_partitioned_bloom_filter(tmp_path):
+    persistence = BloomFilterFileSystemDriver(log_directory=str(tmp_path))
+    bf = PartitionedBloomFilter(persistence, initial_capacity=10)
+    bf.load()
+    assert bf.add_many([f"small_{i}" for i in range(5)] + [f"large_{i}" for i in range(200)]) == [True] * 205
+    bf.add("small_5")
+    # every partition grows with its own number of strings
+    assert len(bf.get_partition("small").slices) == 1
+    assert len(bf.get_partition("large").slices) > 1
+    assert bf.lookup("small_5") and bf.lookup("large_199")
+    assert bf.lookup_many(["small_0", "large_0"]) == [True, True]
+    assert os.path.isdir(tmp_path / "small" / "0") and os.path.isdir(tmp_path / "large" / "1")
+
+    # a filter which is not loaded starts empty and is persisted when saved
+    in_memory = PartitionedBloomFilter(persistence, initial_capacity=10)
+    assert not in_memory.lookup("small_0")
+    in_memory.add("other_0")
+    in_memory.save()
+    bf.load()
+    assert bf.lookup("other_0")
+
+
+class InMemoryPersistence(IBloomFilterPersistence):
+    def __init__(self):
+        self.bit_array = None
+
+    def save(self, bit_array: bitarray) -> None:
+        self.bit_array = bit_array.copy()
+
+    def load(self) -> bitarray:
+        if self.bit_array is None:
+            raise FileNotFoundError()
+        return self.bit_array.copy()
+
+
+def test_persistence_without_partitions(tmp_path, monkeypatch):
+    monkeypatch.setenv("TANUKI_LOG_DIR", str(tmp_path))
+    persistence = InMemoryPersistence()
+    monkeypatch.setattr(FilesystemBufferedLogger, "get_bloom_filter_persistence", lambda self: persistence)
+    # a custom persistence which does not implement partitions keeps a single filter
+    logger = FilesystemBufferedLogger("test")
+    assert isinstance(logger.bloom_filter, BloomFilter)
+    example = FunctionExample((1,), {}, 1)
+    assert logger.log_symbolic_patch("fn", example) == {"fn": 1}
+    assert logger.log_symbolic_patch("fn", example) == {}
+    logger.flush()
+    assert persistence.bit_array is not None
+    assert FilesystemBufferedLogger("test").log_symbolic_patch("fn", example) == {}
+    logger.writer.close()
+
+
+class InMemoryPersistenceWithMetadata(InMemoryPersistence):
+    def __init__(self):
+        super().__init__()
+        self.metadata = None
+
+    def save_metadata(self, metadata: dict) -> None:
+        self.metadata = metadata
+
+    def load_metadata(self):
+        return self.metadata
+
+
+def test_state_of_another_hash_version_is_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setenv("TANUKI_LOG_DIR", str(tmp_path))
+    log_directory = tmp_path / "functions"
+    log_directory.mkdir()
+    logged = FunctionExample((1,), {}, 1)
+    with open(log_directory / "fn.patches", "w") as f:
+        f.write(str(logged.__dict__) + "\n")
+    persistence = InMemoryPersistenceWithMetadata()
+    size, _ = BloomFilter.optimal_bloom_filter_params(EXPECTED_ITEMS, FALSE_POSITIVE_RATE)
+    # a state saved without a hash version, whose bits were set with other hashes
+    persistence.bit_array = bitarray(size + (-size) % 8)
+    persistence.bit_array.setall(1)
+    monkeypatch.setattr(FilesystemBufferedLogger, "get_bloom_filter_persistence", lambda self: persistence)
+
+    logger = FilesystemBufferedLogger("test")
+    assert persistence.metadata == {"hash_version": BLOOM_FILTER_HASH_VERSION}
+    # the old bits are cleared and the datapoints of the datasets are added again
+    assert logger.log_symbolic_patch("fn", logged) == {}
+    assert logger.log_symbolic_patch("fn", FunctionExample((2,), {}, 2)) == {"fn": 1}
+    logger.writer.close()
+
+
+def test_partitions_are_seeded_from_the_datasets(tmp_path, monkeypatch):
+    monkeypatch.setenv("TANUKI_LOG_DIR", str(tmp_path))
+    log_directory = tmp_path / "functions"
+    log_directory.mkdir()
+    logged = FunctionExample((1,), {}, 1)
+    with open(log_directory / "fn.patches", "w") as f:
+        f.write(str(logged.__dict__) + "\n")
+    with open(log_directory / "fn.positive", "w") as f:
+        f.write(str(FunctionExample((2,), {}, 2).__dict__) + "\n")
+    # the single bloom filter state of earlier versions
+    with open(log_directory / "bloom_filter_state.bin", "wb") as f:
+        f.write(bytes(16))
+
+    logger = FilesystemBufferedLogger("test")
+    # the datapoints of the datasets are not logged again
+    assert logger.log_symbolic_patch("fn", logged) == {}
+    assert logger.log_embeddable_align("fn", FunctionExample((2,), {}, 2)) == (False, False)
+    assert logger.log_symbolic_patch("fn", FunctionExample((3,), {}, 3)) == {"fn": 1}
+    logger.writer.close()
+    assert os.path.exists(log_directory / "bloom_filters" / "bloom_filter_metadata.json")
+
+
 if __name__ == "__main__":
     test_bit_array_length()
     test_file_content_consistency()
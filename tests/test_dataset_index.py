@@ -0,0 +1,84 @@
+import os
+
+from tanuki.models.function_example import FunctionExample
+from tanuki.trackers.dataset_index import DatasetIndex
+from tanuki.trackers.filesystem_buffered_logger import FilesystemBufferedLogger
+
+
+def test_count_and_records(tmp_path):
+    path = str(tmp_path / "fn.patches")
+    index = DatasetIndex(path)
+    assert index.refresh() == 0
+    with open(path, "wb") as f:
+        f.write(b"a\nbb\\n\n")
+    assert index.refresh() == 2
+    assert index.get_record(0) == b"a\n"
+    assert index.get_record(1) == b"bb\\n\n"
+    assert index.get_record(-1) == b"bb\\n\n"
+    assert index.get_record(2) is None
+    assert os.path.exists(path + ".index")
+
+
+def test_appended_records_are_indexed(tmp_path):
+    path = str(tmp_path / "fn.patches")
+    with open(path, "wb") as f:
+        f.write(b"a\nb")
+    index = DatasetIndex(path)
+    # the record which is still being written is indexed once it is complete
+    assert index.refresh() == 1
+    with open(path, "ab") as f:
+        f.write(b"c\nd\n")
+    assert index.refresh() == 3
+    assert index.get_record(1) == b"bc\n"
+    # another index of the same dataset reads the sidecar instead of the dataset
+    assert DatasetIndex(path).refresh() == 3
+
+
+def test_rewritten_dataset_is_reindexed(tmp_path):
+    path = str(tmp_path / "fn.patches")
+    with open(path, "wb") as f:
+        f.write(b"a\nb\nc\n")
+    index = DatasetIndex(path)
+    assert index.refresh() == 3
+    with open(path, "wb") as f:
+        f.write(b"xy\n")
+    assert index.refresh() == 1
+    assert index.get_record(0) == b"xy\n"
+    with open(path + ".index", "wb") as f:
+        f.write(b"corrupt")
+    assert DatasetIndex(path).refresh() == 1
+
+
+def test_larger_rewrite_is_reindexed(tmp_path):
+    path = str(tmp_path / "fn.patches")
+    with open(path, "wb") as f:
+        f.write(b"a\nb\n")
+    index = DatasetIndex(path)
+    assert index.refresh() == 2
+    # rewritten in place with more data, which is not an append of the indexed data
+    with open(path, "wb") as f:
+        f.write(b"xyz\nw\nv\n")
+    assert index.refresh() == 3
+    assert index.get_record(0) == b"xyz\n"
+    # replaced by another file which starts with the indexed data
+    replacement = str(tmp_path / "replacement")
+    with open(replacement, "wb") as f:
+        f.write(b"xyz\nw\nv\nu\n")
+    os.replace(replacement, path)
+    assert DatasetIndex(path).refresh() == 4
+    assert index.refresh() == 4
+    assert index.get_record(-1) == b"u\n"
+
+
+def test_logger_uses_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("TANUKI_LOG_DIR", str(tmp_path))
+    logger = FilesystemBufferedLogger("test")
+    for i in range(3):
+        logger.log_symbolic_patch("fn", FunctionExample((i,), {}, i))
+    assert logger.load_dataset("patches", "fn", return_type="length") == 3
+    assert logger.load_dataset("patches", "fn", return_type="both")[0] == 3
+    assert b"2" in logger.get_dataset_record("patches", "fn", 2)
+    assert logger.get_dataset_record("patches", "fn", 3) is None
+    # the sidecar index is not a dataset
+    assert list(logger.load_existing_datasets()["patches"]) == ["fn"]
+    logger.writer.close()
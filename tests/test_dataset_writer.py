@@ -0,0 +1,186 @@
+import signal
+import threading
+
+import pytest
+
+import tanuki
+from tanuki.trackers import dataset_writer
+from tanuki.function_modeler import FunctionModeler
+from tanuki.models.api_manager import APIManager
+from tanuki.models.function_config import FunctionConfig
+from tanuki.models.function_example import FunctionExample
+from tanuki.trackers.dataset_writer import DatasetWriter
+from tanuki.trackers.filesystem_buffered_logger import FilesystemBufferedLogger
+
+
+class RecordingFiles(object):
+    def __init__(self):
+        self.writes = []
+        self.syncs = []
+        self.on_write_calls = 0
+
+    def write(self, path, data):
+        self.writes.append((path, data))
+
+    def sync(self, path):
+        self.syncs.append(path)
+
+    def on_write(self):
+        self.on_write_calls += 1
+
+
+def test_group_commit():
+    files = RecordingFiles()
+    writer = DatasetWriter(files.write, files.sync, files.on_write, interval=60)
+    for i in range(3):
+        writer.put("a", f"{i}\n".encode("utf-8"), "fn_a")
+    writer.put("b", b"x\n", "fn_b")
+    assert writer.flush() == {"fn_a": 3, "fn_b": 1}
+    # the datapoints of a file are appended in a single write, and the callback is called once per group commit
+    assert sorted(files.writes) == [("a", b"0\n1\n2\n"), ("b", b"x\n")]
+    assert files.on_write_calls == 1
+    assert files.syncs == []
+    assert writer.flush() == {}
+    writer.close()
+
+
+def test_batch_size_and_interval():
+    files = RecordingFiles()
+    writer = DatasetWriter(files.write, interval=60, batch_size=4)
+    writer.put("a", b"12\n")
+    writer.put("a", b"34\n")
+    assert writer.flush() == {}
+    assert files.writes == [("a", b"12\n34\n")]
+    writer.close()
+
+    written = threading.Event()
+    writer = DatasetWriter(lambda path, data: written.set(), interval=0.01)
+    writer.put("a", b"1\n")
+    assert written.wait(5)
+    writer.close()
+
+
+def test_call_after_write():
+    files = RecordingFiles()
+    writer = DatasetWriter(files.write, interval=60)
+    called = []
+    # nothing is queued, so the callback is called straight away
+    writer.call_after_write(lambda: called.append(len(files.writes)))
+    assert called == [0]
+    writer.put("a", b"1\n")
+    done = threading.Event()
+    writer.call_after_write(lambda: (called.append(len(files.writes)), done.set()))
+    # the callback waits for the group commit of the datapoint
+    assert not done.wait(0.2)
+    writer.flush()
+    assert done.wait(5)
+    assert called == [0, 1]
+    writer.close()
+
+
+@pytest.mark.parametrize("fsync_policy, expected_syncs", [("never", []), ("write", ["a", "a"]), ("close", ["a"])])
+def test_fsync_policies(fsync_policy, expected_syncs):
+    files = RecordingFiles()
+    writer = DatasetWriter(files.write, files.sync, fsync_policy=fsync_policy, interval=60)
+    writer.put("a", b"1\n")
+    writer.flush()
+    writer.put("a", b"2\n")
+    writer.close()
+    assert files.writes == [("a", b"1\n"), ("a", b"2\n")]
+    assert files.syncs == expected_syncs
+
+
+def test_close_writes_synchronously():
+    files = RecordingFiles()
+    writer = DatasetWriter(files.write, interval=60)
+    writer.put("a", b"1\n")
+    writer.close()
+    assert files.writes == [("a", b"1\n")]
+    writer.put("a", b"2\n")
+    assert files.writes == [("a", b"1\n"), ("a", b"2\n")]
+    with pytest.raises(ValueError):
+        DatasetWriter(files.write, fsync_policy="sometimes")
+
+
+def test_back_pressure():
+    release = threading.Event()
+    files = RecordingFiles()
+
+    def slow_write(path, data):
+        release.wait(5)
+        files.write(path, data)
+
+    writer = DatasetWriter(slow_write, max_queue_size=1, batch_size=1, interval=60)
+    writer.put("a", b"1\n")
+    blocked = threading.Event()
+
+    def put_many():
+        for i in range(2, 5):
+            writer.put("a", f"{i}\n".encode("utf-8"))
+        blocked.set()
+
+    thread = threading.Thread(target=put_many)
+    thread.start()
+    # the queue holds one datapoint while the first one is being written, so the producer waits
+    assert not blocked.wait(0.2)
+    release.set()
+    thread.join(5)
+    assert blocked.is_set()
+    writer.close()
+    assert b"".join(data for _, data in files.writes) == b"1\n2\n3\n4\n"
+
+
+def test_logger_writes_in_background(tmp_path, monkeypatch):
+    monkeypatch.setenv("TANUKI_LOG_DIR", str(tmp_path))
+    logger = FilesystemBufferedLogger("test")
+    logger.writer.interval = 60
+    for i in range(3):
+        assert logger.log_symbolic_patch("fn", FunctionExample((i,), {}, i)) == {"fn": 1}
+    # the datapoint is already in the bloom filter, so it is not queued again
+    assert logger.log_symbolic_patch("fn", FunctionExample((0,), {}, 0)) == {}
+    assert logger.load_dataset("patches", "fn", return_type="length") == 3
+
+    assert logger.log_symbolic_align("fn", FunctionExample(("a",), {}, 0)) == (True, True)
+    assert logger.get_dataset_path("alignments", "fn") is not None
+    # a new logger sees the bloom filter of the datapoints which are still queued by the other loggers
+    assert logger.log_symbolic_patch("fn", FunctionExample((3,), {}, 3)) == {"fn": 1}
+    assert FilesystemBufferedLogger("test").log_symbolic_patch("fn", FunctionExample((3,), {}, 3)) == {}
+    logger.writer.close()
+
+
+def test_config_is_saved_with_the_group_commit(tmp_path, monkeypatch):
+    monkeypatch.setenv("TANUKI_LOG_DIR", str(tmp_path))
+    logger = FilesystemBufferedLogger("test")
+    logger.writer.interval = 60
+    function_modeler = FunctionModeler(data_worker=logger, api_provider=APIManager())
+    function_modeler.function_configs["fn"] = FunctionConfig()
+    function_modeler.execute_finetune_blacklist.append("fn")
+    saved = []
+    monkeypatch.setattr(logger, "update_function_config",
+                        lambda func_hash, config: saved.append(threading.current_thread().name))
+    for i in range(3):
+        function_modeler.postprocess_symbolic_datapoint("fn", None, FunctionExample((i,), {}, i))
+    # the calls only queue the datapoints, the config is saved by the writer once they are written
+    assert saved == []
+    assert function_modeler.dataset_sizes["patches"]["fn"] == 3
+    logger.flush()
+    assert saved == ["tanuki-dataset-writer"]
+    logger.writer.close()
+
+
+def test_shutdown_flush_is_opt_in(monkeypatch):
+    # creating writers, as importing tanuki does, keeps the SIGTERM handler of the process
+    DatasetWriter(RecordingFiles().write).close()
+    assert signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+
+    monkeypatch.setattr(dataset_writer, "_sigterm_handler_installed", False)
+    try:
+        assert tanuki.install_shutdown_flush()
+        assert signal.getsignal(signal.SIGTERM) == dataset_writer._handle_sigterm
+        assert tanuki.install_shutdown_flush()
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # the handler of the application is kept
+    monkeypatch.setattr(dataset_writer, "_sigterm_handler_installed", False)
+    monkeypatch.setattr(signal, "getsignal", lambda signum: signal.SIG_IGN)
+    assert not tanuki.install_shutdown_flush()
@@ -0,0 +1,30 @@
+from typing import List
+
+from tanuki.models.function_plan import FunctionPlan, as_function_plan
+from tanuki.register import Register
+
+
+def dummy_func(input: str) -> List[str]:
+    """
+    Below you will find an article with stocks analysis. Bring out the stock symbols of companies who are expected to go up or have positive sentiment
+    """
+
+
+def test_plan_matches_description():
+    function_description = Register.load_function_description(dummy_func)
+    plan = Register.load_function_plan(dummy_func)
+
+    assert plan.func_hash == function_description.__hash__()
+    assert plan.finetune_hash == function_description.__hash__(purpose="finetune")
+    assert plan.description_string == str(function_description.__dict__.__repr__())
+    assert plan.output_type_hint == List[str]
+    assert plan.name == "dummy_func"
+    assert not plan.is_embeddable
+
+
+def test_as_function_plan():
+    function_description = Register.load_function_description(dummy_func)
+    plan = as_function_plan(function_description)
+    assert isinstance(plan, FunctionPlan)
+    # an existing plan is reused as is
+    assert as_function_plan(plan) is plan
@@ -0,0 +1,167 @@
+import json
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Literal, Optional, Tuple
+
+import pytest
+from pydantic import BaseModel
+
+import tanuki
+import tanuki.language_models.openai_api as openai_api
+from tanuki.json_schema import compile_json_schema, is_strict_schema, unwrap_structured_output
+from tanuki.language_models.openai_api import OpenAI_API
+from tanuki.register import Register
+
+
+class Person(BaseModel):
+    name: str
+    age: int
+    nickname: Optional[str] = None
+
+
+@dataclass
+class Point:
+    x: float
+    y: float
+
+
+def test_compile_base_types():
+    assert compile_json_schema(str) == {"type": "string"}
+    assert compile_json_schema(Optional[int]) == {"anyOf": [{"type": "integer"}, {"type": "null"}]}
+    assert compile_json_schema(Literal["Good", "Bad"]) == {"enum": ["Good", "Bad"]}
+    assert compile_json_schema(List[bool]) == {"type": "array", "items": {"type": "boolean"}}
+    assert compile_json_schema(Dict[str, float]) == {"type": "object", "additionalProperties": {"type": "number"}}
+
+
+def test_compile_classes():
+    person_schema = compile_json_schema(Person)
+    assert person_schema["properties"]["nickname"] == {"anyOf": [{"type": "string"}, {"type": "null"}]}
+    assert person_schema["required"] == ["name", "age"]
+    assert not is_strict_schema(person_schema)
+
+    point_schema = compile_json_schema(List[Point])
+    assert point_schema["items"]["required"] == ["x", "y"]
+    assert is_strict_schema(point_schema)
+
+
+def test_compile_pydantic_v1_models():
+    pydantic_v1 = pytest.importorskip("pydantic.v1")
+
+    class LegacyPerson(pydantic_v1.BaseModel):
+        name: str
+        nickname: Optional[str] = None
+
+    schema = compile_json_schema(LegacyPerson)
+    assert schema["properties"] == {"name": {"type": "string"},
+                                    "nickname": {"anyOf": [{"type": "string"}, {"type": "null"}]}}
+    assert schema["required"] == ["name"]
+
+
+def test_unsupported_types():
+    # these outputs are not plain JSON, so the validator would reject the structured output
+    assert compile_json_schema(Tuple[int, int]) is None
+    assert compile_json_schema(Dict[int, str]) is None
+    assert compile_json_schema(Optional[set]) is None
+
+
+@dataclass
+class Order:
+    customer: "Customer"
+    total: float
+
+
+# the output type refers to a class which is only defined after the function is patched
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, structured_output=True)
+def extract_order(input: str) -> Order:
+    """
+    Extract the order in the input
+    """
+
+
+@dataclass
+class Customer:
+    name: str
+
+
+def test_forward_references():
+    function_plan = Register.load_function_plan(extract_order)
+    # the schema is compiled when it is first used, once the forward reference can be resolved
+    assert "output_schema" not in function_plan.__dict__
+    assert function_plan.output_schema["properties"]["customer"]["properties"]["name"] == {"type": "string"}
+
+    @dataclass
+    class Unresolved:
+        missing: "Undefined"
+
+    assert compile_json_schema(Unresolved) is None
+
+
+def test_unwrap_structured_output():
+    assert unwrap_structured_output('{"output": ["a", "b"]}') == '["a", "b"]'
+    assert unwrap_structured_output('Good') == 'Good'
+
+
+class StructuredOutputHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StructuredOutputHandler.requests.append(request)
+        people = [{"name": "Ada", "age": 36, "nickname": None}]
+        content = json.dumps({"output": people} if "response_format" in request else people)
+        body = json.dumps({"choices": [{"message": {"content": content}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, structured_output=True,
+              teacher_models=["gpt-4o"])
+def extract_people(input: str) -> List[Person]:
+    """
+    Extract the people in the input
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, structured_output=True,
+              teacher_models=["gpt-4"])
+def list_people(input: str) -> List[Person]:
+    """
+    List the people in the input
+    """
+
+
+@pytest.fixture
+def structured_output_server(monkeypatch, use_fake_api):
+    StructuredOutputHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StructuredOutputHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(openai_api, "OPENAI_URL", f"http://127.0.0.1:{server.server_address[1]}/")
+    api = use_fake_api(OpenAI_API())
+    yield StructuredOutputHandler.requests
+    api.transport.close()
+    server.shutdown()
+
+
+def test_structured_output_request(structured_output_server):
+    assert extract_people("Ada is 36") == [Person(name="Ada", age=36)]
+
+    response_format = structured_output_server[0]["response_format"]
+    assert response_format["type"] == "json_schema"
+    # the optional nickname is not required, which strict mode does not allow
+    assert not response_format["json_schema"]["strict"]
+    output_schema = response_format["json_schema"]["schema"]["properties"]["output"]
+    assert output_schema == compile_json_schema(List[Person])
+
+
+def test_structured_output_is_per_model(structured_output_server):
+    # gpt-4 does not support structured output, so it is generated as usual
+    assert list_people("Ada is 36") == [Person(name="Ada", age=36)]
+    assert "response_format" not in structured_output_server[0]
@@ -0,0 +1,37 @@
+from unittest.mock import Mock
+
+import pytest
+
+botocore = pytest.importorskip("botocore")
+
+from tanuki.language_models.aws_bedrock_api import Bedrock_API
+from tanuki.language_models.llm_configs.llama_config import LlamaBedrockConfig
+from tanuki.language_models.retry_policy import RetryPolicy, FatalRequestError, ProviderUnavailableError
+
+
+def get_api(error):
+    api = Bedrock_API()
+    api.retry_policy = RetryPolicy(max_retries=2, base_delay=0.001)
+    api.bedrock_runtime = Mock()
+    api.bedrock_runtime.invoke_model.side_effect = error
+    return api
+
+
+@pytest.mark.parametrize("error", [botocore.exceptions.EndpointConnectionError(endpoint_url="https://bedrock"),
+                                   botocore.exceptions.ConnectTimeoutError(endpoint_url="https://bedrock"),
+                                   botocore.exceptions.ReadTimeoutError(endpoint_url="https://bedrock")])
+def test_connection_errors_are_retried(error):
+    api = get_api(error)
+    with pytest.raises(ProviderUnavailableError):
+        api.send_api_request(LlamaBedrockConfig(model_name="llama", context_length=4096), "{}")
+    assert api.bedrock_runtime.invoke_model.call_count == 3
+
+
+@pytest.mark.parametrize("error", [botocore.exceptions.NoCredentialsError(),
+                                   botocore.exceptions.PartialCredentialsError(provider="env", cred_var="secret"),
+                                   botocore.exceptions.ParamValidationError(report="invalid body")])
+def test_other_client_errors_are_fatal(error):
+    api = get_api(error)
+    with pytest.raises(FatalRequestError):
+        api.send_api_request(LlamaBedrockConfig(model_name="llama", context_length=4096), "{}")
+    assert api.bedrock_runtime.invoke_model.call_count == 1
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tanuki.language_models.http_transport import HTTPTransport
+from tanuki.models.api_manager import APIManager
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    client_ports = []
+
+    def do_POST(self):
+        EchoHandler.client_ports.append(self.client_address[1])
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        response = json.dumps({"echo": json.loads(body)}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    EchoHandler.client_ports = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def test_connections_are_reused():
+    server, url = start_server()
+    transport = HTTPTransport(pool_maxsize=2)
+    try:
+        for i in range(3):
+            response = transport.post(url, headers={}, json={"i": i})
+            assert response.json() == {"echo": {"i": i}}
+        # all the requests were sent over one kept-alive connection
+        assert len(set(EchoHandler.client_ports)) == 1
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_async_connections_are_reused():
+    server, url = start_server()
+    transport = HTTPTransport()
+
+    async def post_all():
+        return [(await transport.apost(url, headers={}, json={"i": i})).json() for i in range(3)]
+
+    try:
+        assert asyncio.run(post_all()) == [{"echo": {"i": i}} for i in range(3)]
+        assert len(set(EchoHandler.client_ports)) == 1
+    finally:
+        server.shutdown()
+
+
+def test_transport_is_shared_between_providers():
+    api_manager = APIManager()
+    transport = api_manager.get_transport()
+    assert api_manager.get_transport() is transport
+
+    api_manager.configure_transport(pool_maxsize=4, read_timeout=5)
+    assert api_manager.transport is not transport
+    assert api_manager.transport.pool_maxsize == 4
+    assert api_manager.transport.read_timeout == 5
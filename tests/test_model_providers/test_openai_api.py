@@ -20,7 +20,7 @@ class TestOpenAI_API(unittest.TestCase):
         with self.assertRaises(ValueError):
             api.generate(OpenAIConfig(model_name="test_model", context_length=112), "system_message", "prompt")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     @patch('os.getenv')
     def test_invalid_api_key(self, mock_getenv, mock_post):
         mock_getenv.return_value = "invalid_key"
@@ -35,7 +35,7 @@ class TestOpenAI_API(unittest.TestCase):
             api.generate(OpenAIConfig(model_name="test_model", context_length=112), "system_message", "prompt")
         self.assertIn("invalid", str(context.exception))
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     @patch('os.getenv')
     def test_successful_generation(self, mock_getenv, mock_post):
         mock_getenv.return_value = os.getenv("OPENAI_API_KEY")
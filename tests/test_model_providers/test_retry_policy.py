@@ -0,0 +1,101 @@
+import asyncio
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.language_models.openai_api import OpenAI_API
+from tanuki.language_models.retry_policy import RetryPolicy, CircuitBreaker, RetryableError, FatalRequestError, \
+    CircuitOpenError, parse_retry_after
+
+
+def test_full_jitter_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    for retry_index in range(6):
+        delay = policy.get_delay(retry_index)
+        assert 0 <= delay <= min(4, 2 ** retry_index)
+    # the server hint is honored, capped by max_retry_after
+    assert 3 <= policy.get_delay(0, retry_after=3) <= 4
+    assert RetryPolicy(base_delay=0, max_retry_after=5).get_delay(0, retry_after=100) == 5
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after": "2"}) == 2
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert 0 <= parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) <= 1
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after({}) is None
+
+
+def test_retries_transient_errors():
+    policy = RetryPolicy(base_delay=0.001)
+    send = Mock(side_effect=[RetryableError("overloaded"), ConnectionError("reset"), "response"])
+    assert policy.call(send, CircuitBreaker(), "Test") == "response"
+    assert send.call_count == 3
+
+
+def test_does_not_retry_fatal_errors():
+    policy = RetryPolicy(base_delay=0.001)
+    send = Mock(side_effect=FatalRequestError("invalid key"))
+    with pytest.raises(FatalRequestError):
+        policy.call(send, CircuitBreaker(), "Test")
+    assert send.call_count == 1
+
+
+def test_retries_run_out():
+    policy = RetryPolicy(max_retries=2, base_delay=0.001)
+    send = Mock(side_effect=RetryableError("overloaded"))
+    with pytest.raises(Exception) as exception_info:
+        policy.call(send, None, "Test")
+    assert "Test API failed to generate a response" in str(exception_info.value)
+    assert send.call_count == 3
+
+
+def test_async_retries():
+    policy = RetryPolicy(base_delay=0.001)
+    results = iter([RetryableError("overloaded"), "response"])
+
+    async def send():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert asyncio.run(policy.acall(send, CircuitBreaker(), "Test")) == "response"
+
+
+def test_circuit_breaker():
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    policy = RetryPolicy(max_retries=5, base_delay=0.001)
+    send = Mock(side_effect=RetryableError("down"))
+    # the circuit opens after two failures, before the retries run out
+    with pytest.raises(CircuitOpenError):
+        policy.call(send, circuit_breaker, "Test")
+    assert send.call_count == 2
+
+    # while the circuit is open, requests fail fast
+    with pytest.raises(CircuitOpenError):
+        policy.call(send, circuit_breaker, "Test")
+    assert send.call_count == 2
+
+    # after the reset timeout a trial request is let through, closing the circuit when it succeeds
+    time.sleep(0.06)
+    assert policy.call(Mock(return_value="response"), circuit_breaker, "Test") == "response"
+    assert not circuit_breaker.is_open
+
+
+def test_provider_honors_rate_limits():
+    rate_limited = Mock(status_code=429, headers={"retry-after": "0"})
+    success = Mock(status_code=200, headers={})
+    success.json.return_value = {"choices": [{"message": {"content": "Generated response"}}]}
+
+    api = OpenAI_API()
+    api.api_key = "sk-fake"
+    api.transport = Mock()
+    api.transport.post.side_effect = [rate_limited, success]
+    api.retry_policy = RetryPolicy(base_delay=0.001)
+
+    result = api.generate(OpenAIConfig(model_name="test_model", context_length=112), "system_message", "prompt")
+    assert result == "Generated response"
+    assert api.transport.post.call_count == 2
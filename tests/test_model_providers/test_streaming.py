@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Literal, Optional
+
+import pytest
+
+import tanuki
+import tanuki.language_models.openai_api as openai_api
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.language_models.openai_api import OpenAI_API
+from tanuki.language_models.retry_policy import FatalRequestError
+from tanuki.language_models.streaming import StreamCollector
+from tanuki.validator import Validator
+
+MODEL = OpenAIConfig(model_name="gpt-4", context_length=8192,
+                     parsing_helper_tokens={"start_token": "[START]", "end_token": "[END]"})
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    """
+    Streams the chunks as server-sent events, pausing for a second on every None chunk
+    """
+    protocol_version = "HTTP/1.1"
+    chunks = []
+    requests = []
+    status_code = 200
+
+    def do_POST(self):
+        StreamingHandler.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        if StreamingHandler.status_code != 200:
+            body = json.dumps({"error": {"code": "invalid_api_key"}}).encode("utf-8")
+            self.send_response(StreamingHandler.status_code)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for content in StreamingHandler.chunks:
+                if content is None:
+                    time.sleep(1)
+                    continue
+                self._write_event(json.dumps({"choices": [{"delta": {"content": content}}]}))
+            self._write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _write_event(self, data):
+        event = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(event):x}\r\n".encode("utf-8") + event + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def streaming_api(monkeypatch, fake_api_key):
+    StreamingHandler.requests = []
+    StreamingHandler.status_code = 200
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StreamingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(openai_api, "OPENAI_URL", f"http://127.0.0.1:{server.server_address[1]}/")
+    api = OpenAI_API()
+    yield api
+    api.transport.close()
+    server.shutdown()
+
+
+def collect(api, output_type_hint):
+    collector = StreamCollector(MODEL, output_type_hint, Validator())
+    stream = api.stream(MODEL, "system_message", "prompt")
+    try:
+        for chunk in stream:
+            if collector.add(chunk):
+                break
+    finally:
+        stream.close()
+    return collector
+
+
+def test_check_prefix():
+    validator = Validator()
+    assert validator.check_prefix("'Go", Literal['Good', 'Bad'])
+    assert validator.check_prefix("Good, because", Literal['Good', 'Bad'])
+    assert not validator.check_prefix("I think", Literal['Good', 'Bad'])
+    assert validator.check_prefix(" 4", int)
+    assert not validator.check_prefix("The answer", int)
+    assert validator.check_prefix("[\"a", List[str])
+    assert not validator.check_prefix("a, b", List[str])
+    assert validator.check_prefix("nu", Optional[int])
+    assert validator.check_prefix("Anything", str)
+
+
+def test_stream_stops_at_end_token(streaming_api):
+    StreamingHandler.chunks = ["Go", "od[EN", "D] and some", None, " trailing chatter"]
+    start = time.time()
+    collector = collect(streaming_api, Literal['Good', 'Bad'])
+    # the rest of the generation is not waited for
+    assert time.time() - start < 0.8
+    assert collector.finished
+    assert collector.get_choice() == "Good"
+    assert StreamingHandler.requests[0]["stream"]
+
+
+def test_stream_aborts_invalid_output(streaming_api):
+    StreamingHandler.chunks = ["I think", None, " it is 4[END]"]
+    start = time.time()
+    collector = collect(streaming_api, int)
+    assert time.time() - start < 0.8
+    assert collector.aborted
+
+
+def test_stream_error(streaming_api):
+    StreamingHandler.status_code = 401
+    with pytest.raises(FatalRequestError):
+        collect(streaming_api, int)
+
+
+def test_async_stream(streaming_api):
+    StreamingHandler.chunks = ["[START]", "Bad", "[END]", None, "chatter"]
+
+    async def run():
+        collector = StreamCollector(MODEL, Literal['Good', 'Bad'], Validator())
+        stream = streaming_api.astream(MODEL, "system_message", "prompt")
+        try:
+            async for chunk in stream:
+                if collector.add(chunk):
+                    break
+        finally:
+            await stream.aclose()
+        return collector
+
+    start = time.time()
+    collector = asyncio.run(run())
+    assert time.time() - start < 0.8
+    assert collector.get_choice() == "Bad"
+
+
+class FakeStreamingAPI(LLM_API):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.streamed = []
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        raise AssertionError("Streamed functions should not use the blocking generation")
+
+    def stream(self, model, system_message, prompt, **kwargs):
+        for chunk in self.chunks:
+            self.streamed.append(chunk)
+            yield chunk
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, stream=True, teacher_models=["gpt-4-turbo"])
+def classify_streamed(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+def test_patched_function_streams(use_fake_api):
+    fake_api = use_fake_api(FakeStreamingAPI(["Go", "od", "[END]", " and a long explanation", " which is never read"]))
+    assert classify_streamed("I like you") == 'Good'
+    assert fake_api.streamed == ["Go", "od", "[END]"]
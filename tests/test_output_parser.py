@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from tanuki.output_parser import OutputParseError, parse_output, parse_output_or_text
+
+
+def test_parse_json():
+    assert parse_output('{"a": [1, 2.5, -3e2], "b": null, "c": true, "d": "x\\ny \\u00e9"}') == \
+        {"a": [1, 2.5, -300.0], "b": None, "c": True, "d": "x\ny \u00e9"}
+    assert parse_output(' "Good" ') == "Good"
+    assert math.isinf(parse_output("-Infinity"))
+
+
+def test_parse_python_literals():
+    assert parse_output("{'a': (1, 2), 'b': None, 'c': False}") == {"a": (1, 2), "b": None, "c": False}
+    assert parse_output("(1,)") == (1,)
+    assert parse_output("()") == ()
+    assert parse_output("(1)") == 1
+    assert parse_output("{1, 2, 2}") == {1, 2}
+    assert parse_output("[1_000, .5, 'it\\'s', \"\\x41\"]") == [1000, 0.5, "it's", "A"]
+    assert parse_output("{(1, 2): 'a'}") == {(1, 2): "a"}
+
+
+def test_parse_stored_examples():
+    example = {"args": ("I love you", ["a", 'b"c'], {"k": None}), "kwargs": {}, "output": "Good\n\x00"}
+    assert parse_output(str(example)) == example
+
+
+def test_parse_bytes_and_raw_strings():
+    example = {"args": (b"abc\x00\xff'\"", b""), "kwargs": {"data": B"\\u00e9"}, "output": 1}
+    assert parse_output(str(example)) == example
+    assert parse_output("[rb'\\d+', r\"a\\\"b\", u'\\x41', Br'\\x41']") == [b"\\d+", 'a\\"b', "A", b"\\x41"]
+    with pytest.raises(OutputParseError):
+        parse_output("b'\u00e9'")
+    with pytest.raises(OutputParseError):
+        parse_output("f'{x}'")
+
+
+@pytest.mark.parametrize("text", ["Good", "__import__('os').system('ls')", "1 + 2", "[1, 2", "{'a' 1}",
+                                  "'unterminated", "[1 2]", "{[1]: 2}", "1__0", ""])
+def test_invalid_outputs(text):
+    with pytest.raises(OutputParseError):
+        parse_output(text)
+    assert parse_output_or_text(text) == text
+
+
+def test_limits():
+    with pytest.raises(OutputParseError):
+        parse_output("[" * 10 + "]" * 10, max_depth=5)
+    assert parse_output("[" * 5 + "]" * 5, max_depth=5) == [[[[[]]]]]
+    with pytest.raises(OutputParseError):
+        parse_output('"' + "a" * 100 + '"', max_length=50)
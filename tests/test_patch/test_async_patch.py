@@ -0,0 +1,52 @@
+import asyncio
+import inspect
+from typing import Literal, Optional
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.register import Register
+
+
+class FakeAsyncAPI(LLM_API):
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        raise AssertionError("The blocking API should not be used by coroutine functions")
+
+    async def agenerate(self, model, system_message, prompt, **kwargs):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        return "'Good'"
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+async def classify_sentiment_async(input: str) -> Optional[Literal['Good', 'Bad']]:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.align
+async def align_classify_sentiment_async():
+    assert await classify_sentiment_async("I love you") == 'Good'
+    assert await classify_sentiment_async("I hate you") == 'Bad'
+
+
+def test_patched_coroutine_function(use_fake_api):
+    assert inspect.iscoroutinefunction(classify_sentiment_async)
+
+    fake_api = use_fake_api(FakeAsyncAPI())
+
+    async def run():
+        return await asyncio.gather(*[classify_sentiment_async(text) for text in ["I like you", "Nice"]])
+
+    assert asyncio.run(run()) == ['Good', 'Good']
+    assert len(fake_api.prompts) == 2
+
+
+def test_align_coroutine_function():
+    asyncio.run(align_classify_sentiment_async())
+    func_hash = Register.load_function_plan(classify_sentiment_async).func_hash
+    aligns = tanuki.function_modeler.get_symbolic_alignments(func_hash)
+    assert [align["output"] for align in aligns][-2:] == ['Good', 'Bad']
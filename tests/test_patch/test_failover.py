@@ -0,0 +1,82 @@
+import asyncio
+from typing import Literal
+
+import pytest
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.retry_policy import RetryPolicy, RetryableError, FatalRequestError
+
+
+class FakeProviderAPI(LLM_API):
+    def __init__(self, error=None):
+        self.error = error
+        self.retry_policy = RetryPolicy(max_retries=5, base_delay=0.001)
+        self.prompts = []
+        self.attempts = 0
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        self.prompts.append(prompt)
+
+        def send():
+            self.attempts += 1
+            if self.error is not None:
+                raise self.error
+            return "'Good'"
+
+        return self.retry_policy.call(send, None, model.provider)
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, teacher_models=["gpt-4", "Mixtral-8x7B"],
+              failover=True)
+def classify_with_failover(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, teacher_models=["gpt-4", "Mixtral-8x7B"],
+              failover=True)
+async def classify_with_failover_async(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+def test_failover_to_the_next_provider(use_fake_api):
+    openai_api = use_fake_api(FakeProviderAPI(RetryableError("The server responded with status code 503")), "openai")
+    together_api = use_fake_api(FakeProviderAPI(), "together_ai")
+    output = classify_with_failover("I love you")
+    assert output == "Good"
+    # the unavailable provider is only retried once before failing over
+    assert openai_api.attempts == 2
+    # the prompt is rendered for each model, with the parsing helper tokens of the model
+    assert "|START|" not in openai_api.prompts[0]
+    assert "|START|" in together_api.prompts[0]
+
+
+def test_failover_async(use_fake_api):
+    openai_api = use_fake_api(FakeProviderAPI(RetryableError("The server responded with status code 503")), "openai")
+    together_api = use_fake_api(FakeProviderAPI(), "together_ai")
+    output = asyncio.run(classify_with_failover_async("I love you"))
+    assert output == "Good"
+    assert openai_api.attempts == 2
+    assert together_api.attempts == 1
+
+
+def test_no_failover_for_fatal_errors(use_fake_api):
+    openai_api = use_fake_api(FakeProviderAPI(FatalRequestError("Invalid API key")), "openai")
+    together_api = use_fake_api(FakeProviderAPI(), "together_ai")
+    with pytest.raises(FatalRequestError):
+        classify_with_failover("I love you")
+    assert together_api.prompts == []
+
+
+def test_last_model_uses_all_retries(use_fake_api):
+    openai_api = use_fake_api(FakeProviderAPI(RetryableError("The server responded with status code 503")), "openai")
+    together_api = use_fake_api(FakeProviderAPI(RetryableError("The server responded with status code 503")),
+                                "together_ai")
+    with pytest.raises(Exception, match="failed to generate a response"):
+        classify_with_failover("I love you")
+    assert openai_api.attempts == 2
+    assert together_api.attempts == 6
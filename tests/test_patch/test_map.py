@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from typing import Literal, Optional
+
+import pytest
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+
+
+class FakeSentimentAPI(LLM_API):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if "unreachable" in prompt:
+            raise ConnectionError("The model could not be reached")
+        return "'Good'" if "love" in prompt else "'Bad'"
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+def classify_sentiment_map(input: str) -> Optional[Literal['Good', 'Bad']]:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True)
+async def classify_sentiment_amap(input: str) -> Optional[Literal['Good', 'Bad']]:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@pytest.fixture
+def fake_api(use_fake_api):
+    return use_fake_api(FakeSentimentAPI())
+
+
+def test_map(fake_api):
+    inputs = ["I love you", "I hate you", "unreachable", "I love it"] * 3
+    outputs = classify_sentiment_map.map(inputs, max_concurrency=4)
+
+    assert len(outputs) == len(inputs)
+    for input, output in zip(inputs, outputs):
+        if input == "unreachable":
+            assert isinstance(output, Exception)
+        else:
+            assert output == ('Good' if "love" in input else 'Bad')
+    assert 1 < fake_api.max_in_flight <= 4
+
+
+def test_map_kwargs(fake_api):
+    outputs = classify_sentiment_map.map_kwargs([{"input": "I love you"}, {"input": "I hate you"}],
+                                                max_concurrency=1)
+    assert outputs == ['Good', 'Bad']
+    assert fake_api.max_in_flight == 1
+
+
+def test_async_map(fake_api):
+    inputs = ["I love you", "unreachable", "I hate you"]
+    outputs = asyncio.run(classify_sentiment_amap.map(inputs, max_concurrency=2))
+
+    assert outputs[0] == 'Good'
+    assert isinstance(outputs[1], Exception)
+    assert outputs[2] == 'Bad'
+
+
+def test_finetune_checks_do_not_block_other_calls(monkeypatch):
+    function_modeler = tanuki.function_modeler
+    release = threading.Event()
+    checks = []
+
+    def check_for_finetuning(function_description, func_hash):
+        checks.append(func_hash)
+        release.wait(5)
+
+    monkeypatch.setattr(function_modeler, "check_for_finetuning", check_for_finetuning)
+    monkeypatch.setattr(function_modeler, "store_data_blacklist", ["fn_a", "fn_b"])
+
+    def postprocess(func_hash):
+        thread = threading.Thread(target=function_modeler.postprocess_symbolic_datapoint, args=(func_hash, None, None))
+        thread.start()
+        return thread
+
+    def wait_for_checks(count):
+        deadline = time.monotonic() + 5
+        while len(checks) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    first = postprocess("fn_a")
+    wait_for_checks(1)
+    # the function is being checked already, so the datapoint does not wait for the check
+    second = postprocess("fn_a")
+    second.join(1)
+    assert not second.is_alive()
+    # other functions are not blocked by the check
+    other = postprocess("fn_b")
+    wait_for_checks(2)
+    release.set()
+    for thread in (first, other):
+        thread.join(5)
+    assert checks == ["fn_a", "fn_b"]
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from typing import Literal
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+
+
+class FakeRepairAPI(LLM_API):
+    """
+    Generates an invalid output, and repairs it slowly and wrongly with gpt-4 but quickly and correctly with the
+    other teacher models
+    """
+
+    def __init__(self):
+        self.repairs = []
+        self.cancelled = []
+        self._lock = threading.Lock()
+
+    def _answer(self, model, prompt, kwargs):
+        if "FAILED EXAMPLES" not in prompt:
+            return "'Neutral'", 0
+        with self._lock:
+            self.repairs.append((model.model_name, kwargs.get("temperature")))
+        if model.model_name == "gpt-4" and "temperature" not in kwargs:
+            return "'Still neutral'", 0.5
+        return "'Good'", 0.01
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        choice, delay = self._answer(model, prompt, kwargs)
+        time.sleep(delay)
+        return choice
+
+    async def agenerate(self, model, system_message, prompt, **kwargs):
+        choice, delay = self._answer(model, prompt, kwargs)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(model.model_name)
+            raise
+        return choice
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, parallel_repairs=3)
+def classify_parallel_repairs(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, parallel_repairs=3)
+async def classify_parallel_repairs_async(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+def test_parallel_repairs(use_fake_api):
+    fake_api = use_fake_api(FakeRepairAPI())
+    start = time.time()
+    assert classify_parallel_repairs("I like you") == 'Good'
+    # the first valid candidate is used without waiting for the slow one
+    assert time.time() - start < 0.4
+    # the candidates are spread over both teacher models, and over temperatures once both have a candidate
+    assert sorted(fake_api.repairs, key=str) == sorted([("gpt-4", None), ("gpt-4-32k", None), ("gpt-4", 0.4)], key=str)
+
+
+def test_async_parallel_repairs_cancel_the_rest(use_fake_api):
+    fake_api = use_fake_api(FakeRepairAPI())
+    result = asyncio.run(classify_parallel_repairs_async("I like you"))
+    assert result == 'Good'
+    assert len(fake_api.repairs) == 3
+    assert fake_api.cancelled == ["gpt-4"]
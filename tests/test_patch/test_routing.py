@@ -0,0 +1,81 @@
+import time
+from typing import Literal
+
+import pytest
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.llm_configs import DEFAULT_TEACHER_MODELS
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.language_models.model_router import ModelRouter
+
+GPT_4 = DEFAULT_TEACHER_MODELS["gpt-4"]
+MIXTRAL = DEFAULT_TEACHER_MODELS["Mixtral-8x7B"]
+
+
+class FakeRoutingAPI(LLM_API):
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        self.calls.append(model.model_name)
+        time.sleep(self.delays[model.model_name])
+        return "'Good'"
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, teacher_models=["gpt-4", "Mixtral-8x7B"],
+              routing="latency")
+def classify_by_latency(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, teacher_models=["gpt-4", "Mixtral-8x7B"],
+              routing="cost")
+def classify_by_cost(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@pytest.fixture
+def use_fake_providers(use_fake_api, monkeypatch):
+    monkeypatch.setattr(tanuki.language_modeler, "model_router", ModelRouter(exploration_rate=0))
+    return lambda fake_api: use_fake_api(fake_api, "openai", "together_ai")
+
+
+def test_latency_routing_prefers_the_fastest_teacher(use_fake_providers):
+    fake_api = use_fake_providers(FakeRoutingAPI({GPT_4.model_name: 0.05, MIXTRAL.model_name: 0.0}))
+    outputs = [classify_by_latency(f"I love you {i}") for i in range(4)]
+    assert outputs == ["Good"] * 4
+    # both teachers are tried once, then the traffic flows to the faster one
+    assert fake_api.calls == [GPT_4.model_name, MIXTRAL.model_name, MIXTRAL.model_name, MIXTRAL.model_name]
+
+
+def test_cost_routing_prefers_the_cheapest_teacher(use_fake_providers):
+    fake_api = use_fake_providers(FakeRoutingAPI({GPT_4.model_name: 0.0, MIXTRAL.model_name: 0.0}))
+    for i in range(2):
+        classify_by_cost(f"I love you {i}")
+    assert fake_api.calls == [MIXTRAL.model_name, MIXTRAL.model_name]
+
+
+def test_router_statistics():
+    router = ModelRouter(exploration_rate=0)
+    fast = OpenAIConfig(model_name="fast", context_length=4096)
+    slow = OpenAIConfig(model_name="slow", context_length=4096)
+    router.record(fast, latency=1.0)
+    router.record(slow, latency=2.0)
+    assert router.choose([(fast, 100), (slow, 100)], "latency") == fast
+    assert router.choose([(fast, 100), (slow, 100)]) == fast
+
+    # the expected latency counts the retries the failures cause
+    for _ in range(5):
+        router.record(fast, error=True)
+    assert router.get_stats(fast).error_rate > 0.5
+    assert router.choose([(fast, 100), (slow, 100)], "latency") == slow
+
+    # models without prices are only chosen by cost if no model has prices
+    assert router.choose([(fast, 100), (MIXTRAL, 100)], "cost") == MIXTRAL
+    assert router.choose([(fast, 100), (slow, 100)], "cost") == fast
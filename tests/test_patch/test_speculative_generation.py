@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Literal
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.register import Register
+
+DISTILLED_MODEL_NAME = "speculative-distilled"
+
+
+class FakeSpeculativeAPI(LLM_API):
+    def __init__(self, distilled_output, distilled_delay=0.0, teacher_delay=0.05):
+        self.distilled_output = distilled_output
+        self.distilled_delay = distilled_delay
+        self.teacher_delay = teacher_delay
+        self.calls = []
+        self.cancelled = []
+
+    def _answer(self, model, prompt):
+        self.calls.append("repair" if "FAILED EXAMPLES" in prompt else model.model_name)
+        if model.model_name == DISTILLED_MODEL_NAME:
+            return self.distilled_output, self.distilled_delay
+        return "'Good'", self.teacher_delay
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        choice, delay = self._answer(model, prompt)
+        time.sleep(delay)
+        return choice
+
+    async def agenerate(self, model, system_message, prompt, **kwargs):
+        choice, delay = self._answer(model, prompt)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(model.model_name)
+            raise
+        return choice
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, speculative_budget=0.2)
+def classify_speculative(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, speculative_budget=0.2)
+async def classify_speculative_async(input: str) -> Literal['Good', 'Bad']:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+def run_with_distilled_model(function, call, running_faults=()):
+    function_plan = Register.load_function_plan(function)
+    tanuki.function_modeler.get_models(function_plan)
+    config = tanuki.function_modeler.function_configs[function_plan.func_hash]
+    original_distilled_model = config.distilled_model
+    config.distilled_model = OpenAIConfig(model_name=DISTILLED_MODEL_NAME, context_length=4096)
+    config.current_model_stats["running_faults"] = list(running_faults)
+    try:
+        return call(), config.current_model_stats["running_faults"]
+    finally:
+        config.distilled_model = original_distilled_model
+        config.current_model_stats["running_faults"] = []
+
+
+def test_valid_distilled_output_is_used(use_fake_api):
+    fake_api = use_fake_api(FakeSpeculativeAPI("'Bad'"))
+    result, running_faults = run_with_distilled_model(classify_speculative, lambda: classify_speculative("I hate you"))
+    assert result == 'Bad'
+    assert sorted(fake_api.calls) == sorted([DISTILLED_MODEL_NAME, "gpt-4"])
+    # the valid output counts towards the probation window
+    assert running_faults == [0]
+
+
+def test_invalid_distilled_output_falls_back_to_teacher(use_fake_api):
+    fake_api = use_fake_api(FakeSpeculativeAPI("'Neutral'"))
+    result, _ = run_with_distilled_model(classify_speculative, lambda: classify_speculative("I like you"))
+    assert result == 'Good'
+    # the teacher output was already generated, so there is no serial repair
+    assert "repair" not in fake_api.calls
+
+
+def test_slow_distilled_model_falls_back_to_teacher(use_fake_api):
+    fake_api = use_fake_api(FakeSpeculativeAPI("'Bad'", distilled_delay=1))
+    start = time.time()
+    result, _ = run_with_distilled_model(classify_speculative, lambda: classify_speculative("I like you"))
+    assert result == 'Good'
+    assert time.time() - start < 0.8
+
+
+def test_no_speculation_after_probation(use_fake_api):
+    fake_api = use_fake_api(FakeSpeculativeAPI("'Bad'"))
+    result, _ = run_with_distilled_model(classify_speculative, lambda: classify_speculative("I hate you"),
+                                         running_faults=[0] * 10)
+    assert result == 'Bad'
+    assert fake_api.calls == [DISTILLED_MODEL_NAME]
+
+
+def test_async_speculation_cancels_teacher(use_fake_api):
+    fake_api = use_fake_api(FakeSpeculativeAPI("'Bad'", teacher_delay=1))
+    result, _ = run_with_distilled_model(classify_speculative_async,
+                                         lambda: asyncio.run(classify_speculative_async("I hate you")))
+    assert result == 'Bad'
+    assert fake_api.cancelled == ["gpt-4"]
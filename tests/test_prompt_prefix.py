@@ -0,0 +1,55 @@
+from typing import List
+
+from tanuki.function_modeler import FunctionModeler
+from tanuki.language_models.language_model_manager import LanguageModelManager
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.models.api_manager import APIManager
+from tanuki.register import Register
+from tanuki.trackers.filesystem_buffered_logger import FilesystemBufferedLogger
+
+
+def summarise_prefix(input: str) -> List[str]:
+    """
+    Summarise the input into multiple sentences in a list
+    """
+
+
+def initiate_test():
+    function_plan = Register.load_function_plan(summarise_prefix)
+    func_hash = function_plan.func_hash
+    func_modeler = FunctionModeler(FilesystemBufferedLogger("test"), APIManager())
+    # keep the test from reading or writing datasets and looking up finetunes
+    func_modeler.store_data_blacklist.append(func_hash)
+    func_modeler.check_finetune_blacklist.append(func_hash)
+    func_modeler.load_symbolic_align_statements(func_hash)
+    config = func_modeler.load_function_config(func_hash, function_plan)
+    config.distilled_model.model_name = ""
+    config.teacher_models = [OpenAIConfig(model_name="gpt-4", context_length=8192)]
+    lang_model = LanguageModelManager(func_modeler, APIManager())
+    return function_plan, func_modeler, lang_model
+
+
+def test_prompt_prefix_is_reused():
+    function_plan, func_modeler, lang_model = initiate_test()
+    func_modeler.save_symbolic_align_statements(function_plan.func_hash, ("Text",), {}, ["Summary"])
+    aligns = func_modeler.get_symbolic_alignments(function_plan.func_hash)
+
+    prompt, model, _, _ = lang_model.get_generation_case(("First input",), {}, function_plan, {}, function_plan.func_hash)
+    examples = [f"Inputs:\nArgs: {align['args']}\nKwargs: {align['kwargs']}\nOutput:{align['output']}" for align in aligns]
+    # the cached prefix renders the same prompt as constructing it from scratch
+    assert prompt == lang_model.construct_prompt(function_plan.description_string, ("First input",), {}, examples, model)
+
+    prefix = lang_model._get_prompt_prefix(function_plan, model)
+    second_prompt, _, _, _ = lang_model.get_generation_case(("Second input",), {}, function_plan, {}, function_plan.func_hash)
+    assert lang_model._get_prompt_prefix(function_plan, model) is prefix
+    assert second_prompt.startswith(prefix)
+
+
+def test_prompt_prefix_is_invalidated_by_new_aligns():
+    function_plan, func_modeler, lang_model = initiate_test()
+    prompt, model, _, _ = lang_model.get_generation_case(("Input",), {}, function_plan, {}, function_plan.func_hash)
+    assert "Examples:" not in prompt
+
+    func_modeler.save_symbolic_align_statements(function_plan.func_hash, ("Align input",), {}, ["Align output"])
+    prompt, model, _, _ = lang_model.get_generation_case(("Input",), {}, function_plan, {}, function_plan.func_hash)
+    assert "Align output" in prompt
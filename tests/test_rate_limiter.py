@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.language_models.rate_limiter import TokenBucket, RateLimiter
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60)
+    # the full burst is available straight away
+    assert bucket.reserve(60) == 0
+    # then the bucket refills one token per second, and callers queue up in order
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+
+
+def test_token_bucket_oversized_request():
+    bucket = TokenBucket(60)
+    # a request larger than the bucket waits for at most a full bucket
+    assert bucket.reserve(1000) == 0
+    assert bucket.reserve(1000) == pytest.approx(60, abs=0.05)
+
+
+def test_rate_limiter_from_model_config():
+    rate_limiter = RateLimiter()
+    unlimited_model = OpenAIConfig(model_name="gpt-4", context_length=8192)
+    assert not rate_limiter.is_limited(unlimited_model)
+    assert rate_limiter.reserve(unlimited_model, 1000) == 0
+
+    limited_model = OpenAIConfig(model_name="gpt-4-limited", context_length=8192,
+                                 requests_per_minute=600, tokens_per_minute=6000)
+    assert rate_limiter.is_limited(limited_model)
+    assert rate_limiter.reserve(limited_model, 6000) == 0
+    # the token limit is exhausted, the request limit is not
+    assert rate_limiter.reserve(limited_model, 100) == pytest.approx(1, abs=0.05)
+
+
+def test_rate_limiter_overrides():
+    rate_limiter = RateLimiter()
+    model = OpenAIConfig(model_name="gpt-4", context_length=8192)
+    rate_limiter.set_limits("openai", "gpt-4", requests_per_minute=60)
+    assert rate_limiter.reserve(model, 1) == 0
+    rate_limiter.limits[("openai", "gpt-4")][0].tokens = 0
+
+    async def acquire():
+        await rate_limiter.aacquire(model, 1)
+
+    # the async limiter waits without blocking the event loop
+    asyncio.run(asyncio.wait_for(acquire(), timeout=2))
@@ -0,0 +1,108 @@
+import os
+import time
+from typing import Literal, Optional
+
+import tanuki
+from tanuki.language_models.llm_api_abc import LLM_API
+from tanuki.language_models.response_cache import ResponseCache
+
+
+def test_get_key():
+    key = ResponseCache.get_key("hash", ("input",), {"b": 1, "a": [1, 2]}, {"max_new_tokens": 10})
+    assert key == ResponseCache.get_key("hash", ["input"], {"a": [1, 2], "b": 1}, {"max_new_tokens": 10})
+    assert key != ResponseCache.get_key("other_hash", ("input",), {"b": 1, "a": [1, 2]}, {"max_new_tokens": 10})
+    assert key != ResponseCache.get_key("hash", ("input",), {"b": 1, "a": [1, 2]}, {"max_new_tokens": 20})
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_size=2)
+    cache.set("hash", "a", "1")
+    cache.set("hash", "b", "2")
+    assert cache.get("hash", "a") == "1"
+    cache.set("hash", "c", "3")
+    # b was the least recently used entry
+    assert cache.get("hash", "b") is None
+    assert cache.get("hash", "a") == "1"
+    assert cache.get("hash", "c") == "3"
+
+
+def test_ttl_eviction():
+    cache = ResponseCache(ttl=0.01)
+    cache.set("hash", "a", "1")
+    time.sleep(0.02)
+    assert cache.get("hash", "a") is None
+
+
+def test_disk_tier(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path))
+    cache.set("hash", "a", "1")
+
+    new_cache = ResponseCache(directory=str(tmp_path))
+    assert new_cache.get("hash", "a") == "1"
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), max_disk_size=10)
+    for i in range(10):
+        cache.set("hash", str(i), str(i))
+        # the entries get distinct modification times, so the oldest ones are pruned
+        os.utime(cache._get_entry_path("hash", str(i)), (i, time.time() - 100 + 10 * i))
+    cache.set("other_hash", "new", "new")
+    # the tier is pruned to 9 entries
+    assert sorted(os.listdir(tmp_path / "hash")) == [f"{i}.json" for i in range(2, 10)]
+    assert os.listdir(tmp_path / "other_hash") == ["new.json"]
+
+    # expired entries are deleted when the tier is pruned, even if it is below the prune ratio
+    cache = ResponseCache(directory=str(tmp_path), max_disk_size=9, ttl=45)
+    cache.set("other_hash", "newer", "newer")
+    assert sorted(os.listdir(tmp_path / "other_hash")) == ["new.json", "newer.json"]
+    assert sorted(os.listdir(tmp_path / "hash")) == ["6.json", "7.json", "8.json", "9.json"]
+
+
+def test_model_version_invalidation(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path))
+    cache.set_model_version("hash", "")
+    cache.set("hash", "a", "1")
+    cache.set("other_hash", "a", "1")
+    cache.set_model_version("hash", "")
+    assert cache.get("hash", "a") == "1"
+
+    # a new process sees the finetuned model
+    new_cache = ResponseCache(directory=str(tmp_path))
+    new_cache.set_model_version("hash", "ft:gpt-3.5-turbo:hash")
+    assert new_cache.get("hash", "a") is None
+    assert new_cache.get("other_hash", "a") == "1"
+
+
+class CountingAPI(LLM_API):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, model, system_message, prompt, **kwargs):
+        self.calls += 1
+        return "'Good'"
+
+
+@tanuki.patch(ignore_data_storage=True, ignore_finetune_fetching=True, cache=True)
+def classify_sentiment_cached(input: str) -> Optional[Literal['Good', 'Bad']]:
+    """
+    Determine if the input is positive or negative sentiment
+    """
+
+
+def test_cached_patch(use_fake_api, monkeypatch):
+    fake_api = use_fake_api(CountingAPI())
+    func_hash = tanuki.Register.load_function_plan(classify_sentiment_cached).func_hash
+    tanuki.language_modeler.response_cache.invalidate(func_hash)
+    try:
+        assert classify_sentiment_cached("I love you") == 'Good'
+        generation_case = tanuki.language_modeler.get_generation_case
+        # a cache hit returns before the prompt is built
+        monkeypatch.setattr(tanuki.language_modeler, "get_generation_case", None)
+        assert classify_sentiment_cached("I love you") == 'Good'
+        assert fake_api.calls == 1
+        monkeypatch.setattr(tanuki.language_modeler, "get_generation_case", generation_case)
+        assert classify_sentiment_cached("I love you too") == 'Good'
+        assert fake_api.calls == 2
+    finally:
+        tanuki.language_modeler.response_cache.invalidate(func_hash)
@@ -0,0 +1,92 @@
+from unittest.mock import Mock
+
+from tanuki.language_models.language_model_manager import LanguageModelManager
+from tanuki.language_models.llm_configs.openai_config import OpenAIConfig
+from tanuki.language_models.openai_api import OpenAI_API
+from tanuki.language_models.token_estimator import TokenEstimator, get_token_estimator, set_token_estimator
+from tanuki.utils import approximate_token_count
+
+
+def slow_approximate_token_count(content):
+    """
+    The reference implementation, counting every special character separately
+    """
+    common_special_characters = r"\/(){}[]<>|`~@#$%^&*+=-_:;\""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8")
+    number_of_word_tokens = int(len(content.split(" ")) * 1.333)
+    return number_of_word_tokens + sum([content.count(char) for char in common_special_characters])
+
+
+def test_single_pass_count_matches_reference():
+    contents = ["", " ", "Hello world", "def f(x): return {'a': [1, 2]}  # \\ comment",
+                "Ünïcödé – “quotes” and emoji 🎉 with a_b-c=d", 'Args: ("input",)\nKwargs: {}\nOutput:']
+    for content in contents:
+        assert approximate_token_count(content) == slow_approximate_token_count(content)
+        assert approximate_token_count(content.encode("utf-8")) == slow_approximate_token_count(content)
+
+
+def test_calibration():
+    estimator = TokenEstimator(min_calibration_samples=3, max_calibration_factor=4)
+    content = "a few words of text"
+    count = estimator.count(content)
+    # uncalibrated estimates are returned as they are
+    assert estimator.adjust(count, "gpt-4") == count
+    for _ in range(2):
+        estimator.record_usage("gpt-4", content, count * 2)
+    assert estimator.adjust(count, "gpt-4") == count
+    estimator.record_usage("gpt-4", content, count * 2)
+    assert estimator.adjust(count, "gpt-4") == count * 2
+    # calibration is per model
+    assert estimator.adjust(count, "gpt-3.5-turbo") == count
+
+    # the factor is clamped
+    for _ in range(3):
+        estimator.record_usage("outlier", content, count * 100)
+    assert estimator.get_calibration_factor("outlier") == 4
+
+
+def test_choose_model_from_calibrated_tokens():
+    estimator = TokenEstimator(min_calibration_samples=1)
+    lang_model = LanguageModelManager(Mock(), Mock(), token_estimator=estimator)
+    small_model = OpenAIConfig(model_name="small", context_length=1000)
+    large_model = OpenAIConfig(model_name="large", context_length=8000)
+    assert lang_model.choose_model_from_tokens([small_model, large_model], 500) is small_model
+
+    # the small model underestimates by half, so the input no longer fits in its context
+    estimator.record_usage("small", "some content", estimator.count("some content") * 2)
+    assert lang_model.choose_model_from_tokens([small_model, large_model], 500) is large_model
+
+
+def test_choose_model_does_not_carry_example_tokens_over():
+    lang_model = LanguageModelManager(Mock(), Mock(), token_estimator=TokenEstimator())
+    model_with_tokens = OpenAIConfig(model_name="first", context_length=100,
+                                     parsing_helper_tokens={"start_token": "[START]", "end_token": "[END]"})
+    model_without_tokens = OpenAIConfig(model_name="second", context_length=200,
+                                        parsing_helper_tokens={"start_token": "", "end_token": ""})
+    model_without_tokens.system_message_token_count = 0
+    model_without_tokens.instruction_token_count = 0
+    # 150 tokens of input fit in the second model, even though the first one added 4 tokens per example
+    assert lang_model.choose_model_from_tokens([model_with_tokens, model_without_tokens], 150, 10) \
+           is model_without_tokens
+
+
+def test_provider_records_usage():
+    response = Mock(status_code=200, headers={})
+    response.json.return_value = {"choices": [{"message": {"content": "Generated response"}}],
+                                  "usage": {"prompt_tokens": 5, "completion_tokens": 2}}
+    api = OpenAI_API()
+    api.api_key = "sk-fake"
+    api.transport = Mock()
+    api.transport.post.return_value = response
+
+    previous_estimator = get_token_estimator()
+    estimator = TokenEstimator(min_calibration_samples=1)
+    set_token_estimator(estimator)
+    try:
+        api.generate(OpenAIConfig(model_name="usage_model", context_length=112), "system_message", "prompt")
+    finally:
+        set_token_estimator(previous_estimator)
+    stats = estimator.calibration_stats["usage_model"]
+    assert stats["samples"] == 1
+    assert estimator.get_calibration_factor("usage_model") == 5 / estimator.count("system_message\nprompt")